@@ -0,0 +1,131 @@
+"""
+Background clustering jobs
+
+DBSCAN is CPU-bound, so running it inside an `async def` handler blocks the
+uvicorn worker. Clustering runs in a small process pool instead; handlers
+get a job handle back immediately and clients poll for the result.
+
+Refresh requests are merged: while a job is queued, new requests join it,
+and while one is running at most one follow-up job is queued so reports
+submitted mid-run are picked up without piling up duplicate work.
+
+Job state is stored in the `cluster_jobs` collection rather than in the
+process, so a status poll can land on any API worker or replica. Jobs
+expire JOB_TTL after they were created (TTL index). Merging is per
+process: with several workers, each runs at most one job of a kind at a
+time, and the publish lease keeps concurrent runs from clashing.
+"""
+
+import asyncio
+import multiprocessing
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from .config import settings
+from .database import get_cluster_jobs_collection
+
+JOB_TTL = timedelta(days=1)  # Jobs are kept this long for status lookups
+
+
+class ClusterJobManager:
+    """Runs clustering jobs on a bounded process pool and tracks their state"""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._running: Dict[str, Dict] = {}  # kind -> running job
+        self._queued: Dict[str, Dict] = {}   # kind -> follow-up job
+        self._runners: Dict[str, Callable[[Dict], Awaitable[Dict]]] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that runs motor's threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def ensure_indexes(self):
+        await get_cluster_jobs_collection().create_index(
+            "created_at", expireAfterSeconds=int(JOB_TTL.total_seconds())
+        )
+
+    async def run_in_pool(self, fn, *args):
+        """Run a CPU-bound function in the worker pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), fn, *args)
+
+    async def submit(self, kind: str, runner: Callable[[Dict], Awaitable[Dict]]) -> Tuple[Dict, bool]:
+        """
+        Schedule a job of the given kind, merging with pending work.
+
+        Returns:
+            (job, merged) where merged is True if an existing job was reused
+        """
+        if kind in self._queued:
+            return self._queued[kind], True
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": "queued",
+            "created_at": datetime.utcnow(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None
+        }
+        await self._save(job)
+        self._runners[job["job_id"]] = runner
+
+        if kind in self._running:
+            self._queued[kind] = job
+        else:
+            self._start(job)
+        return job, False
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        """A job's current state, as stored by whichever process runs it"""
+        return await get_cluster_jobs_collection().find_one({"_id": job_id}, {"_id": 0})
+
+    async def _save(self, job: Dict):
+        await get_cluster_jobs_collection().replace_one({"_id": job["job_id"]}, job, upsert=True)
+
+    def _start(self, job: Dict):
+        self._running[job["kind"]] = job
+        asyncio.create_task(self._run(job))
+
+    async def _run(self, job: Dict):
+        runner = self._runners.pop(job["job_id"])
+        job["status"] = "running"
+        job["started_at"] = datetime.utcnow()
+        try:
+            await self._save(job)
+            job["result"] = await runner(job)
+            job["status"] = "completed"
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+        finally:
+            job["finished_at"] = datetime.utcnow()
+            del self._running[job["kind"]]
+            follow_up = self._queued.pop(job["kind"], None)
+            if follow_up is not None:
+                self._start(follow_up)
+        try:
+            await self._save(job)
+        except Exception as e:
+            # e.g. a result MongoDB can't store; pollers must not wait forever
+            job.update(status="failed", result=None, error=f"Could not store the job result: {e}")
+            await self._save(job)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+cluster_jobs = ClusterJobManager(max_workers=settings.CLUSTERING_WORKERS)
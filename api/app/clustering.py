@@ -0,0 +1,49 @@
+"""
+Access to the shared hotspot clustering library.
+
+The clustering engines live in backend/clustering/hotspots so the API and
+the standalone clustering service run the same code. This module puts that
+directory on the import path and re-exports the pieces the routes use.
+"""
+
+import sys
+from .config import settings
+
+if settings.CLUSTERING_LIB_DIR not in sys.path:
+    sys.path.append(settings.CLUSTERING_LIB_DIR)
+
+from hotspots import backfill, geo, persist, pipeline, trust, windows  # noqa: E402
+from hotspots.loader import ReportColumns, load_report_columns_async  # noqa: E402
+from hotspots.sweep import sweep_parameters  # noqa: E402
+
+__all__ = [
+    'backfill', 'geo', 'persist', 'pipeline', 'trust', 'windows',
+    'ReportColumns', 'load_report_columns_async', 'sweep_parameters',
+    'compute_clusters', 'compute_sweep'
+]
+
+
+def compute_clusters(ids, lat, lng, weights, trust_scores, eps_meters, min_samples):
+    """
+    Run trust-weighted DBSCAN and build cluster documents with the same
+    pipeline as the clustering service. Runs in a clustering worker process.
+
+    Args:
+        ids, lat, lng, weights, trust_scores: Report columns as loaded by
+            load_report_columns_async (plain arrays pickle cheaply)
+
+    Returns:
+        Cluster documents (hotspots.summary.cluster_documents)
+    """
+    columns = ReportColumns(ids, lat, lng, weights, trust_scores)
+    return pipeline.cluster_reports(columns, eps_meters, min_samples, engine=settings.CLUSTERING_ENGINE)
+
+
+def compute_sweep(lat, lng, weights, eps_values, min_samples_values):
+    """
+    Cluster statistics for a grid of parameters from one neighbor graph.
+    Runs in a clustering worker process.
+    """
+    valid = weights >= pipeline.MIN_TRUST_WEIGHT_FOR_CLUSTERING
+    points = geo.project(lat[valid], lng[valid])
+    return sweep_parameters(points, eps_values, min_samples_values, weights[valid])
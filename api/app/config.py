@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from typing import Optional
+import os
 
 class Settings(BaseSettings):
     # App Config
@@ -15,6 +16,19 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
     
+    # Shared clustering library (backend/clustering/hotspots)
+    CLUSTERING_LIB_DIR: str = os.path.normpath(
+        os.path.join(os.path.dirname(__file__), "..", "..", "backend", "clustering")
+    )
+    CLUSTERING_WORKERS: int = 2  # Process pool size for clustering jobs
+    CLUSTERING_ENGINE: str = "grid"  # hotspots.engines name for refresh jobs
+    
+    # Heatmap rollup and tile pyramid
+    HEATMAP_TILE_CACHE_DIR: str = os.path.normpath(
+        os.path.join(os.path.dirname(__file__), "..", "tile-cache")
+    )
+    HEATMAP_MAINTENANCE_SECONDS: int = 300  # Rollup ageing, tile sweep and precompute interval
+    
     # CORS
     CORS_ORIGINS: list = [
         "http://localhost:3000",
@@ -43,3 +43,9 @@ def get_fingerprints_collection():
 
 def get_messages_collection():
     return database.get_collection("messages")
+
+def get_heatmap_cells_collection():
+    return database.get_collection("heatmap_cells")
+
+def get_cluster_jobs_collection():
+    return database.get_collection("cluster_jobs")
@@ -0,0 +1,151 @@
+"""
+Bounding box and time range filters for report and cluster reads
+
+Report locations are GeoJSON points that keep their lat/lng keys:
+
+    {"type": "Point", "coordinates": [lng, lat], "lat": lat, "lng": lng}
+
+so a 2dsphere index on `reports.location` can serve bounding box queries
+while everything reading `location.lat` / `location.lng` keeps working.
+Reports stored before the change are converted by
+api/migrate_report_locations.py.
+
+A 2dsphere $geoWithin polygon has great-circle edges, which bow away from
+the parallels of a lat/lng box; the polygon is densified and padded to
+contain the whole box, and exact lat/lng bounds trim the result.
+"""
+
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+Bounds = Tuple[float, float, float, float]  # south, west, north, east
+
+MAX_LATITUDE = 85
+MAX_WIDTH_DEGREES = 180
+SEGMENT_DEGREES = 0.25  # Longitude step of the densified polygon edges
+MAX_RANGE_DAYS = 366
+
+
+def geo_point(lat: float, lng: float) -> dict:
+    """Report location: GeoJSON point keeping the lat/lng keys"""
+    return {"type": "Point", "coordinates": [lng, lat], "lat": lat, "lng": lng}
+
+
+def check_bounds(bounds: Bounds) -> Bounds:
+    """
+    Raises:
+        ValueError: Unless -85 <= south < north <= 85, -180 <= west < east <= 180
+            and the box spans at most MAX_WIDTH_DEGREES of longitude
+    """
+    south, west, north, east = bounds
+    if not (-MAX_LATITUDE <= south < north <= MAX_LATITUDE and -180 <= west < east <= 180):
+        raise ValueError(
+            f"Invalid bounds: need -{MAX_LATITUDE} <= south < north <= {MAX_LATITUDE} "
+            f"and -180 <= west < east <= 180"
+        )
+    if east - west > MAX_WIDTH_DEGREES:
+        # $geoWithin polygons must fit in a hemisphere
+        raise ValueError(f"Bounds may span at most {MAX_WIDTH_DEGREES} degrees of longitude")
+    return bounds
+
+
+def bounds_from_params(
+    south: Optional[float], west: Optional[float], north: Optional[float], east: Optional[float]
+) -> Optional[Bounds]:
+    """
+    Bounding box from optional query parameters.
+
+    Returns:
+        None if no edge is given
+
+    Raises:
+        ValueError: If only some edges are given or the box is invalid
+    """
+    edges = (south, west, north, east)
+    if all(edge is None for edge in edges):
+        return None
+    if any(edge is None for edge in edges):
+        raise ValueError("Give all of south, west, north and east, or none")
+    return check_bounds(edges)
+
+
+def _bow(lat: float, half_segment: float) -> float:
+    """Latitude (degrees) by which a great circle between two points on a
+    parallel, half_segment radians of longitude from their midpoint, bows
+    towards the pole"""
+    phi = math.radians(lat)
+    return abs(math.degrees(math.atan(math.tan(phi) / math.cos(half_segment))) - lat)
+
+
+def bounds_polygon(bounds: Bounds) -> dict:
+    """GeoJSON polygon containing a lat/lng box"""
+    south, west, north, east = bounds
+    steps = max(1, math.ceil((east - west) / SEGMENT_DEGREES))
+    half_segment = math.radians((east - west) / steps / 2)
+    south = max(south - _bow(south, half_segment) - 1e-9, -90)
+    north = min(north + _bow(north, half_segment) + 1e-9, 90)
+
+    lngs = [west + (east - west) * i / steps for i in range(steps + 1)]
+    ring = [[lng, south] for lng in lngs] + [[lng, north] for lng in reversed(lngs)]
+    ring.append(ring[0])
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def bounds_query(bounds: Bounds, field: str = "location") -> dict:
+    """
+    Filter for points within [south, north) x [west, east).
+
+    Args:
+        bounds: (south, west, north, east)
+        field: GeoJSON point field with lat/lng keys
+    """
+    south, west, north, east = bounds
+    return {
+        field: {"$geoWithin": {"$geometry": bounds_polygon(bounds)}},
+        f"{field}.lat": {"$gte": south, "$lt": north},
+        f"{field}.lng": {"$gte": west, "$lt": east}
+    }
+
+
+def utc_naive(value: datetime) -> datetime:
+    """Timestamps are stored as naive UTC"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def time_range(
+    since: Optional[datetime], until: Optional[datetime], default_days: int, now: Optional[datetime] = None
+) -> Tuple[datetime, datetime]:
+    """
+    Normalized [since, until) time range.
+
+    Returns:
+        (since, until) as naive UTC; until defaults to now and since to
+        default_days before until
+
+    Raises:
+        ValueError: If since is not before until or the range is longer
+            than MAX_RANGE_DAYS
+    """
+    until = utc_naive(until) if until else (now or datetime.utcnow())
+    since = utc_naive(since) if since else until - timedelta(days=default_days)
+    if since >= until:
+        raise ValueError("since must be before until")
+    if until - since > timedelta(days=MAX_RANGE_DAYS):
+        raise ValueError(f"Time range is limited to {MAX_RANGE_DAYS} days")
+    return since, until
+
+
+def whole_days(window: Tuple[datetime, datetime]) -> Tuple[datetime, datetime]:
+    """
+    A time range widened to whole UTC days, the rollup's granularity, so
+    a public read can't single out reports by narrowing the range.
+    """
+    since, until = window
+    start = datetime(since.year, since.month, since.day)
+    end = datetime(until.year, until.month, until.day)
+    if end < until:
+        end += timedelta(days=1)
+    return start, end
@@ -0,0 +1,442 @@
+"""
+Heatmap rollup (`heatmap_cells`)
+
+Report count and summed trust weight per grid cell and day, maintained as
+reports change rather than recomputed from `reports` on every request:
+
+- submit_report adds a report unless it is delayed for review
+- approve_delayed_report and verify_report add a delayed report; the
+  maintenance job adds it once its delay has expired
+- mark_report_as_fake removes it
+- the maintenance job drops days that left the heatmap window
+
+Cells are kept at every resolution /api/heatmap/data offers, so a read is
+one indexed $group over cells x days. A counted report carries `inHeatmap`
+and the `heatmapWeight` it was counted with: adding and removing are
+idempotent, and a removal subtracts exactly what was added even if the
+report's trust weight changed in between.
+"""
+
+import asyncio
+import math
+import traceback
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from .config import settings
+from .geo_filters import bounds_query
+from .heatmap_tiles import DEFAULT_TRUST_WEIGHT, heatmap_since, sweep_expired, tile_cache, warm_tiles
+
+CELLS_COLLECTION = "heatmap_cells"
+STATE_COLLECTION = "cluster_state"
+STATE_ID = "heatmap:cells"
+# Decimal places of a degree. The heatmap is public: 3 decimals (~110 m)
+# is the finest it has ever shown, and cells stop there
+RESOLUTIONS = (1, 2, 3)
+REBUILD_BATCH = 1000
+
+
+async def ensure_indexes(db):
+    cells = db[CELLS_COLLECTION]
+    await cells.create_index([("resolution", 1), ("day", 1), ("lat", 1), ("lng", 1)], unique=True)
+    await cells.create_index("day")
+    await db["reports"].create_index([("isDelayed", 1), ("delayedUntil", 1)])
+
+
+def report_day(timestamp: datetime) -> datetime:
+    return datetime(timestamp.year, timestamp.month, timestamp.day)
+
+
+def has_location(report: dict) -> bool:
+    location = report.get("location") or {}
+    return all(isinstance(location.get(key), (int, float)) for key in ("lat", "lng"))
+
+
+def cell_keys(report: dict) -> List[dict]:
+    """The report's cell at every resolution"""
+    lat, lng = report["location"]["lat"], report["location"]["lng"]
+    day = report_day(report["timestamp"])
+    return [
+        {
+            "resolution": resolution,
+            "day": day,
+            "lat": math.floor(lat * 10 ** resolution),
+            "lng": math.floor(lng * 10 ** resolution)
+        }
+        for resolution in RESOLUTIONS
+    ]
+
+
+def cell_updates(report: dict, count: int, weight: float) -> List[UpdateOne]:
+    """
+    Upserts adding `count` reports of summed `weight` to the report's cells.
+
+    Args:
+        report: Report with location and timestamp
+        count: 1 to add the report, -1 to remove it
+        weight: Trust weight to add (negative to remove)
+    """
+    return [
+        UpdateOne(key, {"$inc": {"count": count, "weight": weight}}, upsert=True)
+        for key in cell_keys(report)
+    ]
+
+
+def cell_bounds_filter(bounds: Tuple[float, float, float, float], resolution: int) -> dict:
+    """Filter for the rollup cells of a resolution overlapping (south, west, north, east)"""
+    south, west, north, east = bounds
+    scale = 10 ** resolution
+    return {
+        "lat": {"$gte": math.floor(south * scale), "$lte": math.floor(north * scale)},
+        "lng": {"$gte": math.floor(west * scale), "$lte": math.floor(east * scale)}
+    }
+
+
+# The weight a report is counted with: heatmapWeight once the rollup
+# counted it, else its trust weight, as add_report would take it
+REPORT_WEIGHT = {"$ifNull": ["$heatmapWeight", {"$ifNull": ["$trustWeight", DEFAULT_TRUST_WEIGHT]}]}
+
+
+def rollup_pipeline(
+    resolution: int,
+    since: datetime,
+    until: Optional[datetime] = None,
+    bounds: Optional[Tuple[float, float, float, float]] = None
+) -> list:
+    """
+    Aggregation summing the rollup's days in [since, until) per cell.
+
+    A cell is 10^-resolution degrees on a side. The rollup already holds
+    per-cell counts, so the cost depends on cells x days rather than on
+    the number of reports.
+    """
+    match = {"resolution": resolution, "day": {"$gte": since}}
+    if until is not None:
+        match["day"]["$lt"] = until
+    if bounds:
+        match.update(cell_bounds_filter(bounds, resolution))
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"lat": "$lat", "lng": "$lng"},
+            "count": {"$sum": "$count"},
+            "weight": {"$sum": "$weight"}
+        }},
+        {"$match": {"count": {"$gt": 0}}}
+    ]
+
+
+def report_cells_pipeline(query: dict, resolution: int) -> list:
+    """
+    Aggregation grouping matching reports into the rollup's cells, for
+    days the rollup doesn't hold. Cell indexes, count and summed weight
+    (REPORT_WEIGHT) come out as the rollup's do: no report coordinates
+    leave it.
+    """
+    scale = 10 ** resolution
+    return [
+        {"$match": query},
+        {"$project": {
+            "_id": 0,
+            "lat": "$location.lat",
+            "lng": "$location.lng",
+            "weight": REPORT_WEIGHT
+        }},
+        {"$group": {
+            "_id": {
+                "lat": {"$floor": {"$multiply": ["$lat", scale]}},
+                "lng": {"$floor": {"$multiply": ["$lng", scale]}}
+            },
+            "count": {"$sum": 1},
+            "weight": {"$sum": "$weight"}
+        }}
+    ]
+
+
+def cell_sources(
+    now: datetime,
+    resolution: int,
+    bounds: Optional[Tuple[float, float, float, float]] = None,
+    window: Optional[Tuple[datetime, datetime]] = None
+) -> List[Tuple[str, list]]:
+    """
+    (collection, pipeline) pairs whose cells together make up the heatmap.
+
+    The rollup serves the days it holds (the last HEATMAP_DAYS); only the
+    days of a time range before those are grouped from `reports`.
+
+    Args:
+        window: (since, until) on whole UTC days; the rollup's window if
+            not given
+    """
+    rollup_since = heatmap_since(now)
+    since, until = window or (rollup_since, None)
+    sources = []
+    if since < rollup_since:
+        query = dict(visible_filter(now), timestamp={"$gte": since, "$lt": min(until, rollup_since)})
+        if bounds:
+            query.update(bounds_query(bounds))
+        else:
+            query.update({"location.lat": {"$type": "number"}, "location.lng": {"$type": "number"}})
+        sources.append(("reports", report_cells_pipeline(query, resolution)))
+    if until is None or until > rollup_since:
+        sources.append((CELLS_COLLECTION, rollup_pipeline(resolution, max(since, rollup_since), until, bounds)))
+    return sources
+
+
+async def load_cell_counts(
+    db,
+    resolution: int,
+    bounds: Optional[Tuple[float, float, float, float]] = None,
+    window: Optional[Tuple[datetime, datetime]] = None
+) -> Dict[Tuple[int, int], List[float]]:
+    """
+    Count and summed weight per cell (see cell_sources).
+
+    Returns:
+        {(lat index, lng index): [count, weight]} of the non-empty cells
+    """
+    cells = {}
+    for collection, pipeline in cell_sources(datetime.utcnow(), resolution, bounds, window):
+        async for cell in db[collection].aggregate(pipeline):
+            totals = cells.setdefault((cell["_id"]["lat"], cell["_id"]["lng"]), [0, 0.0])
+            totals[0] += cell["count"]
+            totals[1] += cell["weight"]
+    return cells
+
+
+def visible_filter(now: datetime) -> dict:
+    """Reports that may be shown on the heatmap: not fake, not held for review"""
+    return {
+        "flaggedAsFake": {"$ne": True},
+        "$or": [
+            {"isDelayed": {"$ne": True}},
+            {"delayedUntil": {"$lt": now}}
+        ]
+    }
+
+
+def visible_query(now: datetime) -> dict:
+    """Reports that belong on the heatmap now: visible and within the window"""
+    return dict(visible_filter(now), timestamp={"$gte": heatmap_since(now)})
+
+
+async def record_report(db, report: dict):
+    """Count a report inserted with inHeatmap set"""
+    await db[CELLS_COLLECTION].bulk_write(
+        cell_updates(report, 1, report["heatmapWeight"]), ordered=False
+    )
+    await asyncio.to_thread(tile_cache.invalidate_location, report["location"])
+
+
+async def add_report(db, report_id) -> bool:
+    """
+    Count a report on the heatmap unless it already is (or is fake).
+
+    inHeatmap and heatmapWeight are set in one update, so a concurrent
+    remove_report either sees neither or subtracts what is added here.
+
+    Returns:
+        True if the report was added
+    """
+    uncounted = {"_id": report_id, "inHeatmap": {"$ne": True}, "flaggedAsFake": {"$ne": True}}
+    report = await db["reports"].find_one_and_update(
+        dict(
+            uncounted,
+            timestamp={"$gte": heatmap_since(datetime.utcnow())},
+            **{"location.lat": {"$type": "number"}, "location.lng": {"$type": "number"}}
+        ),
+        [{"$set": {
+            "inHeatmap": True,
+            "heatmapWeight": {"$ifNull": ["$trustWeight", DEFAULT_TRUST_WEIGHT]}
+        }}],
+        projection={"location": 1, "timestamp": 1, "heatmapWeight": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if report is None:
+        # Nothing to draw: mark it (without a weight) so it isn't considered again
+        await db["reports"].update_one(uncounted, {"$set": {"inHeatmap": True}})
+        return False
+
+    await record_report(db, report)
+    return True
+
+
+async def remove_report(db, report_id) -> bool:
+    """
+    Stop counting a report on the heatmap.
+
+    Returns:
+        True if the report was counted before
+    """
+    report = await db["reports"].find_one_and_update(
+        {"_id": report_id, "inHeatmap": True},
+        {"$set": {"inHeatmap": False}, "$unset": {"heatmapWeight": ""}},
+        projection={"location": 1, "timestamp": 1, "heatmapWeight": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if report is None or report.get("heatmapWeight") is None:
+        return False
+
+    # Days that already left the window have been aged out
+    if report["timestamp"] >= heatmap_since(datetime.utcnow()):
+        await db[CELLS_COLLECTION].bulk_write(
+            cell_updates(report, -1, -report["heatmapWeight"]), ordered=False
+        )
+        await asyncio.to_thread(tile_cache.invalidate_location, report["location"])
+    return True
+
+
+async def rebuild(db) -> int:
+    """
+    Count every visible report in the window that isn't counted yet (first
+    start, or after a reset that cleared both the rollup and the reports'
+    inHeatmap flags).
+
+    Nothing is deleted, so it runs safely next to submissions and next to
+    another process building at the same time. Each report is claimed by
+    setting inHeatmap under a per-run token, the same conditional update
+    add_report uses, and only reports this run claimed are added, with
+    the same $inc upserts record_report uses.
+
+    Returns:
+        Number of reports counted
+    """
+    now = datetime.utcnow()
+    reports = db["reports"]
+    token = ObjectId()
+    query = dict(visible_query(now), inHeatmap={"$ne": True})
+
+    counted = 0
+    batch = []
+    cursor = reports.find(query, {"location": 1, "timestamp": 1, "trustWeight": 1})
+    async for report in cursor:
+        if has_location(report):
+            batch.append(report)
+        if len(batch) >= REBUILD_BATCH:
+            counted += await _count_claimed(db, batch, token)
+            batch = []
+    if batch:
+        counted += await _count_claimed(db, batch, token)
+
+    await db[STATE_COLLECTION].update_one(
+        {"_id": STATE_ID}, {"$set": {"builtAt": now}}, upsert=True
+    )
+    await asyncio.to_thread(tile_cache.clear)
+    return counted
+
+
+async def _count_claimed(db, batch: List[dict], token: ObjectId) -> int:
+    """Claim a batch of uncounted reports and add the ones claimed to the rollup"""
+    reports = db["reports"]
+    weights = {}
+    claims = []
+    for report in batch:
+        weight = report.get("trustWeight")
+        weights[report["_id"]] = DEFAULT_TRUST_WEIGHT if weight is None else weight
+        claims.append(UpdateOne(
+            {"_id": report["_id"], "inHeatmap": {"$ne": True}, "flaggedAsFake": {"$ne": True}},
+            {"$set": {"inHeatmap": True, "heatmapWeight": weights[report["_id"]], "heatmapClaim": token}}
+        ))
+    await reports.bulk_write(claims, ordered=False)
+
+    # Reports added or flagged meanwhile were not claimed
+    claimed = set()
+    async for report in reports.find({"_id": {"$in": list(weights)}, "heatmapClaim": token}, {"_id": 1}):
+        claimed.add(report["_id"])
+    if not claimed:
+        return 0
+    await reports.update_many({"_id": {"$in": list(claimed)}}, {"$unset": {"heatmapClaim": ""}})
+
+    cells = {}
+    for report in batch:
+        if report["_id"] in claimed:
+            for key in cell_keys(report):
+                cell = cells.setdefault(tuple(key.items()), [0, 0.0])
+                cell[0] += 1
+                cell[1] += weights[report["_id"]]
+    await db[CELLS_COLLECTION].bulk_write([
+        UpdateOne(dict(key), {"$inc": {"count": count, "weight": weight}}, upsert=True)
+        for key, (count, weight) in cells.items()
+    ], ordered=False)
+    return len(claimed)
+
+
+async def add_expired_delays(db) -> int:
+    """
+    Count delayed reports whose review delay has run out.
+
+    Returns:
+        Number of reports added
+    """
+    now = datetime.utcnow()
+    cursor = db["reports"].find(
+        {
+            "isDelayed": True,
+            "delayedUntil": {"$lt": now},
+            "inHeatmap": {"$ne": True},
+            "flaggedAsFake": {"$ne": True},
+            "timestamp": {"$gte": heatmap_since(now)}
+        },
+        {"_id": 1}
+    )
+    added = 0
+    async for report in cursor:
+        if await add_report(db, report["_id"]):
+            added += 1
+    return added
+
+
+async def age_out(db) -> int:
+    """
+    Drop days that left the heatmap window, cells emptied by removals and
+    cells of resolutions no longer kept.
+
+    Returns:
+        Number of cell documents deleted
+    """
+    result = await db[CELLS_COLLECTION].delete_many({
+        "$or": [
+            {"day": {"$lt": heatmap_since(datetime.utcnow())}},
+            {"count": {"$lte": 0}},
+            {"resolution": {"$nin": list(RESOLUTIONS)}}
+        ]
+    })
+    return result.deleted_count
+
+
+async def run_heatmap_maintenance(db, interval: int = settings.HEATMAP_MAINTENANCE_SECONDS):
+    """
+    Keep the heatmap current, forever: build the rollup if it was never
+    built, count expired delays, age out old days, then sweep expired
+    reports from the tile cache and precompute missing tiles.
+
+    Tiles are warmed after the rollup steps so they never read reports
+    the rollup hasn't marked yet.
+    """
+    built: Optional[dict] = None
+    while True:
+        try:
+            if built is None:
+                await ensure_indexes(db)
+                built = await db[STATE_COLLECTION].find_one({"_id": STATE_ID})
+                if built is None:
+                    counted = await rebuild(db)
+                    built = {"builtAt": datetime.utcnow()}
+                    print(f"✅ Heatmap rollup built from {counted} reports")
+            added = await add_expired_delays(db)
+            deleted = await age_out(db)
+            expired = await sweep_expired(db)
+            computed = await warm_tiles(db)
+            if added or deleted or expired or computed:
+                print(
+                    f"🗺️  Heatmap: {added} delayed reports added, {deleted} cells aged out, "
+                    f"{expired} reports expired from tiles, {computed} tiles computed"
+                )
+        except Exception:
+            print("⚠️  Heatmap maintenance failed")
+            traceback.print_exc()
+        await asyncio.sleep(interval)
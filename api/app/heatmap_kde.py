@@ -0,0 +1,228 @@
+"""
+Kernel density rasters for the public map
+
+Instead of the client drawing one circle per point, the API returns the
+heatmap as a small image: the cells of the requested days inside the
+requested bounds (rollup cells, see heatmap_cells; days before the
+rollup are grouped from reports into the same cells) are binned into a
+NumPy grid aligned with Web Mercator pixels, smoothed with a Gaussian
+kernel and quantized to uint8. The response size depends only on the
+raster size.
+
+The raster is public, so it never resolves more than the rollup's ~110 m
+cells: it is built from cell counts, never report coordinates, pixels
+are at least MIN_PIXEL_METERS wide and the kernel at least MIN_BANDWIDTH.
+
+Small kernels are applied as two separable 1-D passes; kernels wider than
+FFT_MIN_KERNEL pixels use an FFT convolution. The grid is padded by the
+kernel radius, so cells just outside the bounds still contribute.
+"""
+
+import math
+import struct
+import zlib
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .geo_filters import check_bounds
+from .heatmap_cells import RESOLUTIONS, load_cell_counts
+from .heatmap_tiles import tile_coordinates
+
+METERS_PER_DEGREE = 111320
+KERNEL_SIGMAS = 3  # Kernel radius in standard deviations
+FFT_MIN_KERNEL = 31  # Kernel width (pixels) from which the FFT path is used
+MAX_SIDE = 1024  # Raster width/height limit in pixels
+MAX_SIGMA_PIXELS = 128  # Bandwidth limit relative to the pixel size
+MIN_BANDWIDTH = 110  # Meters, about the finest rollup cell
+MIN_PIXEL_METERS = 110  # Narrower rasters are returned over small bounds
+
+
+def rollup_resolution(cell_degrees: float) -> int:
+    """Coarsest rollup resolution with cells at most half `cell_degrees`"""
+    for resolution in RESOLUTIONS:
+        if 10 ** -resolution <= cell_degrees / 2:
+            return resolution
+    return max(RESOLUTIONS)
+
+
+def raster_height(bounds: Tuple[float, float, float, float], width: int) -> int:
+    """Raster height giving square Web Mercator pixels for a width"""
+    south, west, north, east = bounds
+    (x0, x1), (y0, y1) = tile_coordinates([north, south], [west, east], 0)
+    return max(1, int(round(width * (y1 - y0) / (x1 - x0))))
+
+
+def gaussian_kernel(sigma: float) -> np.ndarray:
+    """Normalized 1-D Gaussian kernel, KERNEL_SIGMAS wide on each side"""
+    radius = max(1, int(math.ceil(KERNEL_SIGMAS * sigma)))
+    x = np.arange(-radius, radius + 1, dtype=np.float64)
+    kernel = np.exp(-0.5 * (x / max(sigma, 1e-6)) ** 2)
+    return kernel / kernel.sum()
+
+
+def gaussian_blur(grid: np.ndarray, sigma: float) -> np.ndarray:
+    """
+    Convolve a grid with a Gaussian (zero outside the grid, same shape out).
+
+    Args:
+        grid: 2-D float array
+        sigma: Standard deviation in pixels
+    """
+    kernel = gaussian_kernel(sigma)
+    radius = len(kernel) // 2
+    height, width = grid.shape
+
+    if len(kernel) >= FFT_MIN_KERNEL:
+        # Zero-pad to the full linear convolution size to avoid wrap-around
+        shape = (height + 2 * radius, width + 2 * radius)
+        spectrum = np.fft.rfft2(grid, shape) * np.fft.rfft2(np.outer(kernel, kernel), shape)
+        full = np.fft.irfft2(spectrum, shape)
+        return np.maximum(full[radius:radius + height, radius:radius + width], 0)
+
+    # Separable: rows, then columns, as sliding-window dot products
+    padded = np.pad(grid, ((0, 0), (radius, radius)))
+    rows = np.lib.stride_tricks.sliding_window_view(padded, len(kernel), axis=1) @ kernel
+    padded = np.pad(rows, ((radius, radius), (0, 0)))
+    return np.lib.stride_tricks.sliding_window_view(padded, len(kernel), axis=0) @ kernel
+
+
+def quantize(density: np.ndarray) -> Tuple[np.ndarray, float]:
+    """
+    uint8 raster scaled to the maximum density.
+
+    Returns:
+        (raster, maximum): a pixel value v stands for v / 255 * maximum
+    """
+    maximum = float(density.max()) if density.size else 0.0
+    if maximum <= 0:
+        return np.zeros(density.shape, dtype=np.uint8), 0.0
+    return np.rint(density / maximum * 255).astype(np.uint8), maximum
+
+
+def encode_png(raster: np.ndarray) -> bytes:
+    """8-bit grayscale PNG of a uint8 raster (row 0 at the top)"""
+    height, width = raster.shape
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    # Filter type 0 (none) in front of every row
+    scanlines = np.hstack([np.zeros((height, 1), dtype=np.uint8), raster]).tobytes()
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(scanlines, 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+async def load_cells(
+    db,
+    bounds: Tuple[float, float, float, float],
+    resolution: int,
+    time_range: Optional[Tuple[datetime, datetime]] = None
+):
+    """
+    Center, count and weight of the cells within bounds.
+
+    Args:
+        time_range: (since, until) on whole UTC days, read from the rollup
+            where it holds them (see heatmap_cells.cell_sources); the
+            rollup's window if not given
+
+    Returns:
+        (lat, lng, count, weight) arrays
+    """
+    scale = 10 ** resolution
+    cells = await load_cell_counts(db, resolution, bounds, time_range)
+    lat = np.array([(cell_lat + 0.5) / scale for cell_lat, _ in cells])
+    lng = np.array([(cell_lng + 0.5) / scale for _, cell_lng in cells])
+    count = np.array([totals[0] for totals in cells.values()], dtype=np.float64)
+    weight = np.array([totals[1] for totals in cells.values()], dtype=np.float64)
+    return lat, lng, count, weight
+
+
+async def density_raster(
+    db,
+    bounds: Tuple[float, float, float, float],
+    width: int,
+    bandwidth: float,
+    weighted: bool = True,
+    time_range: Optional[Tuple[datetime, datetime]] = None
+) -> Tuple[np.ndarray, Dict]:
+    """
+    Quantized kernel density of the heatmap over bounds.
+
+    Args:
+        db: Motor database
+        bounds: (south, west, north, east) in degrees
+        width: Raster width in pixels, reduced so a pixel spans at least
+            MIN_PIXEL_METERS; the height follows from the bounds
+        bandwidth: Kernel standard deviation in meters, at least
+            MIN_BANDWIDTH
+        weighted: Sum trust weights instead of counting reports
+        time_range: (since, until) on whole UTC days, in rollup cells;
+            the rollup's window if not given
+
+    Returns:
+        (raster, info): uint8 raster, row 0 at the north edge, and info
+        with the bounds, size, the cell resolution used and maxDensity
+        (reports or trust weight per km² at pixel value 255)
+
+    Raises:
+        ValueError: For invalid bounds, a raster over MAX_SIDE pixels or a
+            bandwidth under MIN_BANDWIDTH or over MAX_SIGMA_PIXELS pixels
+    """
+    south, west, north, east = check_bounds(bounds)
+    if bandwidth < MIN_BANDWIDTH:
+        raise ValueError(f"Bandwidth must be at least {MIN_BANDWIDTH} m")
+    center_lat = math.radians((south + north) / 2)
+    span_meters = (east - west) * METERS_PER_DEGREE * math.cos(center_lat)
+    width = max(1, min(width, int(span_meters // MIN_PIXEL_METERS)))
+    height = raster_height(bounds, width)
+    if width > MAX_SIDE or height > MAX_SIDE:
+        raise ValueError(f"Raster of {width}x{height} pixels exceeds {MAX_SIDE}x{MAX_SIDE}")
+
+    meters_per_pixel = span_meters / width
+    sigma = bandwidth / meters_per_pixel
+    if sigma > MAX_SIGMA_PIXELS:
+        raise ValueError(f"Bandwidth of {bandwidth} m spans more than {MAX_SIGMA_PIXELS} pixels; use larger bounds or a smaller bandwidth")
+    pad = int(math.ceil(KERNEL_SIGMAS * sigma))
+
+    # Rollup cells well below the pixel (and kernel) size, from a margin
+    # around the bounds wide enough for the kernel
+    pixel_degrees = (east - west) / width
+    resolution = rollup_resolution(min(pixel_degrees, bandwidth / METERS_PER_DEGREE))
+    margin = pad * pixel_degrees
+    padded = (max(south - margin, -90), max(west - margin, -180), min(north + margin, 90), min(east + margin, 180))
+    lat, lng, count, weight = await load_cells(db, padded, resolution, time_range)
+
+    # Bin in Web Mercator pixels (what map image overlays are stretched in)
+    grid = np.zeros((height + 2 * pad, width + 2 * pad))
+    if len(lat):
+        (x0, x1), (y0, y1) = tile_coordinates([north, south], [west, east], 0)
+        fx, fy = tile_coordinates(lat, lng, 0)
+        col = np.floor((fx - x0) / (x1 - x0) * width).astype(np.int64) + pad
+        row = np.floor((fy - y0) / (y1 - y0) * height).astype(np.int64) + pad
+        inside = (col >= 0) & (col < grid.shape[1]) & (row >= 0) & (row < grid.shape[0])
+        values = weight if weighted else count
+        grid = np.bincount(
+            row[inside] * grid.shape[1] + col[inside],
+            weights=values[inside],
+            minlength=grid.size
+        ).reshape(grid.shape)
+
+    density = gaussian_blur(grid, sigma)[pad:pad + height, pad:pad + width]
+    raster, maximum = quantize(density)
+    pixel_km2 = (meters_per_pixel / 1000) ** 2
+    return raster, {
+        "bounds": [south, west, north, east],
+        "width": width,
+        "height": height,
+        "bandwidth": bandwidth,
+        "weighted": weighted,
+        "resolution": resolution,
+        "maxDensity": round(maximum / pixel_km2, 3)
+    }
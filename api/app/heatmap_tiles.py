@@ -0,0 +1,400 @@
+"""
+Heatmap tile pyramid
+
+The public heatmap is served as Web Mercator z/x/y tiles. A tile holds a
+TILE_CELLS x TILE_CELLS density grid (report count and summed weight per
+cell) of the reports counted on the heatmap (see heatmap_cells) over the
+last HEATMAP_DAYS days, stored sparsely as JSON. Reports are weighted
+with the heatmapWeight the rollup counted them with, so tiles and
+/api/heatmap/data agree.
+
+Tiles are kept in a content-addressed disk cache: each tile body is
+stored once under its SHA-256 (so the many empty tiles share one object),
+and a per-tile index file points at the current digest. The digest doubles
+as the HTTP ETag.
+
+Over Rwanda the pyramid is precomputed up to BASE_ZOOM: base tiles are
+binned from reports, lower zooms are merged from their four children.
+Base tile cells are ~300 m, above the ~110 m the public heatmap has
+always been rounded to, so the pyramid stops there (MAX_ZOOM) and map
+clients overzoom the base tiles. Tiles outside Rwanda are served as the
+shared empty body and never written, so requests can't grow the cache.
+When a report is added or removed, only the tiles containing it are
+invalidated; reports ageing out of the window are swept the same way.
+Cache file I/O runs in worker threads (asyncio.to_thread), off the event
+loop.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .config import settings
+from .geo_filters import bounds_query
+
+HEATMAP_DAYS = 30
+DEFAULT_TRUST_WEIGHT = 0.5  # Reports saved before trust weighting
+
+TILE_CELLS = 32  # Grid cells per tile side
+BASE_ZOOM = 12  # Highest precomputed zoom, ~300 m cells
+MAX_ZOOM = BASE_ZOOM  # Finer cells would show near-exact locations
+RWANDA_BOUNDS = (-2.9, 28.8, -1.0, 31.0)  # south, west, north, east
+MAX_LATITUDE = 85.05112878  # Web Mercator limit
+BULK_MIN_TILES = 32  # Missing base tiles above which one bulk query fills them
+
+Tile = Tuple[int, int, int]
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(south, west, north, east) of a tile in degrees"""
+    n = 2 ** z
+    west = x / n * 360 - 180
+    east = (x + 1) / n * 360 - 180
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return south, west, north, east
+
+
+def tile_coordinates(lat, lng, z: int):
+    """Fractional tile x and y of coordinates at a zoom (vectorized)"""
+    n = 2 ** z
+    lat = np.radians(np.clip(np.asarray(lat, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(lng, dtype=np.float64) + 180) / 360 * n
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / math.pi) / 2 * n
+    return np.clip(x, 0, n - 1e-9), np.clip(y, 0, n - 1e-9)
+
+
+def tiles_containing(lat: float, lng: float, zooms: Iterable[int] = range(MAX_ZOOM + 1)) -> List[Tile]:
+    """The tile containing a location at every zoom"""
+    tiles = []
+    for z in zooms:
+        x, y = tile_coordinates(lat, lng, z)
+        tiles.append((z, int(x), int(y)))
+    return tiles
+
+
+def tiles_covering(bounds: Tuple[float, float, float, float], z: int) -> List[Tile]:
+    """All tiles of a zoom intersecting (south, west, north, east)"""
+    south, west, north, east = bounds
+    (x0, x1), (y0, y1) = tile_coordinates([north, south], [west, east], z)
+    return [
+        (z, x, y)
+        for x in range(int(x0), int(x1) + 1)
+        for y in range(int(y0), int(y1) + 1)
+    ]
+
+
+def intersects_rwanda(z: int, x: int, y: int) -> bool:
+    south, west, north, east = tile_bounds(z, x, y)
+    r_south, r_west, r_north, r_east = RWANDA_BOUNDS
+    return south < r_north and north > r_south and west < r_east and east > r_west
+
+
+def bin_tiles(lat, lng, weight, z: int) -> Dict[Tuple[int, int], List[list]]:
+    """
+    Density grids of every tile of a zoom containing reports.
+
+    Returns:
+        {(x, y): cells} where cells are [row, col, count, weight] rows
+        sorted by row and column
+    """
+    if len(lat) == 0:
+        return {}
+    fx, fy = tile_coordinates(lat, lng, z)
+    tx, ty = fx.astype(np.int64), fy.astype(np.int64)
+    col = np.minimum(((fx - tx) * TILE_CELLS).astype(np.int64), TILE_CELLS - 1)
+    row = np.minimum(((fy - ty) * TILE_CELLS).astype(np.int64), TILE_CELLS - 1)
+
+    # One key per (tile, cell); sorting by it groups tiles and orders cells
+    key = ((tx * 2 ** z + ty) * TILE_CELLS + row) * TILE_CELLS + col
+    keys, inverse, counts = np.unique(key, return_inverse=True, return_counts=True)
+    weights = np.bincount(inverse, weights=np.asarray(weight, dtype=np.float64))
+
+    tiles = {}
+    for k, count, w in zip(keys.tolist(), counts.tolist(), weights.tolist()):
+        k, c = divmod(k, TILE_CELLS)
+        k, r = divmod(k, TILE_CELLS)
+        tile_x, tile_y = divmod(k, 2 ** z)
+        tiles.setdefault((tile_x, tile_y), []).append([r, c, count, round(w, 2)])
+    return tiles
+
+
+def merge_children(children: List[Tuple[int, int, List[list]]]) -> List[list]:
+    """
+    Parent grid from its children's grids.
+
+    Args:
+        children: (dx, dy, cells) of each child quadrant
+
+    Returns:
+        Cells of the parent, each summing 2x2 child cells
+    """
+    half = TILE_CELLS // 2
+    merged = {}
+    for dx, dy, cells in children:
+        for r, c, count, w in cells:
+            cell = merged.setdefault((dy * half + r // 2, dx * half + c // 2), [0, 0.0])
+            cell[0] += count
+            cell[1] += w
+    return [[r, c, count, round(w, 2)] for (r, c), (count, w) in sorted(merged.items())]
+
+
+def tile_body(cells: List[list]) -> bytes:
+    """Tile body; bodies don't name their tile, so equal grids share one object"""
+    return json.dumps({"size": TILE_CELLS, "cells": cells}, separators=(",", ":")).encode()
+
+
+EMPTY_TILE = tile_body([])
+EMPTY_TILE_DIGEST = hashlib.sha256(EMPTY_TILE).hexdigest()
+
+
+class TileCache:
+    """
+    Content-addressed tile store on disk.
+
+    Layout: objects/<aa>/<sha256> holds tile bodies, tiles/<z>/<x>/<y>
+    holds the digest of a tile's current body, or a "-<time>" tombstone
+    after invalidation. A tile computed before its tombstone was written
+    is served but not indexed, so a concurrent invalidation is never lost.
+
+    Methods do blocking file I/O; async code calls them through
+    asyncio.to_thread.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _index_path(self, z: int, x: int, y: int) -> str:
+        return os.path.join(self.directory, "tiles", str(z), str(x), str(y))
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "objects", digest[:2], digest)
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, staging = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(staging, path)
+
+    def _read_index(self, z: int, x: int, y: int) -> Optional[str]:
+        try:
+            with open(self._index_path(z, x, y)) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def lookup(self, z: int, x: int, y: int) -> Optional[str]:
+        """Digest of a tile's cached body, None if missing or invalidated"""
+        entry = self._read_index(z, x, y)
+        if not entry or entry.startswith("-"):
+            return None
+        return entry
+
+    def read(self, digest: str) -> Optional[bytes]:
+        try:
+            with open(self._object_path(digest), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def fetch(self, z: int, x: int, y: int) -> Optional[Tuple[str, bytes]]:
+        """(digest, body) of a cached tile, None if missing or invalidated"""
+        digest = self.lookup(z, x, y)
+        body = self.read(digest) if digest else None
+        return None if body is None else (digest, body)
+
+    def missing(self, tiles: Iterable[Tile]) -> List[Tile]:
+        """The tiles that are not cached"""
+        return [tile for tile in tiles if self.lookup(*tile) is None]
+
+    def store(self, z: int, x: int, y: int, body: bytes, started: float) -> str:
+        """
+        Store a tile body computed from data read at `started`.
+
+        Returns:
+            The body's digest
+        """
+        digest = hashlib.sha256(body).hexdigest()
+        if not os.path.exists(self._object_path(digest)):
+            self._write(self._object_path(digest), body)
+        entry = self._read_index(z, x, y)
+        if not (entry and entry.startswith("-") and float(entry[1:]) >= started):
+            self._write(self._index_path(z, x, y), digest.encode())
+        return digest
+
+    def invalidate(self, tiles: Iterable[Tile]):
+        """Drop tiles; cached (Rwanda) tiles get a tombstone"""
+        tombstone = f"-{time.time()}".encode()
+        for z, x, y in tiles:
+            if z <= MAX_ZOOM and intersects_rwanda(z, x, y):
+                self._write(self._index_path(z, x, y), tombstone)
+
+    def invalidate_location(self, location: Optional[dict]):
+        """Drop every tile containing a report location"""
+        self.invalidate_locations([location])
+
+    def invalidate_locations(self, locations: Iterable[Optional[dict]]):
+        """Drop every tile containing one of the report locations"""
+        tiles = set()
+        for location in locations:
+            try:
+                lat, lng = float(location["lat"]), float(location["lng"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            tiles.update(tiles_containing(lat, lng))
+        self.invalidate(tiles)
+
+    def clear(self):
+        """Drop every tile (objects are kept for reuse)"""
+        shutil.rmtree(os.path.join(self.directory, "tiles"), ignore_errors=True)
+
+    def read_swept(self) -> Optional[datetime]:
+        try:
+            with open(os.path.join(self.directory, "swept")) as f:
+                return datetime.fromisoformat(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def write_swept(self, swept: datetime):
+        self._write(os.path.join(self.directory, "swept"), swept.isoformat().encode())
+
+
+tile_cache = TileCache(settings.HEATMAP_TILE_CACHE_DIR)
+
+
+def heatmap_since(now: datetime) -> datetime:
+    """Start of the heatmap window: the last HEATMAP_DAYS days, today included"""
+    return datetime(now.year, now.month, now.day) - timedelta(days=HEATMAP_DAYS - 1)
+
+
+def heatmap_query(now: datetime) -> dict:
+    """Reports shown on the heatmap (counted in the heatmap_cells rollup)"""
+    return {
+        "inHeatmap": True,
+        "timestamp": {"$gte": heatmap_since(now)},
+        "location.lat": {"$type": "number"},
+        "location.lng": {"$type": "number"}
+    }
+
+
+async def load_points(db, query: dict):
+    """lat, lng and heatmap weight arrays of the matching reports"""
+    lat, lng, weight = [], [], []
+    cursor = db["reports"].find(query, {"_id": 0, "location": 1, "heatmapWeight": 1})
+    async for report in cursor:
+        lat.append(report["location"]["lat"])
+        lng.append(report["location"]["lng"])
+        heatmap_weight = report.get("heatmapWeight")
+        weight.append(DEFAULT_TRUST_WEIGHT if heatmap_weight is None else heatmap_weight)
+    return np.array(lat), np.array(lng), np.array(weight)
+
+
+async def _compute_from_reports(db, z: int, x: int, y: int) -> List[list]:
+    query = heatmap_query(datetime.utcnow())
+    query.update(bounds_query(tile_bounds(z, x, y)))
+    lat, lng, weight = await load_points(db, query)
+    return bin_tiles(lat, lng, weight, z).get((x, y), [])
+
+
+async def get_tile(db, z: int, x: int, y: int, cache: TileCache = tile_cache) -> Tuple[str, bytes]:
+    """
+    A tile's body and digest, computed and cached if needed.
+
+    Rwanda tiles below BASE_ZOOM are merged from their children, base
+    tiles are binned from the reports inside them. Tiles outside Rwanda
+    are empty and not cached.
+    """
+    if z > MAX_ZOOM or not intersects_rwanda(z, x, y):
+        return EMPTY_TILE_DIGEST, EMPTY_TILE
+
+    cached = await asyncio.to_thread(cache.fetch, z, x, y)
+    if cached is not None:
+        return cached
+
+    started = time.time()
+    if z < BASE_ZOOM:
+        children = []
+        for dx in (0, 1):
+            for dy in (0, 1):
+                _, child = await get_tile(db, z + 1, 2 * x + dx, 2 * y + dy, cache)
+                children.append((dx, dy, json.loads(child)["cells"]))
+        cells = merge_children(children)
+    else:
+        cells = await _compute_from_reports(db, z, x, y)
+
+    body = tile_body(cells)
+    return await asyncio.to_thread(cache.store, z, x, y, body, started), body
+
+
+async def warm_tiles(db, cache: TileCache = tile_cache) -> int:
+    """
+    Precompute the pyramid over Rwanda, zoom 0 to BASE_ZOOM.
+
+    When many base tiles are missing (first start, after a sweep) they are
+    binned from one query over Rwanda instead of one query per tile.
+
+    Returns:
+        Number of tiles that were missing
+    """
+    base_tiles = tiles_covering(RWANDA_BOUNDS, BASE_ZOOM)
+    missing = await asyncio.to_thread(cache.missing, base_tiles)
+
+    if len(missing) > BULK_MIN_TILES:
+        started = time.time()
+        # Bounds of the base tiles, which reach past Rwanda's
+        xs = [x for _, x, _ in base_tiles]
+        ys = [y for _, _, y in base_tiles]
+        _, west, north, _ = tile_bounds(BASE_ZOOM, min(xs), min(ys))
+        south, _, _, east = tile_bounds(BASE_ZOOM, max(xs), max(ys))
+        query = heatmap_query(datetime.utcnow())
+        query.update(bounds_query((south, west, north, east)))
+        lat, lng, weight = await load_points(db, query)
+        binned = bin_tiles(lat, lng, weight, BASE_ZOOM)
+
+        def store_missing():
+            for z, x, y in missing:
+                cache.store(z, x, y, tile_body(binned.get((x, y), [])), started)
+        await asyncio.to_thread(store_missing)
+
+    computed = len(missing)
+    for z in range(BASE_ZOOM, -1, -1):
+        for tile in await asyncio.to_thread(cache.missing, tiles_covering(RWANDA_BOUNDS, z)):
+            if z < BASE_ZOOM:
+                computed += 1
+            await get_tile(db, *tile, cache=cache)
+    return computed
+
+
+async def sweep_expired(db, cache: TileCache = tile_cache) -> int:
+    """
+    Invalidate the tiles of reports that left the window since the last sweep.
+
+    Returns:
+        Number of expired reports
+    """
+    now = datetime.utcnow()
+    swept = await asyncio.to_thread(cache.read_swept)
+    if swept is None:
+        # Unknown age of the cached tiles: start over
+        await asyncio.to_thread(cache.clear)
+        await asyncio.to_thread(cache.write_swept, now)
+        return 0
+
+    cursor = db["reports"].find(
+        {"timestamp": {"$gte": heatmap_since(swept), "$lt": heatmap_since(now)}},
+        {"_id": 0, "location": 1}
+    )
+    locations = [report.get("location") async for report in cursor]
+    await asyncio.to_thread(cache.invalidate_locations, locations)
+    await asyncio.to_thread(cache.write_swept, now)
+    return len(locations)
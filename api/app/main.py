@@ -2,12 +2,16 @@ from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from contextlib import asynccontextmanager
+import asyncio
 from typing import Optional
 from datetime import datetime
 import os
 
 from .routes import auth, reports, clusters, chats, alerts, admin, heatmap
 from .database import database
+from .cluster_jobs import cluster_jobs
+from .heatmap_cells import run_heatmap_maintenance
+from .clustering import persist
 from .config import settings
 from .auth import get_password_hash
 
@@ -50,8 +54,17 @@ async def lifespan(app: FastAPI):
     # Create default admin user
     await create_default_admin()
     
+    # Index for active-generation cluster reads
+    await persist.ensure_indexes_async(database.db)
+    await cluster_jobs.ensure_indexes()
+    
+    # Keep the heatmap rollup and tile pyramid current
+    heatmap_maintenance = asyncio.create_task(run_heatmap_maintenance(database.db))
+    
     yield
     # Shutdown
+    heatmap_maintenance.cancel()
+    cluster_jobs.shutdown()
     await database.disconnect()
     print("👋 Database disconnected")
 
@@ -179,7 +179,11 @@ class SystemConfig(BaseModel):
         "refreshInterval": 30,  # minutes
         "minSamples": 3,
         "epsilon": 0.005,  # ~500m
-        "enabled": True
+        "epsilonMeters": 500,
+        "enabled": True,
+        "mode": "spatial",  # or "spatiotemporal" (ST-DBSCAN)
+        "temporalEpsMinutes": 60,
+        "decayHalfLifeHours": 6
     }
     updatedAt: datetime = Field(default_factory=datetime.utcnow)
     updatedBy: str = "system"
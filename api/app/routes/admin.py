@@ -6,6 +6,8 @@ from ..database import get_users_collection, get_config_collection, get_fingerpr
 from ..auth import get_current_active_user
 from ..models import SystemConfig
 from ..trust_scoring import get_abuse_analytics, cleanup_old_fingerprints
+from ..cluster_jobs import cluster_jobs
+from ..clustering import compute_sweep, load_report_columns_async, pipeline, trust
 
 router = APIRouter()
 
@@ -158,19 +160,21 @@ async def get_admin_stats(current_user: dict = Depends(get_current_active_user))
     if current_user.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    from ..database import get_reports_collection, get_clusters_collection, get_chats_collection, get_alerts_collection
+    from ..database import database, get_reports_collection, get_chats_collection, get_alerts_collection
+    from ..clustering import persist
     from datetime import timedelta
     
     users_collection = get_users_collection()
     reports_collection = get_reports_collection()
-    clusters_collection = get_clusters_collection()
     chats_collection = get_chats_collection()
     alerts_collection = get_alerts_collection()
     
     # Basic counts
     total_users = await users_collection.count_documents({})
     total_reports = await reports_collection.count_documents({})
-    active_clusters = await clusters_collection.count_documents({})
+    active = await persist.get_active_generation_async(database.db)
+    # Hotspots of the default (24h) window; other windows are extra views
+    active_clusters = active.get("windowCounts", {}).get(persist.DEFAULT_WINDOW, active["clusterCount"]) if active else 0
     total_chats = await chats_collection.count_documents({})
     total_alerts = await alerts_collection.count_documents({})
     
@@ -201,11 +205,7 @@ async def get_admin_stats(current_user: dict = Depends(get_current_active_user))
     })
     
     # Get last cluster run time
-    last_cluster = await clusters_collection.find_one(
-        {}, 
-        sort=[("timestamp", -1)]
-    )
-    last_cluster_run = last_cluster.get("timestamp") if last_cluster else None
+    last_cluster_run = active.get("activatedAt") if active else None
     
     # Top categories
     category_pipeline = [
@@ -286,6 +286,101 @@ async def update_system_config(
     return {"message": "Configuration updated successfully"}
 
 
+# ============================================
+# CLUSTERING PARAMETER SWEEP
+# ============================================
+
+MAX_SWEEP_VALUES = 10  # Per parameter, so at most 100 combinations
+MAX_SWEEP_EPS_METERS = 5000
+
+class ClusterSweepRequest(BaseModel):
+    epsilonMeters: List[float] = [250, 500, 750, 1000]
+    minSamples: List[float] = [2, 3, 4, 5]
+
+@router.post("/clustering/sweep")
+async def start_cluster_sweep(
+    sweep: ClusterSweepRequest,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Queue a parameter sweep over the last 24 hours of reports.
+    
+    The neighbor graph is built once at the largest epsilon and every
+    (epsilonMeters, minSamples) pair is derived from it. Poll
+    GET /clustering/sweep/{job_id} for the per-pair statistics.
+    """
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    eps_values = sorted(set(sweep.epsilonMeters))
+    min_samples_values = sorted(set(sweep.minSamples))
+    if not eps_values or not min_samples_values:
+        raise HTTPException(status_code=400, detail="epsilonMeters and minSamples must not be empty")
+    if len(eps_values) > MAX_SWEEP_VALUES or len(min_samples_values) > MAX_SWEEP_VALUES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SWEEP_VALUES} values per parameter")
+    if eps_values[0] <= 0 or eps_values[-1] > MAX_SWEEP_EPS_METERS or min_samples_values[0] <= 0:
+        raise HTTPException(status_code=400, detail=f"epsilonMeters must be in (0, {MAX_SWEEP_EPS_METERS}] and minSamples positive")
+    
+    async def run(job: dict) -> dict:
+        return await _run_sweep(eps_values, min_samples_values)
+    
+    # Identical sweeps requested while one is pending are merged
+    job, merged = await cluster_jobs.submit(f"sweep:{eps_values}:{min_samples_values}", run)
+    
+    return {
+        "message": "Sweep already pending" if merged else "Sweep queued",
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "merged": merged
+    }
+
+@router.get("/clustering/sweep/{job_id}")
+async def get_cluster_sweep(
+    job_id: str,
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Get the status and results of a parameter sweep"""
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    job = await cluster_jobs.get(job_id)
+    if not job or not job["kind"].startswith("sweep:"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "result": job["result"],
+        "error": job["error"]
+    }
+
+async def _run_sweep(eps_values: List[float], min_samples_values: List[float]) -> dict:
+    """Load the clustering window and sweep it in the process pool"""
+    reports = await load_report_columns_async(get_reports_collection(), pipeline.recent_reports_query())
+    
+    # Same weights as the clustering runs: the devices' current trust
+    trust_table = await trust.load_trust_table_async(
+        get_fingerprints_collection(), trust.distinct_fingerprints(reports)
+    )
+    reports, _ = trust.apply_live_trust(reports, trust_table)
+    
+    if len(reports) < 2:
+        return {"message": "Not enough reports for clustering", "reports_analyzed": len(reports), "results": []}
+    
+    results = await cluster_jobs.run_in_pool(
+        compute_sweep, reports.lat, reports.lng, reports.weights, eps_values, min_samples_values
+    )
+    
+    return {
+        "message": "Sweep completed",
+        "reports_analyzed": len(reports),
+        "results": results
+    }
+
+
 # ============================================
 # ABUSE ANALYTICS ENDPOINTS
 # ============================================
@@ -1,41 +1,88 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+import asyncio
+from fastapi import APIRouter, HTTPException, Query
+from typing import List, Optional
 from datetime import datetime, timedelta
-from ..database import get_reports_collection, get_clusters_collection, get_config_collection
-from sklearn.cluster import DBSCAN
-import numpy as np
-from bson import ObjectId
+from ..database import database, get_reports_collection, get_clusters_collection, get_config_collection, get_fingerprints_collection
+from ..clustering import backfill, persist, pipeline, trust, windows, compute_clusters, load_report_columns_async
+from ..cluster_jobs import cluster_jobs
+from ..geo_filters import bounds_from_params, time_range
 
 router = APIRouter()
 
+HISTORY_DAYS = 7  # Default history range when only until is given
+HISTORY_LIMIT = 500
+
 async def get_clustering_params():
     """Fetch clustering parameters from system config"""
     config_collection = get_config_collection()
-    config = await config_collection.find_one({})
+    return pipeline.clustering_params(await config_collection.find_one({}))
+
+@router.get("/get", response_model=List[dict])
+async def get_latest_clusters(
+    window: str = Query(windows.DEFAULT_WINDOW, description="Time window, e.g. 1h, 6h, 24h, 7d"),
+    category: Optional[str] = Query(None, description="Hotspots of one report category (default: all categories)"),
+    south: Optional[float] = Query(None, description="Southern edge of the viewport in degrees"),
+    west: Optional[float] = Query(None, description="Western edge of the viewport in degrees"),
+    north: Optional[float] = Query(None, description="Northern edge of the viewport in degrees"),
+    east: Optional[float] = Query(None, description="Eastern edge of the viewport in degrees"),
+    since: Optional[datetime] = Query(None, description="Clusters of past windows ending from this time (cluster history)"),
+    until: Optional[datetime] = Query(None, description="Clusters of past windows ending before this time (default: now)")
+):
+    """
+    Get the current hotspots, or with since/until the clusters of past
+    windows ending in that range (written by the clustering backfill).
+    A bounding box keeps the clusters whose center lies in the viewport.
+    """
+    try:
+        windows.parse_window(window)
+        bounds = bounds_from_params(south, west, north, east)
+        history_range = time_range(since, until, HISTORY_DAYS) if since or until else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    if config and "clustering" in config:
-        return {
-            "eps": config["clustering"].get("epsilon", 0.005),
-            "min_samples": config["clustering"].get("minSamples", 3),
-            "enabled": config["clustering"].get("enabled", True)
+    if bounds:
+        bounds_filter = {
+            "center.lat": {"$gte": bounds[0], "$lt": bounds[2]},
+            "center.lng": {"$gte": bounds[1], "$lt": bounds[3]}
         }
+    else:
+        bounds_filter = {}
+    
+    if history_range:
+        query = {
+            "window": window,
+            "windowEnd": {"$gte": history_range[0], "$lt": history_range[1]},
+            "category": category,
+            **bounds_filter
+        }
+        cursor = database.db[backfill.HISTORY_COLLECTION].find(query).sort(
+            [("windowEnd", -1), ("reportCount", -1)]
+        ).limit(HISTORY_LIMIT)
+        
+        clusters = []
+        async for cluster in cursor:
+            cluster["id"] = cluster.get("hotspotId") or str(cluster["_id"])
+            del cluster["_id"]
+            clusters.append(cluster)
+        return clusters
     
-    # Default parameters
-    return {"eps": 0.005, "min_samples": 3, "enabled": True}
-
-@router.get("/get", response_model=List[dict])
-async def get_latest_clusters():
     clusters_collection = get_clusters_collection()
     
-    # Get clusters from last hour
+    # Only the active generation: one complete clustering run,
+    # and only if it was published within the last hour
+    active = await persist.get_active_generation_async(database.db)
     one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-    cursor = clusters_collection.find({
-        "timestamp": {"$gte": one_hour_ago}
-    }).sort("timestamp", -1).limit(50)
+    if not active or active["activatedAt"] < one_hour_ago:
+        return []
+    
+    cursor = clusters_collection.find(
+        {**persist.visible_query(active["generation"], window, category), **bounds_filter}
+    ).sort("reportCount", -1).limit(50)
     
     clusters = []
     async for cluster in cursor:
-        cluster["id"] = str(cluster["_id"])
+        # Hotspot ids are stable across runs
+        cluster["id"] = cluster["hotspotId"]
         del cluster["_id"]
         clusters.append(cluster)
     
@@ -49,78 +96,82 @@ async def get_cluster_params():
 
 @router.post("/refresh")
 async def refresh_clusters():
-    """Run DBSCAN clustering on recent reports using configurable parameters"""
-    reports_collection = get_reports_collection()
-    clusters_collection = get_clusters_collection()
+    """
+    Queue DBSCAN clustering on recent reports using configurable parameters.
     
+    Clustering runs in a background process pool; poll
+    GET /refresh/{job_id} for the result. Requests arriving while a
+    refresh is pending are merged into it.
+    """
     # Get clustering parameters from config
     params = await get_clustering_params()
     
     if not params["enabled"]:
         return {"message": "Clustering is disabled", "clusters": 0}
     
-    # Get reports from last 24 hours
-    twenty_four_hours_ago = datetime.utcnow() - timedelta(hours=24)
-    cursor = reports_collection.find({
-        "timestamp": {"$gte": twenty_four_hours_ago}
-    })
+    job, merged = await cluster_jobs.submit("refresh", _run_refresh)
     
-    reports = []
-    async for report in cursor:
-        reports.append(report)
+    return {
+        "message": "Clustering already pending" if merged else "Clustering queued",
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "merged": merged
+    }
+
+@router.get("/refresh/{job_id}")
+async def get_refresh_status(job_id: str):
+    """Get the status and result of a clustering job"""
+    job = await cluster_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
     
-    if len(reports) < 2:
-        return {"message": "Not enough reports for clustering", "clusters": 0}
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "result": job["result"],
+        "error": job["error"]
+    }
+
+async def _run_refresh(job: dict) -> dict:
+    """Fetch reports, cluster them in the process pool and save the clusters"""
+    reports_collection = get_reports_collection()
     
-    # Extract coordinates
-    coords = np.array([[r["location"]["lat"], r["location"]["lng"]] for r in reports])
+    # Parameters may have changed while the job was queued
+    params = await get_clustering_params()
     
-    # Run DBSCAN with configurable parameters
-    db = DBSCAN(eps=params["eps"], min_samples=params["min_samples"]).fit(coords)
-    labels = db.labels_
+    # Reports of the last 24 hours (same filter as the clustering service),
+    # streamed straight into arrays
+    reports = await load_report_columns_async(reports_collection, pipeline.recent_reports_query())
     
-    # Group clusters
-    unique_labels = set(labels)
-    cluster_count = 0
+    # Weigh reports by their devices' current trust, not the score at submission
+    trust_table = await trust.load_trust_table_async(
+        get_fingerprints_collection(), trust.distinct_fingerprints(reports)
+    )
+    reports, _ = trust.apply_live_trust(reports, trust_table)
     
-    for label in unique_labels:
-        if label == -1:  # Noise points
-            continue
-        
-        # Get points in this cluster
-        mask = labels == label
-        cluster_reports = [reports[i] for i, m in enumerate(mask) if m]
-        cluster_coords = coords[mask]
-        
-        # Calculate center and radius
-        center_lat = float(np.mean(cluster_coords[:, 0]))
-        center_lng = float(np.mean(cluster_coords[:, 1]))
-        
-        # Approximate radius
-        distances = np.sqrt(
-            (cluster_coords[:, 0] - center_lat)**2 + 
-            (cluster_coords[:, 1] - center_lng)**2
-        )
-        radius = float(np.max(distances)) * 111000  # Convert degrees to meters
-        
-        # Determine risk level
-        risk_level = "high" if len(cluster_reports) > 5 else "medium"
-        
-        # Save cluster
-        cluster_doc = {
-            "cluster_id": cluster_count,
-            "center": {"lat": center_lat, "lng": center_lng},
-            "radius": radius,
-            "points": [str(r["_id"]) for r in cluster_reports],
-            "riskLevel": risk_level,
-            "timestamp": datetime.utcnow()
-        }
-        
-        await clusters_collection.insert_one(cluster_doc)
-        cluster_count += 1
+    if len(reports) < 2:
+        return {"message": "Not enough reports for clustering", "clusters": 0, "reports_analyzed": len(reports)}
+    
+    # Trust-weighted DBSCAN and summarization run off the event loop
+    cluster_docs = await cluster_jobs.run_in_pool(
+        compute_clusters, reports.ids, reports.lat, reports.lng, reports.weights, reports.trust_scores,
+        params["eps_meters"], params["min_samples"]
+    )
+    
+    # Diff against the active generation, write only changed hotspots and
+    # switch readers over (pymongo, so off the event loop)
+    published = await asyncio.to_thread(
+        persist.publish_clusters, database.db.delegate, cluster_docs, "api"
+    )
     
     return {
-        "message": "Clustering completed",
-        "clusters": cluster_count,
+        "message": "Clustering completed" if published["activated"] else "Clustering completed, publish skipped (another run in progress)",
+        "clusters": len(cluster_docs),
+        "generation": published["generation"],
+        "written": published["inserted"],
+        "unchanged": published["unchanged"],
         "reports_analyzed": len(reports)
     }
@@ -1,27 +1,124 @@
-from fastapi import APIRouter
-from datetime import datetime, timedelta
-from ..database import get_reports_collection
+import math
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from typing import Optional
+from datetime import datetime
+from ..database import database
+from ..geo_filters import bounds_from_params, check_bounds, time_range, whole_days
+from ..heatmap_cells import RESOLUTIONS, load_cell_counts
+from ..heatmap_kde import MAX_SIDE, MIN_BANDWIDTH, density_raster, encode_png
+from ..heatmap_tiles import HEATMAP_DAYS, MAX_ZOOM, get_tile
 
 router = APIRouter()
 
+DEFAULT_RESOLUTION = 3  # Decimal places of the cell grid, ~110 m cells
+METERS_PER_DEGREE = 111320
+TILE_MAX_AGE = 60  # Seconds browsers may reuse a tile without revalidating
+DEFAULT_BANDWIDTH = 200  # Meters, the radius clients used to draw per point
+
 @router.get("/data")
-async def get_heatmap_data():
-    """Return anonymized incident locations for public heatmap"""
-    reports_collection = get_reports_collection()
-    
-    # Get reports from last 30 days
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    cursor = reports_collection.find({
-        "timestamp": {"$gte": thirty_days_ago}
-    })
+async def get_heatmap_data(
+    resolution: int = Query(DEFAULT_RESOLUTION, ge=min(RESOLUTIONS), le=max(RESOLUTIONS), description="Cell size as decimal places of a degree (1 ≈ 11 km, 3 ≈ 110 m)"),
+    south: Optional[float] = Query(None, description="Southern edge of the viewport in degrees"),
+    west: Optional[float] = Query(None, description="Western edge of the viewport in degrees"),
+    north: Optional[float] = Query(None, description="Northern edge of the viewport in degrees"),
+    east: Optional[float] = Query(None, description="Eastern edge of the viewport in degrees"),
+    since: Optional[datetime] = Query(None, description="Start of the time range, rounded down to the UTC day (default: 30 days before until)"),
+    until: Optional[datetime] = Query(None, description="End of the time range, rounded up to the UTC day (default: now)")
+):
+    """
+    Return anonymized incident density per grid cell for the public heatmap.
     
-    heatmap_points = []
-    async for report in cursor:
-        # Anonymize by rounding coordinates
-        heatmap_points.append({
-            "lat": round(report["location"]["lat"], 3),
-            "lng": round(report["location"]["lng"], 3),
-            "radius": 200
+    Cells come from the heatmap_cells rollup of the last 30 days. A time
+    range is widened to whole UTC days; its days within those 30 are read
+    from the rollup as well, only earlier days are grouped from the
+    visible reports into the same cells (at most 3 decimals, ~110 m). A
+    bounding box limits either to the viewport.
+    """
+    try:
+        bounds = bounds_from_params(south, west, north, east)
+        window = whole_days(time_range(since, until, HEATMAP_DAYS)) if since or until else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    cell_size = 10 ** -resolution
+    # Circle around the cell center reaching its corners
+    radius = round(cell_size * METERS_PER_DEGREE * math.sqrt(2) / 2)
+
+    counts = await load_cell_counts(database.db, resolution, bounds, window)
+    cells = []
+    for (lat, lng), (count, weight) in counts.items():
+        cells.append({
+            "lat": round((lat + 0.5) * cell_size, resolution + 1),
+            "lng": round((lng + 0.5) * cell_size, resolution + 1),
+            "radius": radius,
+            "count": count,
+            "weight": round(weight, 2)
         })
+
+    return cells
+
+@router.get("/tiles/{z}/{x}/{y}")
+async def get_heatmap_tile(
+    z: int,
+    x: int,
+    y: int,
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Return the density grid of one Web Mercator tile.
+    
+    The body lists [row, col, count, weight] for the non-empty cells of a
+    size x size grid, rows counted from the tile's north edge. Tiles are
+    served from the tile cache; the ETag is the body's content hash.
+    """
+    if not 0 <= z <= MAX_ZOOM:
+        raise HTTPException(status_code=400, detail=f"Zoom must be between 0 and {MAX_ZOOM}")
+    if not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    
+    digest, body = await get_tile(database.db, z, x, y)
+    headers = {"ETag": f'"{digest}"', "Cache-Control": f"public, max-age={TILE_MAX_AGE}"}
+    if if_none_match == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/kde")
+async def get_heatmap_density(
+    south: float = Query(..., description="Southern edge in degrees"),
+    west: float = Query(..., description="Western edge in degrees"),
+    north: float = Query(..., description="Northern edge in degrees"),
+    east: float = Query(..., description="Eastern edge in degrees"),
+    width: int = Query(256, ge=16, le=MAX_SIDE, description="Raster width in pixels, reduced over small bounds so pixels stay ~110 m or wider; the height keeps pixels square"),
+    bandwidth: float = Query(DEFAULT_BANDWIDTH, ge=MIN_BANDWIDTH, le=5000, description="Gaussian kernel standard deviation in meters"),
+    weighted: bool = Query(True, description="Weight reports by trust weight"),
+    format: str = Query("png", pattern="^(png|raw)$", description="png (8-bit grayscale) or raw (uint8, row-major)"),
+    since: Optional[datetime] = Query(None, description="Start of the time range, rounded down to the UTC day (default: the rollup's last 30 days)"),
+    until: Optional[datetime] = Query(None, description="End of the time range, rounded up to the UTC day (default: now)")
+):
+    """
+    Return a kernel density raster of the heatmap over a bounding box.
+    
+    Pixels are uint8, row 0 at the north edge, in Web Mercator so the image
+    can be stretched over the bounds as a map overlay; X-Heatmap-Width and
+    X-Heatmap-Height give the size returned. Pixel value v stands for
+    v / 255 * X-Heatmap-Max-Density (per km²).
+    """
+    try:
+        bounds = check_bounds((south, west, north, east))
+        window = whole_days(time_range(since, until, HEATMAP_DAYS)) if since or until else None
+        raster, info = await density_raster(
+            database.db, bounds, width, bandwidth, weighted, time_range=window
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return heatmap_points
+    headers = {
+        "X-Heatmap-Bounds": ",".join(str(edge) for edge in info["bounds"]),
+        "X-Heatmap-Width": str(info["width"]),
+        "X-Heatmap-Height": str(info["height"]),
+        "X-Heatmap-Max-Density": str(info["maxDensity"]),
+        "Access-Control-Expose-Headers": "X-Heatmap-Bounds, X-Heatmap-Width, X-Heatmap-Height, X-Heatmap-Max-Density"
+    }
+    if format == "raw":
+        return Response(content=raster.tobytes(), media_type="application/octet-stream", headers=headers)
+    return Response(content=encode_png(raster), media_type="image/png", headers=headers)
@@ -6,8 +6,10 @@ from pydantic import BaseModel
 import random
 import string
 from ..models import Report, ReportCreate
-from ..database import get_reports_collection, get_fingerprints_collection
+from ..database import database, get_reports_collection, get_fingerprints_collection
 from ..auth import get_current_active_user
+from ..geo_filters import geo_point
+from ..heatmap_cells import add_report, record_report, remove_report
 from ..trust_scoring import (
     get_or_create_fingerprint_record,
     check_for_flood,
@@ -101,7 +103,10 @@ async def submit_report(report_data: ReportCreate):
         )
     
     # Build report document
+    location = report_dict["location"]
+    report_dict["location"] = geo_point(location["lat"], location["lng"])
     report_dict["timestamp"] = datetime.utcnow()
+    report_dict["updatedAt"] = report_dict["timestamp"]
     report_dict["status"] = "new" if not is_delayed else "pending_review"
     report_dict["priority"] = "medium"
     report_dict["credibilityScore"] = trust_weight
@@ -112,6 +117,10 @@ async def submit_report(report_data: ReportCreate):
     report_dict["verifiedByPolice"] = False
     report_dict["isDelayed"] = is_delayed
     report_dict["delayedUntil"] = delayed_until
+    # Delayed reports join the heatmap once approved or their delay expires
+    report_dict["inHeatmap"] = not is_delayed
+    if not is_delayed:
+        report_dict["heatmapWeight"] = trust_weight
     report_dict["referenceNumber"] = generate_reference_number()
     report_dict["statusHistory"] = [{
         "status": "new" if not is_delayed else "pending_review",
@@ -121,6 +130,8 @@ async def submit_report(report_data: ReportCreate):
     }]
     
     result = await reports_collection.insert_one(report_dict)
+    if report_dict["inHeatmap"]:
+        await record_report(database.db, report_dict)
     
     response = {
         "id": str(result.inserted_id),
@@ -363,6 +374,7 @@ async def mark_report_as_fake(
             }
         }
     )
+    await remove_report(database.db, report["_id"])
     
     # Update trust score for the device fingerprint
     fingerprint = report.get("deviceFingerprint")
@@ -429,6 +441,8 @@ async def verify_report(
             }
         }
     )
+    if report.get("isDelayed"):
+        await add_report(database.db, report["_id"])
     
     # Update trust score for the device fingerprint
     fingerprint = report.get("deviceFingerprint")
@@ -522,6 +536,8 @@ async def approve_delayed_report(
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Report not found or not in delayed queue")
     
+    await add_report(database.db, ObjectId(report_id))
+    
     return {"message": "Report approved and moved to active queue"}
 
 
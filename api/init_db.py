@@ -28,6 +28,7 @@ def init_database():
         db.users.delete_many({})
         db.reports.delete_many({})
         db.clusters.delete_many({})
+        db.heatmap_cells.delete_many({})
         db.chats.delete_many({})
         db.alerts.delete_many({})
         print("✅ All collections cleared")
@@ -58,9 +59,20 @@ def init_database():
         db.users.create_index("email", unique=True)
         db.users.create_index("role")
         db.reports.create_index("timestamp")
+        db.reports.create_index("updatedAt")
         db.reports.create_index("status")
         db.reports.create_index("user_id")
+        db.fingerprints.create_index("updated_at")
         db.clusters.create_index("timestamp")
+        db.clusters.create_index([("retiredGeneration", 1), ("sinceGeneration", 1)])
+        db.clusters.create_index("hotspotId")
+        db.clusters.create_index([("window", 1), ("retiredGeneration", 1), ("sinceGeneration", 1)])
+        db.clusters.create_index([("category", 1), ("window", 1), ("retiredGeneration", 1), ("sinceGeneration", 1)])
+        db.cluster_history.create_index([("windowEnd", 1), ("window", 1), ("category", 1)])
+        db.cluster_history.create_index([("window", 1), ("windowEnd", -1)])
+        db.reports.create_index([("location", "2dsphere"), ("timestamp", 1)])
+        db.heatmap_cells.create_index([("resolution", 1), ("day", 1), ("lat", 1), ("lng", 1)], unique=True)
+        db.heatmap_cells.create_index("day")
         db.chats.create_index("report_id")
         db.alerts.create_index("timestamp")
         print("✅ Indexes created")
@@ -0,0 +1,104 @@
+"""
+Report location migration
+- Converts report locations from {lat, lng} to GeoJSON points that keep
+  their lat/lng keys: {type: "Point", coordinates: [lng, lat], lat, lng}
+- Creates the 2dsphere index used by bounding box queries
+
+Safe to rerun: converted reports are skipped. Reports with missing or
+out-of-range coordinates are left as they are and listed; the index is
+only built once none are left, since MongoDB would read an unconverted
+{lat, lng} subdocument as a legacy [lng, lat] pair.
+"""
+
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import OperationFailure
+import os
+
+BATCH_SIZE = 1000
+LOCATION_INDEX = [("location", "2dsphere"), ("timestamp", 1)]
+
+
+def valid_coordinates(location):
+    """lat, lng of a location subdocument, or None if unusable"""
+    if not isinstance(location, dict):
+        return None
+    lat, lng = location.get("lat"), location.get("lng")
+    if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in (lat, lng)):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def migrate_report_locations(db):
+    """
+    Convert every unconverted report location.
+
+    Returns:
+        (converted, invalid report ids)
+    """
+    reports = db.reports
+    converted = 0
+    invalid = []
+    operations = []
+
+    cursor = reports.find({"location.type": {"$ne": "Point"}}, {"location": 1})
+    for report in cursor:
+        coordinates = valid_coordinates(report.get("location"))
+        if coordinates is None:
+            invalid.append(report["_id"])
+            continue
+        lat, lng = coordinates
+        operations.append(UpdateOne(
+            {"_id": report["_id"], "location.type": {"$ne": "Point"}},
+            {"$set": {"location.type": "Point", "location.coordinates": [lng, lat]}}
+        ))
+        if len(operations) >= BATCH_SIZE:
+            converted += reports.bulk_write(operations, ordered=False).modified_count
+            operations = []
+            print(f"   {converted} reports converted...")
+    if operations:
+        converted += reports.bulk_write(operations, ordered=False).modified_count
+
+    return converted, invalid
+
+
+def main():
+    MONGODB_URL = os.getenv('MONGODB_URL', 'mongodb://localhost:27017')
+    DATABASE_NAME = os.getenv('DATABASE_NAME', 'neighborwatch')
+
+    client = MongoClient(MONGODB_URL)
+    db = client[DATABASE_NAME]
+
+    print("🔄 Converting report locations to GeoJSON...")
+    try:
+        converted, invalid = migrate_report_locations(db)
+        print(f"✅ Converted {converted} reports")
+
+        if invalid:
+            print(f"⚠️  {len(invalid)} reports have missing or invalid coordinates:")
+            for report_id in invalid[:20]:
+                print(f"   - {report_id}")
+            if len(invalid) > 20:
+                print(f"   ... and {len(invalid) - 20} more")
+            print("   Fix or remove them and rerun to build the 2dsphere index.")
+            return 1
+
+        print("🔧 Creating 2dsphere index on reports.location...")
+        db.reports.create_index(LOCATION_INDEX)
+        print("✅ Index created")
+        return 0
+    except OperationFailure as e:
+        print(f"❌ Migration failed: {e}")
+        return 1
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    print("=" * 60)
+    print("  NeighborWatch Connect - Report Location Migration")
+    print("=" * 60)
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Benchmark: degree-space DBSCAN vs projected KD-tree DBSCAN
+
+Compares the previous clustering path (scikit-learn DBSCAN with Euclidean
+distance on raw lat/lng degrees, radius via x111000) with hotspots.geo
+(projected meters, one KD-tree reused for the neighbor graph).
+
+Synthetic reports are spread over Rwanda's bounding box with a share of
+them concentrated in Gaussian hotspots.
+
+Usage:
+    python bench_geo_index.py [--sizes 10000 100000 1000000] [--eps-meters 500]
+"""
+
+import argparse
+import time
+import numpy as np
+from sklearn.cluster import DBSCAN
+
+from hotspots.geo import GeoIndex, METERS_PER_DEGREE
+
+# Rwanda bounding box
+LAT_RANGE = (-2.84, -1.05)
+LNG_RANGE = (28.86, 30.90)
+
+
+def synthetic_reports(n, hotspot_share=0.05, hotspots=500, spread_m=1000, seed=42):
+    """Uniform background plus Gaussian hotspots (lat, lng in degrees)"""
+    rng = np.random.default_rng(seed)
+    n_hot = int(n * hotspot_share)
+    n_bg = n - n_hot
+
+    lat = rng.uniform(*LAT_RANGE, n_bg)
+    lng = rng.uniform(*LNG_RANGE, n_bg)
+
+    centers_lat = rng.uniform(*LAT_RANGE, hotspots)
+    centers_lng = rng.uniform(*LNG_RANGE, hotspots)
+    pick = rng.integers(0, hotspots, n_hot)
+    spread_deg = spread_m / METERS_PER_DEGREE
+    hot_lat = centers_lat[pick] + rng.normal(0, spread_deg, n_hot)
+    hot_lng = centers_lng[pick] + rng.normal(0, spread_deg, n_hot)
+
+    return np.concatenate([lat, hot_lat]), np.concatenate([lng, hot_lng])
+
+
+def bench_degrees(lat, lng, eps_meters, min_samples):
+    start = time.perf_counter()
+    coords = np.column_stack((lat, lng))
+    labels = DBSCAN(eps=eps_meters / METERS_PER_DEGREE, min_samples=min_samples).fit(coords).labels_
+    return labels, time.perf_counter() - start
+
+
+def bench_projected(lat, lng, eps_meters, min_samples):
+    start = time.perf_counter()
+    index = GeoIndex(lat, lng)
+    labels = index.dbscan_labels(eps_meters, min_samples)
+    return labels, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--eps-meters', type=float, default=500)
+    parser.add_argument('--min-samples', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"eps={args.eps_meters:.0f}m, min_samples={args.min_samples}")
+    print(f"{'points':>10} | {'degrees (s)':>12} | {'projected (s)':>13} | {'clusters deg/proj':>17} | {'label agreement':>15}")
+    print("-" * 80)
+    for n in args.sizes:
+        lat, lng = synthetic_reports(n)
+        deg_labels, deg_time = bench_degrees(lat, lng, args.eps_meters, args.min_samples)
+        proj_labels, proj_time = bench_projected(lat, lng, args.eps_meters, args.min_samples)
+        agreement = np.mean((deg_labels == -1) == (proj_labels == -1))
+        print(f"{n:>10} | {deg_time:>12.2f} | {proj_time:>13.2f} | "
+              f"{len(set(deg_labels.tolist()) - {-1}):>8}/{len(set(proj_labels.tolist()) - {-1}):<8} | "
+              f"{agreement:>14.1%}")
+
+
+if __name__ == "__main__":
+    main()
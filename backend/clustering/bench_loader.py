@@ -0,0 +1,113 @@
+"""
+Benchmark: full-document fetch vs columnar projection loader
+
+Compares the previous fetch path (list(find(query)) of whole report
+documents, then Python lists into NumPy) with hotspots.loader (server-side
+projection streamed into preallocated arrays).
+
+Synthetic reports with realistic payloads (description, photo URL and a
+status history) are written to a scratch database, which is dropped
+afterwards. Peak memory is the Python heap high-water mark (tracemalloc,
+NumPy buffers included) during the fetch.
+
+Needs a running MongoDB:
+    python bench_loader.py [--sizes 10000 100000] [--history 5] [--mongodb-url URL]
+"""
+
+import argparse
+import os
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson import ObjectId
+from pymongo import MongoClient
+
+from hotspots.loader import load_report_columns
+from bench_geo_index import synthetic_reports
+
+BENCH_DATABASE = 'trustbond_loader_bench'
+
+
+def synthetic_documents(n, history, seed=42):
+    """Report documents shaped like the API's, with a status history"""
+    lat, lng = synthetic_reports(n, seed=seed)
+    rng = np.random.default_rng(seed)
+    scores = rng.integers(0, 101, n)
+    now = datetime.utcnow()
+    for i in range(n):
+        yield {
+            '_id': ObjectId(),
+            'reportType': 'suspicious_activity',
+            'description': 'Suspicious activity reported near the market. ' * 6,
+            'location': {
+                'type': 'Point', 'coordinates': [float(lng[i]), float(lat[i])],
+                'lat': float(lat[i]), 'lng': float(lng[i])
+            },
+            'photoUrl': f'https://storage.example.com/reports/{i:08d}.jpg',
+            'timestamp': now - timedelta(minutes=int(rng.integers(0, 1440))),
+            'status': 'pending',
+            'statusHistory': [
+                {'status': 'pending', 'changedAt': now, 'changedBy': 'system', 'note': 'Status update note'}
+                for _ in range(history)
+            ],
+            'trustScore': int(scores[i]),
+            'trustWeight': 0.1 if scores[i] < 40 else scores[i] / 100
+        }
+
+
+def fetch_documents(collection, query):
+    """Previous path: whole documents, then columns"""
+    reports = list(collection.find(query).sort('_id', 1))
+    lat = np.array([r['location']['lat'] for r in reports])
+    lng = np.array([r['location']['lng'] for r in reports])
+    weights = np.array([r.get('trustWeight', 0.5) for r in reports])
+    return len(reports), lat, lng, weights
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--history', type=int, default=5, help='statusHistory entries per report')
+    parser.add_argument('--mongodb-url', default=os.getenv('MONGODB_URL', 'mongodb://localhost:27017'))
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongodb_url)
+    collection = client[BENCH_DATABASE]['reports']
+    query = {'timestamp': {'$gte': datetime.utcnow() - timedelta(hours=24)}}
+
+    print(f"statusHistory entries per report: {args.history}")
+    print(f"{'reports':>10} | {'documents (s)':>13} | {'columns (s)':>11} | {'documents (MB)':>14} | {'columns (MB)':>12}")
+    print("-" * 74)
+    try:
+        for n in args.sizes:
+            collection.drop()
+            documents = synthetic_documents(n, args.history)
+            while True:
+                batch = [doc for _, doc in zip(range(10_000), documents)]
+                if not batch:
+                    break
+                collection.insert_many(batch)
+            collection.create_index('timestamp')
+
+            (count, *_), doc_time, doc_mem = measure(fetch_documents, collection, query)
+            columns, col_time, col_mem = measure(load_report_columns, collection, query)
+            assert count == len(columns)
+            print(f"{n:>10} | {doc_time:>13.2f} | {col_time:>11.2f} | {doc_mem:>14.1f} | {col_mem:>12.1f}")
+    finally:
+        client.drop_database(BENCH_DATABASE)
+
+
+if __name__ == "__main__":
+    main()
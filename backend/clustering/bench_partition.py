@@ -0,0 +1,63 @@
+"""
+Benchmark: single-process vs tile-partitioned weighted DBSCAN
+
+Runs grid.weighted_dbscan once per size as the baseline, then
+partition.partitioned_dbscan with each worker count on a warm process
+pool, checking that the labels are identical. Speedup is limited by the
+machine's cores, which are printed first.
+
+Usage:
+    python bench_partition.py [--sizes 1000000 4000000] [--workers 1 2 4 8] [--eps-meters 500]
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from hotspots.geo import project
+from hotspots.grid import weighted_dbscan
+from hotspots.partition import partitioned_dbscan
+from bench_geo_index import synthetic_reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000_000, 4_000_000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--eps-meters', type=float, default=500)
+    parser.add_argument('--min-samples', type=float, default=3)
+    args = parser.parse_args()
+
+    print(f"cores={os.cpu_count()}, eps={args.eps_meters:.0f}m, min_samples={args.min_samples}")
+    print(f"{'points':>10} | {'workers':>7} | {'time (s)':>8} | {'speedup':>7} | {'identical':>9}")
+    print("-" * 54)
+    rng = np.random.default_rng(7)
+    for n in args.sizes:
+        lat, lng = synthetic_reports(n)
+        points = project(lat, lng)
+        weights = rng.choice([0.3, 0.5, 0.8, 1.0], n)
+
+        start = time.perf_counter()
+        expected = weighted_dbscan(points, weights, args.eps_meters, args.min_samples)
+        baseline = time.perf_counter() - start
+        print(f"{n:>10} | {'single':>7} | {baseline:>8.2f} | {1.0:>6.2f}x | {'-':>9}")
+
+        for workers in args.workers:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Warm the pool so process start-up is not timed
+                list(pool.map(abs, range(workers)))
+                start = time.perf_counter()
+                labels = partitioned_dbscan(
+                    points, weights, args.eps_meters, args.min_samples,
+                    workers=workers, executor=pool
+                )
+                elapsed = time.perf_counter() - start
+            identical = np.array_equal(labels, expected)
+            print(f"{n:>10} | {workers:>7} | {elapsed:>8.2f} | {baseline / elapsed:>6.2f}x | {str(identical):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,15 @@
-import time
 import os
 import requests
-from datetime import datetime, timedelta, UTC
+from datetime import datetime
 from pymongo import MongoClient
-from sklearn.cluster import DBSCAN
-import numpy as np
 from dotenv import load_dotenv
 
+from hotspots.geo import DEFAULT_EPS_METERS
+from hotspots.pipeline import clustering_params, recent_reports_query, cluster_reports
+from hotspots.persist import ensure_indexes, publish_clusters
+from hotspots.loader import load_report_columns
+from hotspots.scheduler import ClusteringScheduler
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -14,7 +17,8 @@ load_dotenv()
 MONGODB_URL = os.getenv('MONGODB_URL', 'mongodb://localhost:27017')
 DATABASE_NAME = os.getenv('DATABASE_NAME', 'neighborwatch')
 API_URL = os.getenv('API_URL', 'http://localhost:8000')
-REFRESH_INTERVAL = 1800  # 30 minutes (as per project scope)
+REFRESH_INTERVAL = int(os.getenv('REFRESH_INTERVAL', '1800'))  # seconds, unless set in config
+CLUSTERING_ENGINE = os.getenv('CLUSTERING_ENGINE', 'sklearn')  # see hotspots.engines
 
 def connect_to_db():
     """Connect to MongoDB"""
@@ -22,89 +26,35 @@ def connect_to_db():
     db = client[DATABASE_NAME]
     return db
 
+def get_clustering_params(db):
+    """Fetch clustering parameters from config collection"""
+    return clustering_params(db['config'].find_one({}))
+
 def fetch_recent_reports(db):
-    """Fetch reports from last 24 hours"""
-    reports_collection = db['reports']
-    twenty_four_hours_ago = datetime.now(UTC) - timedelta(hours=24)
-    
-    reports = list(reports_collection.find({
-        'timestamp': {'$gte': twenty_four_hours_ago}
-    }))
-    
-    return reports
+    """Fetch clustering columns of the last 24 hours (fake and delayed reports excluded)"""
+    return load_report_columns(db['reports'], recent_reports_query())
 
-def run_dbscan_clustering(reports):
-    """Run DBSCAN clustering algorithm"""
+def run_dbscan_clustering(reports, eps_meters=DEFAULT_EPS_METERS, min_samples=3):
+    """Run DBSCAN clustering algorithm (eps in meters) with CLUSTERING_ENGINE"""
     if len(reports) < 2:
         print("Not enough reports for clustering")
         return []
     
-    # Extract coordinates
-    coords = np.array([[r['location']['lat'], r['location']['lng']] for r in reports])
-    
-    # Run DBSCAN
-    # eps=0.005 degrees ≈ 500 meters
-    # min_samples=3 minimum points to form a cluster
-    db = DBSCAN(eps=0.005, min_samples=3).fit(coords)
-    labels = db.labels_
-    
-    # Group into clusters
-    unique_labels = set(labels)
-    clusters = []
-    
-    for label in unique_labels:
-        if label == -1:  # Skip noise points
-            continue
-        
-        # Get points in this cluster
-        mask = labels == label
-        cluster_reports = [reports[i] for i, m in enumerate(mask) if m]
-        cluster_coords = coords[mask]
-        
-        # Calculate center
-        center_lat = float(np.mean(cluster_coords[:, 0]))
-        center_lng = float(np.mean(cluster_coords[:, 1]))
-        
-        # Calculate radius (in meters)
-        distances = np.sqrt(
-            (cluster_coords[:, 0] - center_lat)**2 + 
-            (cluster_coords[:, 1] - center_lng)**2
-        )
-        radius = float(np.max(distances)) * 111000  # Convert degrees to meters
-        
-        # Determine risk level
-        num_reports = len(cluster_reports)
-        if num_reports > 10:
-            risk_level = "critical"
-        elif num_reports > 5:
-            risk_level = "high"
-        else:
-            risk_level = "medium"
-        
-        clusters.append({
-            'cluster_id': int(label),
-            'center': {'lat': center_lat, 'lng': center_lng},
-            'radius': radius,
-            'points': [str(r['_id']) for r in cluster_reports],
-            'riskLevel': risk_level,
-            'reportCount': num_reports,
-            'timestamp': datetime.utcnow()
-        })
-    
-    return clusters
+    # Same pipeline and cluster schema as the trust-weighted service
+    return cluster_reports(reports, eps_meters, min_samples, engine=CLUSTERING_ENGINE)
 
 def save_clusters(db, clusters):
-    """Save clusters to database"""
-    clusters_collection = db['clusters']
+    """
+    Publish clusters as a new generation (readers switch over atomically).
+    Hotspots keep their ids across runs; only changed ones are written.
+    """
+    result = publish_clusters(db, clusters, source='dbscan')
     
-    if clusters:
-        # Clear old clusters (older than 1 hour)
-        one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-        clusters_collection.delete_many({'timestamp': {'$lt': one_hour_ago}})
-        
-        # Insert new clusters
-        clusters_collection.insert_many(clusters)
-        print(f"✅ Saved {len(clusters)} clusters to database")
+    if not result['activated']:
+        print(f"⚠️  Generation {result['generation']} not activated (another run holds the publish lease)")
+    elif clusters:
+        print(f"✅ Saved {len(clusters)} clusters to database (generation {result['generation']}: "
+              f"{result['inserted']} written, {result['unchanged']} unchanged, {result['retired']} retired)")
     else:
         print("ℹ️  No clusters found")
 
@@ -113,50 +63,60 @@ def main():
     print("🚀 DBSCAN Clustering Service Started")
     print(f"   MongoDB: {MONGODB_URL}")
     print(f"   Database: {DATABASE_NAME}")
-    print(f"   Refresh Interval: {REFRESH_INTERVAL}s ({REFRESH_INTERVAL//60} minutes)")
+    print(f"   Engine: {CLUSTERING_ENGINE}")
+    print(f"   Refresh Interval: {REFRESH_INTERVAL}s ({REFRESH_INTERVAL//60} minutes, unless set in config)")
     print("-" * 60)
     
     db = connect_to_db()
+    ensure_indexes(db)
     print("✅ Connected to MongoDB")
     
+    scheduler = ClusteringScheduler(
+        db, 'dbscan', run_clustering_iteration(db),
+        default_interval_minutes=REFRESH_INTERVAL / 60
+    )
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Service stopped by user")
+
+def run_clustering_iteration(db):
+    """One clustering run per call"""
     iteration = 0
-    while True:
-        try:
-            iteration += 1
-            print(f"\n[Iteration #{iteration}] {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            print("Running DBSCAN clustering...")
-            
-            # Fetch reports
-            reports = fetch_recent_reports(db)
-            print(f"📊 Fetched {len(reports)} reports from last 24 hours")
-            
-            # Run clustering
-            clusters = run_dbscan_clustering(reports)
-            print(f"🔍 Found {len(clusters)} clusters")
-            
-            # Save to database
-            save_clusters(db, clusters)
-            
-            # Print cluster details
-            if clusters:
-                print("\n📍 Cluster Details:")
-                for cluster in clusters:
-                    print(f"   Cluster #{cluster['cluster_id']}: "
-                          f"{cluster['reportCount']} reports, "
-                          f"Risk: {cluster['riskLevel'].upper()}, "
-                          f"Center: ({cluster['center']['lat']:.4f}, {cluster['center']['lng']:.4f})")
-            
-            print(f"\n😴 Sleeping for {REFRESH_INTERVAL//60} minutes...")
-            print("-" * 60)
-            time.sleep(REFRESH_INTERVAL)
-            
-        except KeyboardInterrupt:
-            print("\n\n⚠️  Service stopped by user")
-            break
-        except Exception as e:
-            print(f"\n❌ Error: {e}")
-            print(f"   Retrying in 60 seconds...")
-            time.sleep(60)
+    
+    def run():
+        nonlocal iteration
+        iteration += 1
+        print(f"[Iteration #{iteration}] {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print("Running DBSCAN clustering...")
+        
+        # Fetch reports
+        params = get_clustering_params(db)
+        reports = fetch_recent_reports(db)
+        print(f"📊 Fetched {len(reports)} reports from last 24 hours")
+        
+        # Run clustering
+        clusters = run_dbscan_clustering(
+            reports,
+            eps_meters=params['eps_meters'],
+            min_samples=params['min_samples']
+        )
+        print(f"🔍 Found {len(clusters)} clusters")
+        
+        # Save to database
+        save_clusters(db, clusters)
+        
+        # Print cluster details
+        if clusters:
+            print("\n📍 Cluster Details:")
+            for cluster in clusters:
+                print(f"   Cluster #{cluster['cluster_id']}: "
+                      f"{cluster['reportCount']} reports, "
+                      f"Risk: {cluster['riskLevel'].upper()}, "
+                      f"Center: ({cluster['center']['lat']:.4f}, {cluster['center']['lng']:.4f})")
+        print("-" * 60)
+    
+    return run
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,18 @@
+"""
+TrustBond Rwanda - Hotspot clustering library
+
+The one clustering code path shared by the clustering services in this
+directory and the API (through api/app/clustering.py):
+
+- pipeline: configuration, report filter and single-window clustering
+- loader: report columns from MongoDB
+- trust: live trust weights per device
+- engines: DBSCAN implementations behind one interface (grid, sklearn,
+  incremental, partitioned, chunked, micro)
+- windows, spatiotemporal: multi-window and spatio-temporal clustering
+- summary: cluster summaries and the shared cluster document schema
+- persist, tracking: generation publishing and hotspot identity
+- settings: service settings, passed explicitly to the runs below
+- batch, realtime, backfill: batch, incremental and historical runs
+- snapshot, scheduler: service runtime support
+"""
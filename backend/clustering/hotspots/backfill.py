@@ -0,0 +1,247 @@
+"""
+Historical reclustering (backfill)
+
+Regenerates cluster history for a past date range, e.g. after tuning eps
+or changing the weighting. The range is cut into windows ending every
+`step`; each window is loaded, clustered and written to `cluster_history`
+as one generation tagged by its window end. Rerunning a window replaces
+its generation, so a backfill can be repeated or resumed at will.
+
+Progress is kept in a JSON checkpoint listing the finished window ends; a
+checkpoint written for other settings is ignored.
+
+Reports are weighted by the trustWeight stored at submission, so history
+reflects what was known at the time; live device trust is opt-in.
+
+Windows are clustered in worker processes (run_backfill), each window
+over its own MongoDB connection, and written to history by the parent.
+"""
+
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from pymongo import DeleteMany, InsertOne, MongoClient
+
+from .batch import run_multi_window_dbscan
+from .loader import load_report_columns
+from .pipeline import get_clustering_params, recent_reports_query
+from .trust import refresh_trust
+from .windows import parse_window
+
+HISTORY_COLLECTION = 'cluster_history'
+HISTORY_INDEXES = (
+    [('windowEnd', 1), ('window', 1), ('category', 1)],
+    [('window', 1), ('windowEnd', -1)]
+)
+
+
+def ensure_history_indexes(db):
+    for keys in HISTORY_INDEXES:
+        db[HISTORY_COLLECTION].create_index(keys)
+
+
+def window_ends(start, end, step):
+    """
+    End of every backfill window in [start, end].
+
+    Args:
+        start: First window end
+        end: Last possible window end
+        step: timedelta between window ends
+
+    Returns:
+        List of datetimes
+    """
+    if step.total_seconds() <= 0:
+        raise ValueError("Backfill step must be positive")
+    ends = []
+    current = start
+    while current <= end:
+        ends.append(current)
+        current += step
+    return ends
+
+
+def history_operations(clusters, window_end, window, run_info):
+    """
+    Bulk operations replacing the history generation of one window.
+
+    Args:
+        clusters: Cluster objects of the window (all-category and
+            per-category ones)
+        window_end: End of the window; tags the generation
+        window: Window label
+        run_info: Fields stored on every document (parameters, run time)
+
+    Returns:
+        List of pymongo write operations (one DeleteMany, then inserts)
+    """
+    operations = [DeleteMany({'windowEnd': window_end, 'window': window})]
+    for cluster in clusters:
+        document = {key: value for key, value in cluster.items() if key != '_id'}
+        document.update(run_info, windowEnd=window_end, window=window)
+        operations.append(InsertOne(document))
+    return operations
+
+
+class Checkpoint:
+    """
+    Finished window ends of a backfill, persisted as JSON.
+
+    Args:
+        path: Checkpoint file (None keeps progress in memory only)
+        settings: JSON-serializable backfill settings; a checkpoint saved
+            with other settings is discarded
+    """
+
+    def __init__(self, path, settings):
+        self.path = path
+        self.settings = settings
+        self.done = set()
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    saved = json.load(f)
+            except (OSError, ValueError):
+                saved = {}
+            if saved.get('settings') == settings:
+                self.done = {datetime.fromisoformat(end) for end in saved.get('done', [])}
+
+    def __contains__(self, window_end):
+        return window_end in self.done
+
+    def mark(self, window_end):
+        """Record a finished window and save the checkpoint atomically"""
+        self.done.add(window_end)
+        if not self.path:
+            return
+        staging = self.path + '.tmp'
+        with open(staging, 'w') as f:
+            json.dump({
+                'settings': self.settings,
+                'done': sorted(end.isoformat() for end in self.done)
+            }, f)
+        os.replace(staging, self.path)
+
+
+def backfill_query(window, window_end):
+    """Reports filter of a past window ending at window_end (excluded)"""
+    query = recent_reports_query(exclude_delayed=True, exclude_fake=True, window=window, now=window_end)
+    query['timestamp']['$lt'] = window_end
+    return query
+
+
+def backfill_window(mongodb_url, database_name, window_end, window, params, settings):
+    """
+    Load and cluster one past window (runs in a backfill worker).
+
+    Args:
+        mongodb_url, database_name: Where to load the reports from
+        settings: ClusteringSettings of the worker (in-process clustering,
+            no trust write-back, quiet)
+
+    Returns:
+        (number of reports loaded, cluster objects)
+    """
+    with MongoClient(mongodb_url) as client:
+        db = client[database_name]
+        reports = load_report_columns(db['reports'], backfill_query(window, window_end))
+        if settings.live_trust:
+            reports = refresh_trust(db, reports, quiet=settings.quiet)
+    clusters = run_multi_window_dbscan(
+        reports, [window], window_end,
+        eps_meters=params['eps_meters'],
+        min_samples=params['min_samples'],
+        temporal=params['temporal'],
+        by_category=settings.by_category,
+        settings=settings
+    )
+    return len(reports), clusters
+
+
+def run_backfill(db, mongodb_url, database_name, settings, start, end, step, window=None, workers=None,
+                 checkpoint_path=None, live_trust=False):
+    """
+    Recluster past windows into cluster_history.
+
+    Windows end every `step` from `start` to `end`; each is loaded and
+    clustered in a worker process and written as one generation tagged by
+    its window end. Finished windows are recorded in the checkpoint, so an
+    interrupted backfill resumes where it stopped.
+
+    Args:
+        db: MongoDB database
+        mongodb_url, database_name: Where the workers connect
+        settings: ClusteringSettings (by_category applies)
+        start, end: First and last window end (datetimes)
+        step: Window label of the spacing between window ends, e.g. '1h'
+        window: Window label of the clustered horizon (defaults to step)
+        workers: Worker processes (defaults to the CPU count)
+        checkpoint_path: Checkpoint file, or None to disable resuming
+        live_trust: Weight reports from their devices' current trust
+            scores instead of the stored trustWeight
+
+    Returns:
+        Number of windows that failed
+    """
+    window = window or step
+    params = get_clustering_params(db)
+    ends = window_ends(start, end, parse_window(step))
+    checkpoint = Checkpoint(checkpoint_path, {
+        'from': start.isoformat(), 'to': end.isoformat(), 'step': step, 'window': window,
+        'eps_meters': params['eps_meters'], 'min_samples': params['min_samples'],
+        'temporal': params['temporal'], 'byCategory': settings.by_category,
+        'liveTrust': live_trust
+    })
+    pending = [window_end for window_end in ends if window_end not in checkpoint]
+    workers = workers or os.cpu_count() or 1
+
+    print(f"🕰️  Backfill {start:%Y-%m-%d %H:%M} → {end:%Y-%m-%d %H:%M}: {len(ends)} windows of {window} "
+          f"every {step} ({len(ends) - len(pending)} done already), {workers} workers")
+    print(f"   Parameters: eps={params['eps_meters']:.0f}m, min_samples={params['min_samples']}"
+          + (", spatio-temporal" if params['temporal'] else "")
+          + (", live trust" if live_trust else ", stored trust weights"))
+    if not pending:
+        return 0
+
+    ensure_history_indexes(db)
+    run_info = {
+        'eps_meters': params['eps_meters'],
+        'min_samples': params['min_samples'],
+        'mode': 'spatiotemporal' if params['temporal'] else 'spatial',
+        'backfilledAt': datetime.utcnow()
+    }
+    # Windows run side by side, so each clusters in its own process;
+    # progress is reported here
+    worker_settings = settings.copy(workers=1, live_trust=live_trust, trust_writeback=False, quiet=True)
+
+    started = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {
+            pool.submit(backfill_window, mongodb_url, database_name, window_end, window, params, worker_settings):
+                window_end
+            for window_end in pending
+        }
+        for finished, future in enumerate(as_completed(futures), 1):
+            window_end = futures[future]
+            try:
+                report_count, clusters = future.result()
+                db[HISTORY_COLLECTION].bulk_write(history_operations(clusters, window_end, window, run_info))
+                checkpoint.mark(window_end)
+                outcome = f"{report_count} reports → {len(clusters)} clusters"
+            except Exception as e:
+                failed += 1
+                outcome = f"❌ {e}"
+            elapsed = time.perf_counter() - started
+            remaining = elapsed / finished * (len(pending) - finished)
+            print(f"   [{finished}/{len(pending)}] {window_end:%Y-%m-%d %H:%M} {outcome} "
+                  f"({elapsed:.0f}s elapsed, ~{remaining:.0f}s left)")
+
+    print(f"✅ Backfilled {len(pending) - failed} windows in {time.perf_counter() - started:.1f}s"
+          + (f"; {failed} failed (rerun to retry them)" if failed else ""))
+    return failed
@@ -0,0 +1,361 @@
+"""
+Batch clustering runs
+
+One batch run fetches the widest configured window once (or restores it
+from the snapshot), weights it from live device trust, clusters every
+window, and every category on its own, from that single load, and
+publishes the clusters as one generation. The engine for each window is
+picked from the ClusteringSettings (select_engine).
+
+run_multi_window_dbscan is also what the backfill runs per past window.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from .chunked import peak_rss_mb, reset_peak_rss
+from .engines import MicroClusterEngine, get_engine
+from .geo import DEFAULT_EPS_METERS, project
+from .loader import ReportColumns
+from .persist import publish_clusters
+from .pipeline import (
+    MIN_TRUST_WEIGHT_FOR_CLUSTERING, cluster_reports, fetch_recent_report_columns, get_clustering_params
+)
+from .settings import ClusteringSettings
+from .snapshot import save_snapshot, warm_start
+from .spatiotemporal import decayed_weights
+from .summary import cluster_documents
+from .trust import refresh_trust
+from .windows import cluster_windows, parse_window, window_starts
+
+_executor = None
+
+
+def get_executor(workers):
+    """The clustering worker pool, started on first use"""
+    global _executor
+    if _executor is None:
+        # spawn: the parent holds a MongoClient, which must not be forked
+        _executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _executor
+
+
+def engine_name(report_count, settings):
+    """
+    Engine for a window of report_count valid reports: settings.engine
+    unless it is 'auto'; else micro-clusters for windows of at least
+    microcluster_min_reports, memory-bounded when memory_budget_mb is set,
+    tile-partitioned when workers > 1, else the grid
+    """
+    if settings.engine != 'auto':
+        return settings.engine
+    if 0 < settings.microcluster_min_reports <= report_count:
+        return 'micro'
+    if settings.memory_budget_mb > 0:
+        return 'chunked'
+    if settings.workers > 1:
+        return 'partitioned'
+    return 'grid'
+
+
+def select_engine(report_count, settings):
+    """Configured engine instance for a window of report_count valid reports"""
+    name = engine_name(report_count, settings)
+    if name == 'micro':
+        return get_engine(name, cell_fraction=settings.microcluster_cell_fraction)
+    if name == 'chunked':
+        return get_engine(name, memory_budget_mb=settings.memory_budget_mb)
+    if name == 'partitioned':
+        return get_engine(name, workers=settings.workers, executor=get_executor(settings.workers))
+    return get_engine(name)
+
+
+def uses_single_graph(report_count, settings):
+    """True when the engine for this many reports works on one neighbor graph"""
+    return engine_name(report_count, settings) in ('grid', 'partitioned')
+
+
+def cluster_labels(points, weights, eps_meters, min_samples, settings):
+    """Weighted DBSCAN labels from the engine select_engine picks"""
+    engine = select_engine(len(points), settings)
+    labels = engine.labels(points, weights, eps_meters, min_samples)
+    if isinstance(engine, MicroClusterEngine) and not settings.quiet:
+        print(f"🧩 Summarized {len(points)} reports into {engine.last_micro_clusters} micro-clusters")
+    return labels
+
+
+def run_trust_weighted_dbscan(reports, eps_meters=DEFAULT_EPS_METERS, min_samples=3, settings=None):
+    """
+    Run trust-weighted DBSCAN clustering algorithm.
+
+    The algorithm uses sample weights to give more influence to
+    high-trust reports and less influence to low-trust reports: a report
+    is a core point only when the trust weights within eps of it sum to
+    at least min_samples.
+
+    Args:
+        reports: ReportColumns (or a list of report documents)
+        eps_meters: Maximum distance between two samples, in meters
+        min_samples: Minimum summed trust weight to form a core point
+        settings: ClusteringSettings picking the engine (defaults if None)
+
+    Returns:
+        List of cluster objects with trust-weighted metrics
+    """
+    settings = settings or ClusteringSettings()
+    if not isinstance(reports, ReportColumns):
+        reports = ReportColumns.from_documents(reports)
+
+    if len(reports) < 2:
+        if not settings.quiet:
+            print("Not enough reports for clustering")
+        return []
+
+    # Reports with zero or very low weight are left out
+    valid_count = int(np.count_nonzero(reports.weights >= MIN_TRUST_WEIGHT_FOR_CLUSTERING))
+
+    if valid_count < 2:
+        if not settings.quiet:
+            print(f"Not enough high-trust reports for clustering (only {valid_count} valid)")
+        return []
+
+    engine = select_engine(valid_count, settings)
+    clusters = cluster_reports(reports, eps_meters, min_samples, engine=engine)
+    if isinstance(engine, MicroClusterEngine) and not settings.quiet:
+        print(f"🧩 Summarized {valid_count} reports into {engine.last_micro_clusters} micro-clusters")
+    return clusters
+
+
+def run_multi_window_dbscan(reports, windows, now, eps_meters=DEFAULT_EPS_METERS, min_samples=3,
+                            temporal=None, by_category=False, points=None, return_labels=False,
+                            settings=None):
+    """
+    Run trust-weighted DBSCAN for several time windows from one load.
+
+    Args:
+        reports: ReportColumns of the widest window, with timestamps
+        windows: Window labels, e.g. ['1h', '6h', '24h', '7d']
+        now: End of all windows
+        eps_meters: Maximum distance between two samples, in meters
+        min_samples: Minimum summed trust weight to form a core point
+        temporal: Spatio-temporal settings (eps_seconds, half_life_seconds)
+            from get_clustering_params, or None for spatial clustering
+        by_category: Also cluster every category on its own
+        points: Projected coordinates of `reports`, computed if not given
+        return_labels: Also return the all-category labels of the widest
+            window per report (-1 for noise and filtered reports)
+        settings: ClusteringSettings picking engines and workers
+            (defaults if None)
+
+    Returns:
+        Cluster objects of all windows, each tagged with its 'window' (and
+        its 'category' for per-category clusters); with return_labels,
+        (clusters, labels)
+    """
+    settings = settings or ClusteringSettings()
+    # Oldest first, so every window is a suffix of the same arrays
+    valid_rows = np.flatnonzero(reports.weights >= MIN_TRUST_WEIGHT_FOR_CLUSTERING)
+    valid_rows = valid_rows[np.argsort(reports.timestamps[valid_rows], kind='stable')]
+    valid_reports = reports.select(valid_rows)
+    times = None
+    if temporal:
+        # Seconds relative to now; weights halve every half-life of age
+        times = (valid_reports.timestamps - np.datetime64(now, 'ms')) / np.timedelta64(1, 's')
+        valid_reports = valid_reports.with_weights(
+            decayed_weights(valid_reports.weights, -times, temporal['half_life_seconds'])
+        )
+    points = project(valid_reports.lat, valid_reports.lng) if points is None else np.asarray(points)[valid_rows]
+
+    # All reports first (the largest partition), then one per category;
+    # partition rows stay in timestamp order
+    partitions = {None: np.arange(len(valid_reports))}
+    if by_category:
+        partitions.update(valid_reports.category_rows())
+
+    labels = partition_labels(
+        valid_reports, points, times, partitions, now, windows, eps_meters, min_samples, temporal, settings
+    )
+
+    clusters = []
+    for category, rows in partitions.items():
+        part = valid_reports.select(rows)
+        for window, start in window_starts(part.timestamps, now, windows).items():
+            if len(rows) - start < 2:
+                if category is None and not settings.quiet:
+                    print(f"   [{window}] Not enough high-trust reports for clustering (only {len(rows) - start} valid)")
+                continue
+            window_clusters = cluster_documents(
+                part.select(slice(start, None)), labels[category][window], points[rows][start:]
+            )
+            for cluster in window_clusters:
+                cluster['window'] = window
+                if category is not None:
+                    cluster['category'] = category
+            clusters.extend(window_clusters)
+
+    if not return_labels:
+        return clusters
+    widest = max(windows, key=parse_window)
+    start = window_starts(valid_reports.timestamps, now, [widest])[widest]
+    report_labels = np.full(len(reports), -1, dtype=np.int64)
+    report_labels[valid_rows[start:]] = labels[None][widest]
+    return clusters, report_labels
+
+
+def partition_labels(valid_reports, points, times, partitions, now, windows, eps_meters, min_samples, temporal,
+                     settings):
+    """
+    Labels per window for every partition (all reports, each category).
+
+    Partitions run in parallel on the worker pool when settings.workers
+    > 1, so the per-category runs add little wall-clock time to the
+    all-category one.
+
+    Returns:
+        Dict of partition to dict of window to labels
+    """
+    tasks = {}
+    for category, rows in partitions.items():
+        starts = window_starts(valid_reports.timestamps[rows], now, windows)
+        tasks[category] = (
+            points[rows], valid_reports.weights[rows], starts, eps_meters, min_samples,
+            None if times is None else times[rows],
+            temporal['eps_seconds'] if temporal else None
+        )
+
+    if not temporal and not uses_single_graph(len(points), settings):
+        # Micro-cluster or memory-bounded engine, one window at a time
+        return {
+            category: {
+                window: cluster_labels(task[0][start:], task[1][start:], eps_meters, min_samples, settings)
+                for window, start in task[2].items()
+            }
+            for category, task in tasks.items()
+        }
+
+    if settings.workers <= 1:
+        return {category: cluster_windows(*task) for category, task in tasks.items()}
+    if len(tasks) == 1 and not temporal:
+        # Nothing to run side by side; split the one partition into tiles
+        (category, task), = tasks.items()
+        return {category: {
+            window: cluster_labels(task[0][start:], task[1][start:], eps_meters, min_samples, settings)
+            for window, start in task[2].items()
+        }}
+
+    pool = get_executor(settings.workers)
+    futures = {category: pool.submit(cluster_windows, *task) for category, task in tasks.items()}
+    return {category: future.result() for category, future in futures.items()}
+
+
+def save_clusters(db, clusters, windows=None, by_category=False):
+    """
+    Publish clusters as a new generation (readers switch over atomically).
+    Hotspots keep their ids across runs; only changed ones are written.
+    `windows` are the windows replaced (default: the 24h window), and
+    per-category clusters are replaced when `by_category` is set.
+    """
+    result = publish_clusters(db, clusters, source='trust_weighted', windows=windows, by_category=by_category)
+
+    if not result['activated']:
+        print(f"⚠️  Generation {result['generation']} not activated (another run holds the publish lease)")
+    elif clusters:
+        print(f"✅ Saved {len(clusters)} trust-weighted clusters to database (generation {result['generation']}: "
+              f"{result['inserted']} written, {result['unchanged']} unchanged, {result['retired']} retired)")
+    else:
+        print("ℹ️  No clusters found")
+
+
+def run_batch(db, settings, warm=False):
+    """
+    Recluster every window and publish the clusters.
+
+    Args:
+        db: MongoDB database
+        settings: ClusteringSettings
+        warm: Restore the working set from the snapshot when there is one
+    """
+    reset_peak_rss()
+
+    # Get clustering parameters from config
+    params = get_clustering_params(db)
+
+    if not params['enabled']:
+        print("⏸️  Clustering is disabled in config. Skipping...")
+        return
+
+    print(f"   Parameters: eps={params['eps_meters']:.0f}m, min_samples={params['min_samples']}")
+    temporal = params['temporal']
+    if temporal:
+        half_life = f"{temporal['half_life_seconds'] / 3600:g}h" if temporal['half_life_seconds'] else "off"
+        print(f"   Spatio-temporal: eps_time={temporal['eps_seconds'] / 60:.0f}min, decay half-life={half_life}")
+    print("Running trust-weighted DBSCAN clustering...")
+
+    now = datetime.utcnow()
+    widest = settings.windows[-1]
+    restored = warm_start(db, now, widest, settings.snapshot_dir) if warm and settings.snapshot_dir else None
+    if restored is not None:
+        reports, points = restored
+    else:
+        # Fetch the widest window once (excluding fake and delayed)
+        all_reports = db['reports'].count_documents({
+            'timestamp': {'$gte': now - parse_window(widest)}
+        })
+        reports = fetch_recent_report_columns(
+            db, exclude_delayed=True, exclude_fake=True, window=widest, now=now
+        )
+        points = project(reports.lat, reports.lng)
+        excluded_count = all_reports - len(reports)
+
+        print(f"📊 Fetched {len(reports)} valid reports from last {widest}")
+        if excluded_count > 0:
+            print(f"   (Excluded {excluded_count} fake/low-trust reports)")
+
+    if settings.live_trust:
+        reports = refresh_trust(db, reports, write_back=settings.trust_writeback)
+
+    # Run trust-weighted clustering for every window
+    clusters, labels = run_multi_window_dbscan(
+        reports, settings.windows, now,
+        eps_meters=params['eps_meters'],
+        min_samples=params['min_samples'],
+        temporal=temporal,
+        by_category=settings.by_category,
+        points=points,
+        return_labels=True,
+        settings=settings
+    )
+    for window in settings.windows:
+        found = sum(1 for cluster in clusters if cluster['window'] == window and 'category' not in cluster)
+        per_category = sum(1 for cluster in clusters if cluster['window'] == window and 'category' in cluster)
+        print(f"🔍 [{window}] Found {found} abuse-resistant clusters"
+              + (f" (+{per_category} per-category)" if settings.by_category else ""))
+
+    # Save to database
+    save_clusters(db, clusters, windows=settings.windows, by_category=settings.by_category)
+    if settings.snapshot_dir:
+        save_snapshot(settings.snapshot_dir, reports, points, labels, {
+            'createdAt': now.isoformat(),
+            'window': widest,
+            'eps_meters': params['eps_meters'],
+            'min_samples': params['min_samples']
+        })
+    print(f"🧠 Peak RSS this run: {peak_rss_mb():.0f} MB")
+
+    # Print cluster details
+    if clusters:
+        print("\n📍 Trust-Weighted Cluster Details:")
+        for cluster in clusters:
+            confidence_emoji = "🟢" if cluster['trustConfidence'] == 'high' else ("🟡" if cluster['trustConfidence'] == 'medium' else "🔴")
+            scope = cluster['window'] + (f" {cluster['category']}" if 'category' in cluster else "")
+            print(f"   [{scope}] Cluster #{cluster['cluster_id']}: "
+                  f"{cluster['reportCount']} reports "
+                  f"(weighted: {cluster['weightedReportCount']:.1f}), "
+                  f"Risk: {cluster['riskLevel'].upper()}, "
+                  f"{confidence_emoji} Trust: {cluster['averageTrustScore']:.0f}")
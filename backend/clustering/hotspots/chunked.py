@@ -0,0 +1,120 @@
+"""
+Memory-bounded weighted DBSCAN
+
+Materializing every neighbor pair is O(k^2) for a hotspot with k reports
+inside eps (a market area with thousands of reports), which is enough to
+get the clustering container OOM-killed. This engine streams the
+neighbor pairs in blocks of bounded size (grid.neighbor_pair_blocks) and
+keeps only O(n) state between blocks:
+- pass 1 sums the neighborhood weight of every point (core detection)
+- pass 2 merges core-core pairs into a union-find forest, the compact
+  stand-in for the adjacency, and keeps one (border point, cluster) entry
+  per cluster a border point touches
+
+Labels equal grid.weighted_dbscan; pairs are generated twice, so it is
+slower and meant for windows that do not fit the unbounded engine.
+"""
+
+import resource
+
+import numpy as np
+
+from .grid import WEIGHT_TOLERANCE, neighbor_pair_blocks
+from .partition import union_find
+
+DEFAULT_MEMORY_BUDGET_MB = 256
+BYTES_PER_CANDIDATE = 96  # Index, offset and distance temporaries per candidate pair
+
+
+def max_pairs_for_budget(memory_budget_mb):
+    """Candidate pairs per block that fit the working-memory budget"""
+    return max(int(memory_budget_mb * 2**20 / BYTES_PER_CANDIDATE), 1024)
+
+
+def chunked_weighted_dbscan(points, weights, eps, min_weight, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """
+    DBSCAN with trust-weighted core points under a memory budget.
+
+    Args:
+        points: (n, 2) projected coordinates in meters
+        weights: Trust weight per point
+        eps: Neighborhood radius in meters
+        min_weight: Summed neighborhood weight needed for a core point
+        memory_budget_mb: Working memory for one block of candidate pairs
+
+    Returns:
+        Labels identical to weighted_dbscan(points, weights, eps, min_weight)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    n = len(points)
+    max_pairs = max_pairs_for_budget(memory_budget_mb)
+
+    # Pass 1: neighborhood weights
+    neighbor_weight = np.zeros(n)
+    for rows, cols in neighbor_pair_blocks(points, eps, max_pairs):
+        neighbor_weight += np.bincount(rows, weights=weights[cols], minlength=n)
+    core = neighbor_weight >= min_weight - WEIGHT_TOLERANCE
+
+    labels = np.full(n, -1, dtype=np.int64)
+    if not core.any():
+        return labels
+
+    # Pass 2: core connectivity as a union-find forest, border candidates
+    parent = np.arange(n)
+    border_rows, border_roots = [], []
+    for rows, cols in neighbor_pair_blocks(points, eps, max_pairs):
+        to_core = core[cols]
+        linked = core[rows] & to_core
+        parent = union_find(n, rows[linked], cols[linked], parent)
+
+        border = ~core[rows] & to_core
+        if border.any():
+            pairs = np.unique(np.column_stack((rows[border], parent[cols[border]])), axis=0)
+            border_rows.append(pairs[:, 0])
+            border_roots.append(pairs[:, 1])
+
+    # Rank clusters by their lowest core point, as weighted_dbscan does
+    core_idx = np.flatnonzero(core)
+    roots, first = np.unique(parent[core_idx], return_index=True)
+    rank = np.empty(n, dtype=np.int64)
+    rank[roots[np.argsort(first)]] = np.arange(len(roots))
+    labels[core_idx] = rank[parent[core_idx]]
+
+    # Border points: smallest label among adjacent clusters (roots stored
+    # mid-pass may have been merged since, so resolve them again)
+    if border_rows:
+        border_labels = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(
+            border_labels, np.concatenate(border_rows),
+            rank[parent[np.concatenate(border_roots)]]
+        )
+        is_border = border_labels != np.iinfo(np.int64).max
+        labels[is_border] = border_labels[is_border]
+
+    return labels
+
+
+def reset_peak_rss():
+    """
+    Restart peak RSS tracking for this process (Linux), so peak_rss_mb()
+    reports the peak of the current run rather than of the process lifetime.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    """Peak resident set size in MB since start or the last reset_peak_rss()"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is the lifetime peak, in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,150 @@
+"""
+Pluggable clustering engines
+
+Every engine computes the same thing, trust-weighted DBSCAN labels for
+projected points (a point is a core point when the weights within eps of
+it sum to min_weight), and differs only in how:
+
+- grid: eps-sized hash grid, one neighbor graph (the default)
+- sklearn: scikit-learn's DBSCAN with sample weights (reference)
+- incremental: IncrementalDBSCAN, fed every point once
+- partitioned: grid engine over tiles in a process pool
+- chunked: grid engine streaming neighbor pairs under a memory budget
+- micro: DBSCAN over micro-cluster summaries (approximate)
+
+Engines share one interface, `labels(points, weights, eps, min_weight)`,
+and are looked up by name, so services, the API and benchmarks pick one
+from configuration instead of calling an implementation directly.
+"""
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from .chunked import DEFAULT_MEMORY_BUDGET_MB, chunked_weighted_dbscan
+from .grid import WEIGHT_TOLERANCE, weighted_dbscan
+from .incremental import IncrementalDBSCAN
+from .microcluster import DEFAULT_CELL_FRACTION, microcluster_dbscan
+from .partition import partitioned_dbscan
+
+DEFAULT_ENGINE = 'grid'
+
+
+class ClusteringEngine(ABC):
+    """Trust-weighted DBSCAN over projected points"""
+
+    name = None
+
+    @abstractmethod
+    def labels(self, points, weights, eps, min_weight):
+        """
+        Args:
+            points: (n, 2) projected coordinates in meters
+            weights: Trust weight per point
+            eps: Neighborhood radius in meters
+            min_weight: Summed neighborhood weight needed for a core point
+
+        Returns:
+            Label per point, -1 for noise
+        """
+
+
+class GridEngine(ClusteringEngine):
+    name = 'grid'
+
+    def labels(self, points, weights, eps, min_weight):
+        return weighted_dbscan(points, weights, eps, min_weight)
+
+
+class SklearnEngine(ClusteringEngine):
+    name = 'sklearn'
+
+    def labels(self, points, weights, eps, min_weight):
+        from sklearn.cluster import DBSCAN
+
+        if len(points) == 0:
+            return np.zeros(0, dtype=np.int64)
+        # scikit-learn only takes an integer min_samples: scale the weights
+        # so that a summed weight of min_weight (within the grid engine's
+        # tolerance) reaches 1
+        threshold = min_weight - WEIGHT_TOLERANCE
+        sample_weight = None if threshold <= 0 else np.asarray(weights, dtype=np.float64) / threshold
+        model = DBSCAN(eps=eps, min_samples=1).fit(points, sample_weight=sample_weight)
+        return model.labels_.astype(np.int64)
+
+
+class IncrementalEngine(ClusteringEngine):
+    name = 'incremental'
+
+    def labels(self, points, weights, eps, min_weight):
+        engine = IncrementalDBSCAN(eps, min_weight)
+        for i, ((x, y), weight) in enumerate(zip(np.asarray(points, dtype=np.float64), weights)):
+            engine.insert(i, x, y, float(weight))
+        _, labels = engine.labels()
+        return np.asarray(labels, dtype=np.int64)
+
+
+class PartitionedEngine(ClusteringEngine):
+    name = 'partitioned'
+
+    def __init__(self, workers=None, executor=None):
+        self.workers = workers
+        self.executor = executor
+
+    def labels(self, points, weights, eps, min_weight):
+        return partitioned_dbscan(points, weights, eps, min_weight, workers=self.workers, executor=self.executor)
+
+
+class ChunkedEngine(ClusteringEngine):
+    name = 'chunked'
+
+    def __init__(self, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+        self.memory_budget_mb = memory_budget_mb
+
+    def labels(self, points, weights, eps, min_weight):
+        return chunked_weighted_dbscan(points, weights, eps, min_weight, memory_budget_mb=self.memory_budget_mb)
+
+
+class MicroClusterEngine(ClusteringEngine):
+    name = 'micro'
+
+    def __init__(self, cell_fraction=DEFAULT_CELL_FRACTION):
+        self.cell_fraction = cell_fraction
+        self.last_micro_clusters = 0  # Micro-clusters of the last call
+
+    def labels(self, points, weights, eps, min_weight):
+        labels, self.last_micro_clusters = microcluster_dbscan(
+            points, weights, eps, min_weight, cell_fraction=self.cell_fraction
+        )
+        return labels
+
+
+ENGINES = {
+    engine.name: engine
+    for engine in (GridEngine, SklearnEngine, IncrementalEngine, PartitionedEngine, ChunkedEngine, MicroClusterEngine)
+}
+
+
+def register_engine(engine_class):
+    """Make an engine class available to get_engine under its name"""
+    ENGINES[engine_class.name] = engine_class
+    return engine_class
+
+
+def get_engine(name=DEFAULT_ENGINE, **options):
+    """
+    Engine instance by name.
+
+    Args:
+        name: Engine name (see ENGINES)
+        options: Engine settings, e.g. workers/executor for 'partitioned',
+            memory_budget_mb for 'chunked', cell_fraction for 'micro'
+
+    Raises:
+        ValueError: If no engine has that name
+    """
+    try:
+        engine_class = ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown clustering engine {name!r} (available: {', '.join(sorted(ENGINES))})")
+    return engine_class(**options)
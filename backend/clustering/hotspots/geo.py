@@ -0,0 +1,167 @@
+"""
+Geographic metric and spatial index for clustering
+
+Report coordinates are projected once into a local equirectangular plane
+(meters) around a fixed reference latitude. Over Rwanda's extent the scale
+error of this projection is below 0.2%, so plain Euclidean distance on the
+projected points is a good stand-in for geodesic distance, and `eps` can be
+given in meters instead of degrees.
+"""
+
+import os
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+from sklearn.neighbors import KDTree
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = 111000  # Legacy conversion used by the `epsilon` config field
+
+# Kigali; every path projects with the same origin so distances agree
+REFERENCE_LAT = float(os.getenv('CLUSTERING_REFERENCE_LAT', '-1.94'))
+
+DEFAULT_EPS_METERS = 500.0
+
+
+def project(lat, lng, ref_lat=REFERENCE_LAT):
+    """
+    Project latitude/longitude (degrees) into local planar meters.
+
+    Returns:
+        (n, 2) float64 array of (x, y) in meters
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    scale = np.pi / 180.0 * EARTH_RADIUS_M
+    x = lng * scale * np.cos(np.radians(ref_lat))
+    y = lat * scale
+    return np.column_stack((x, y))
+
+
+def unproject(x, y, ref_lat=REFERENCE_LAT):
+    """Inverse of project(): planar meters back to (lat, lng) degrees"""
+    scale = np.pi / 180.0 * EARTH_RADIUS_M
+    lat = np.asarray(y, dtype=np.float64) / scale
+    lng = np.asarray(x, dtype=np.float64) / (scale * np.cos(np.radians(ref_lat)))
+    return lat, lng
+
+
+def eps_meters_from_config(clustering_config):
+    """
+    Read the neighborhood radius in meters from a `config.clustering` document.
+
+    `epsilonMeters` takes precedence; older documents only store `epsilon`
+    in degrees, which is converted with the legacy 111 km/degree factor.
+    """
+    clustering_config = clustering_config or {}
+    if clustering_config.get('epsilonMeters') is not None:
+        return float(clustering_config['epsilonMeters'])
+    if clustering_config.get('epsilon') is not None:
+        return float(clustering_config['epsilon']) * METERS_PER_DEGREE
+    return DEFAULT_EPS_METERS
+
+
+def radius_from(points, center_lat, center_lng, members):
+    """Distance in meters from a center to the farthest of the projected `members`"""
+    center = project([center_lat], [center_lng])[0]
+    offsets = points[members] - center
+    return float(np.sqrt(np.max(np.einsum('ij,ij->i', offsets, offsets))))
+
+
+def labels_from_edges(rows, cols, core):
+    """
+    Turn neighbor pairs and a core mask into DBSCAN labels.
+
+    Args:
+        rows, cols: Index pairs of points within eps of each other, in
+            both directions (order does not matter)
+        core: Boolean core-point mask
+
+    Core points are joined through core-core edges (connected components);
+    each border point takes the smallest label among its core neighbors.
+    Clusters are numbered in order of their lowest-indexed core point,
+    matching scikit-learn's DBSCAN.
+    """
+    n = len(core)
+    labels = np.full(n, -1, dtype=np.int64)
+    if not core.any():
+        return labels
+
+    to_core = core[cols]
+    keep = core[rows] & to_core
+    graph = csr_matrix(
+        (np.ones(int(keep.sum())), (rows[keep], cols[keep])),
+        shape=(n, n)
+    )
+    # The graph is symmetric, so strong components equal the undirected
+    # ones and scipy can skip building the transpose
+    _, component = connected_components(graph, directed=True, connection='strong')
+
+    # Rank components by their first core point
+    core_idx = np.flatnonzero(core)
+    components, first = np.unique(component[core_idx], return_index=True)
+    rank = np.empty(component.max() + 1, dtype=np.int64)
+    rank[components[np.argsort(first)]] = np.arange(len(components))
+    labels[core_idx] = rank[component[core_idx]]
+
+    # Border points: smallest label among adjacent core points
+    border_edge = ~core[rows] & to_core
+    if border_edge.any():
+        border_labels = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(border_labels, rows[border_edge], labels[cols[border_edge]])
+        is_border = border_labels != np.iinfo(np.int64).max
+        labels[is_border] = border_labels[is_border]
+
+    return labels
+
+
+class GeoIndex:
+    """
+    KD-tree over projected report coordinates.
+
+    The tree is built once per run and reused for the DBSCAN neighbor
+    graph and for any later radius queries.
+    """
+
+    def __init__(self, lat, lng):
+        self.points = project(lat, lng)
+        self.tree = KDTree(self.points)
+
+    def __len__(self):
+        return len(self.points)
+
+    def neighbors(self, eps_meters):
+        """
+        All pairs within eps_meters as CSR arrays (self included).
+
+        Returns:
+            (indptr, indices) where the neighbors of point i are
+            indices[indptr[i]:indptr[i + 1]]
+        """
+        # Querying in grid-cell order keeps consecutive queries in the same
+        # tree leaves, which roughly halves query time at country scale
+        cells = np.floor(self.points / eps_meters).astype(np.int64)
+        order = np.lexsort((cells[:, 1], cells[:, 0]))
+        rows = np.empty(len(order), dtype=object)
+        rows[order] = self.tree.query_radius(self.points[order], r=eps_meters, return_distance=False)
+        counts = np.fromiter((len(row) for row in rows), dtype=np.int64, count=len(rows))
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return indptr, np.concatenate(rows)
+
+    def dbscan_labels(self, eps_meters, min_samples):
+        """
+        DBSCAN labels from the KD-tree neighbor lists.
+
+        Same result as sklearn.cluster.DBSCAN on the projected points:
+        clusters are numbered by their lowest-indexed core point and a
+        border point joins the lowest-numbered adjacent cluster.
+        """
+        indptr, indices = self.neighbors(eps_meters)
+        counts = np.diff(indptr)
+        rows = np.repeat(np.arange(len(counts)), counts)
+        return labels_from_edges(rows, indices, counts >= min_samples)
+
+    def radius_from(self, center_lat, center_lng, members):
+        """Distance in meters from a center to the farthest of `members`"""
+        return radius_from(self.points, center_lat, center_lng, members)
@@ -0,0 +1,175 @@
+"""
+Grid-hash weighted DBSCAN
+
+Points (projected meters) are binned into an eps-sized hash grid, so every
+neighbor of a point lies in the 3x3 block of cells around it. Candidate
+pairs are generated per cell pair with NumPy, which keeps the work close to
+O(n) for typical report densities.
+
+Unlike scikit-learn's DBSCAN, core points are chosen by trust weight: a
+point is a core point when the summed weights of its neighborhood (itself
+included) reach `min_weight`. Low-trust reports can still join a cluster as
+border points but can no longer create one.
+"""
+
+import numpy as np
+
+from .geo import labels_from_edges
+
+# Tolerance for weight sums such as 0.1 + 0.2 + ... that should hit min_weight exactly
+WEIGHT_TOLERANCE = 1e-9
+
+
+def _ragged_arange(sizes):
+    """Concatenation of arange(size) for each size, without a Python loop"""
+    sizes = np.asarray(sizes, dtype=np.int64)
+    total = int(sizes.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    starts = np.cumsum(sizes) - sizes
+    return np.arange(total, dtype=np.int64) - np.repeat(starts, sizes)
+
+
+def grid_cells(points, eps):
+    """
+    Hash each point to an eps-sized grid cell.
+
+    Returns:
+        (keys, stride) where keys is an int64 cell key per point and the key
+        of the cell offset by (dx, dy) is key + dx * stride + dy
+    """
+    cells = np.floor(points / eps).astype(np.int64)
+    cells -= cells.min(axis=0) - 1  # Keep a one-cell margin so offsets stay >= 0
+    stride = int(cells[:, 1].max()) + 2
+    return cells[:, 0] * stride + cells[:, 1], stride
+
+
+# Half of the 3x3 block; the other half is covered by mirroring the pairs
+HALF_NEIGHBORHOOD = ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1))
+
+
+def neighbor_pair_blocks(points, eps, max_pairs=None):
+    """
+    Yield the pairs of points within eps of each other block by block.
+
+    Candidates are the point combinations of neighboring cells. With
+    max_pairs set, no block examines more than max_pairs candidates, even
+    inside one very dense cell, which bounds the working memory.
+
+    Args:
+        points: (n, 2) projected coordinates in meters
+        eps: Neighborhood radius in meters
+        max_pairs: Candidate pairs per block (None: one block per cell offset)
+
+    Yields:
+        (rows, cols) int64 arrays of point indices. Over all blocks every
+        pair appears in both directions and every point is paired with
+        itself once.
+    """
+    if len(points) == 0:
+        return
+
+    keys, stride = grid_cells(points, eps)
+    order = np.argsort(keys, kind='stable')
+    cell_keys, cell_starts, cell_counts = np.unique(
+        keys[order], return_index=True, return_counts=True
+    )
+    # Work on cell-sorted copies so candidate lookups stay cache friendly
+    xs = points[order, 0]
+    ys = points[order, 1]
+
+    eps_sq = eps * eps
+    for dx, dy in HALF_NEIGHBORHOOD:
+        target = cell_keys + dx * stride + dy
+        pos = np.searchsorted(cell_keys, target)
+        pos[pos == len(cell_keys)] = 0
+        hit = np.flatnonzero(cell_keys[pos] == target)
+        if len(hit) == 0:
+            continue
+
+        a_start, a_count = cell_starts[hit], cell_counts[hit]
+        b_start, b_count = cell_starts[pos[hit]], cell_counts[pos[hit]]
+
+        # Every (point in cell a, point in cell b) combination, as one
+        # virtual ragged array cut into blocks
+        sizes = a_count * b_count
+        total = int(sizes.sum())
+        block = total if max_pairs is None else max(int(max_pairs), 1)
+        if total <= block:
+            pair = np.repeat(np.arange(len(hit)), sizes)
+            local = _ragged_arange(sizes)
+            blocks = [(pair, local)]
+        else:
+            ends = np.cumsum(sizes)
+            blocks = (
+                _candidate_block(ends, sizes, lo, min(lo + block, total))
+                for lo in range(0, total, block)
+            )
+
+        for pair, local in blocks:
+            b_size = b_count[pair]
+            i = a_start[pair] + local // b_size
+            j = b_start[pair] + local % b_size
+            close = (xs[i] - xs[j]) ** 2 + (ys[i] - ys[j]) ** 2 <= eps_sq
+            i, j = order[i[close]], order[j[close]]
+            if (dx, dy) == (0, 0):
+                yield i, j
+            else:
+                yield np.concatenate((i, j)), np.concatenate((j, i))
+
+
+def _candidate_block(ends, sizes, lo, hi):
+    """Cell pair and offset within it of candidates lo..hi-1"""
+    first, last = np.searchsorted(ends, [lo, hi - 1], side='right')
+    pairs = np.arange(first, last + 1)
+    starts = ends[pairs] - sizes[pairs]
+    begin = np.maximum(starts, lo) - starts
+    counts = np.minimum(ends[pairs], hi) - starts - begin
+    pair = np.repeat(pairs, counts)
+    return pair, _ragged_arange(counts) + np.repeat(begin, counts)
+
+
+def grid_neighbor_pairs(points, eps):
+    """
+    Find every pair of points within eps of each other.
+
+    Args:
+        points: (n, 2) projected coordinates in meters
+        eps: Neighborhood radius in meters
+
+    Returns:
+        (rows, cols) int64 arrays of point indices, self pairs included,
+        in no particular order
+    """
+    blocks = list(neighbor_pair_blocks(points, eps))
+    if not blocks:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    rows, cols = zip(*blocks)
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+def weighted_dbscan(points, weights, eps, min_weight):
+    """
+    DBSCAN with trust-weighted core point selection.
+
+    Args:
+        points: (n, 2) projected coordinates in meters
+        weights: Trust weight per point
+        eps: Neighborhood radius in meters
+        min_weight: Summed neighborhood weight needed for a core point
+            (the weighted `min_samples`)
+
+    Returns:
+        Label per point, -1 for noise. Clusters are numbered by their
+        lowest-indexed core point; with unit weights the labels equal
+        scikit-learn's DBSCAN(eps, min_samples=min_weight).
+    """
+    points = np.asarray(points, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    n = len(points)
+
+    rows, cols = grid_neighbor_pairs(points, eps)
+    neighbor_weight = np.bincount(rows, weights=weights[cols], minlength=n)
+    core = neighbor_weight >= min_weight - WEIGHT_TOLERANCE
+    return labels_from_edges(rows, cols, core)
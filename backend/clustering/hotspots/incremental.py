@@ -0,0 +1,201 @@
+"""
+Incremental DBSCAN
+
+Keeps DBSCAN state (neighbor sets, core points and cluster membership) in
+memory so that reports can be inserted and expired one at a time. Only the
+clusters touched by a change are recomputed, instead of re-running DBSCAN
+over the whole 24 hour window.
+
+Core points are chosen by trust weight as in `hotspots.grid`: a point is a
+core point when the summed weights of its neighborhood (itself included)
+reach `min_samples`. Labels produced by `labels()` are identical to
+`weighted_dbscan(points, weights, eps, min_samples)` with the points in
+ascending key order (and to scikit-learn's DBSCAN for unit weights):
+- clusters are numbered in order of their lowest-ordered core point
+- a border point belongs to the first such cluster that reaches it
+"""
+
+from collections import defaultdict
+import math
+
+from .grid import WEIGHT_TOLERANCE
+
+
+class IncrementalDBSCAN:
+    """
+    DBSCAN over a sliding set of points.
+
+    Points are identified by sortable keys (report ObjectIds). Neighbors are
+    found through a hash grid with cells of size `eps`, so an insert or
+    removal only looks at the 3x3 block of cells around the point.
+    """
+
+    def __init__(self, eps, min_samples):
+        self.eps = eps
+        self.min_samples = min_samples
+        self._eps_sq = eps * eps
+        self._coords = {}                 # key -> (x, y)
+        self._weights = {}                # key -> trust weight
+        self._grid = defaultdict(set)     # cell -> keys
+        self._neighbors = {}              # key -> keys within eps (excluding self)
+        self._core = set()
+        self._cluster_of = {}             # core key -> cluster token
+        self._clusters = {}               # cluster token -> set of core keys
+        self._next_token = 0
+
+    def __len__(self):
+        return len(self._coords)
+
+    def __contains__(self, key):
+        return key in self._coords
+
+    def keys(self):
+        """Return all point keys in ascending order"""
+        return sorted(self._coords)
+
+    def _cell(self, x, y):
+        return (math.floor(x / self.eps), math.floor(y / self.eps))
+
+    def _query(self, x, y):
+        """Find keys within eps of (x, y) using the 3x3 surrounding cells"""
+        cx, cy = self._cell(x, y)
+        found = set()
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for other in self._grid.get((cx + dx, cy + dy), ()):
+                    ox, oy = self._coords[other]
+                    if (ox - x) ** 2 + (oy - y) ** 2 <= self._eps_sq:
+                        found.add(other)
+        return found
+
+    def _is_core(self, key):
+        # The neighborhood weight includes the point itself, as in scikit-learn
+        weight = self._weights[key] + sum(self._weights[n] for n in self._neighbors[key])
+        return weight >= self.min_samples - WEIGHT_TOLERANCE
+
+    def insert(self, key, x, y, weight=1.0):
+        """
+        Add a point and update the clusters around it.
+
+        Re-inserting an existing key moves the point or changes its weight.
+        """
+        if key in self._coords:
+            self.remove(key)
+
+        neighbors = self._query(x, y)
+        self._coords[key] = (x, y)
+        self._weights[key] = weight
+        self._grid[self._cell(x, y)].add(key)
+        self._neighbors[key] = neighbors
+        for other in neighbors:
+            self._neighbors[other].add(key)
+
+        self._refresh({key} | neighbors)
+
+    def remove(self, key):
+        """Remove a point (e.g. expired or flagged as fake) if present"""
+        if key not in self._coords:
+            return
+
+        x, y = self._coords.pop(key)
+        del self._weights[key]
+        cell = self._cell(x, y)
+        self._grid[cell].discard(key)
+        if not self._grid[cell]:
+            del self._grid[cell]
+
+        neighbors = self._neighbors.pop(key)
+        for other in neighbors:
+            self._neighbors[other].discard(key)
+
+        # Dissolve the removed point's cluster as well: it may split in two
+        dirty = set()
+        if key in self._core:
+            self._core.discard(key)
+            token = self._cluster_of.pop(key)
+            self._clusters[token].discard(key)
+            dirty.add(token)
+
+        self._refresh(neighbors, dirty)
+
+    def _refresh(self, affected, dirty=None):
+        """
+        Recompute core flags for `affected` points and rebuild every cluster
+        that contains one of them.
+        """
+        dirty = set(dirty or ())
+        seeds = set()
+
+        for key in affected:
+            was_core = key in self._core
+            is_core = self._is_core(key)
+            if was_core:
+                dirty.add(self._cluster_of[key])
+            if is_core:
+                self._core.add(key)
+                seeds.add(key)
+            elif was_core:
+                self._core.discard(key)
+                token = self._cluster_of.pop(key)
+                self._clusters[token].discard(key)
+
+        # A core point that gained or lost a core neighbor can only change
+        # its own cluster or clusters it now touches, all reachable from seeds
+        for token in dirty:
+            members = self._clusters.pop(token, set())
+            for member in members:
+                del self._cluster_of[member]
+            seeds |= members
+
+        for seed in seeds:
+            if seed in self._cluster_of:
+                continue
+            token = self._next_token
+            self._next_token += 1
+            members = set()
+            stack = [seed]
+            while stack:
+                current = stack.pop()
+                if current in members:
+                    continue
+                old_token = self._cluster_of.get(current)
+                if old_token is not None and old_token != token:
+                    # Merged with an untouched cluster: absorb it whole
+                    for member in self._clusters.pop(old_token):
+                        self._cluster_of[member] = token
+                        members.add(member)
+                        stack.extend(n for n in self._neighbors[member] if n in self._core)
+                    continue
+                members.add(current)
+                self._cluster_of[current] = token
+                stack.extend(n for n in self._neighbors[current] if n in self._core)
+            self._clusters[token] = members
+
+    def labels(self):
+        """
+        Return (keys, labels) with keys in ascending order and scikit-learn
+        compatible labels (-1 for noise).
+        """
+        keys = self.keys()
+        order = {key: i for i, key in enumerate(keys)}
+
+        # Number clusters by their lowest-ordered core point
+        first_core = {
+            token: min(order[m] for m in members)
+            for token, members in self._clusters.items() if members
+        }
+        ranked = sorted(first_core, key=first_core.get)
+        label_of_token = {token: label for label, token in enumerate(ranked)}
+
+        labels = []
+        for key in keys:
+            if key in self._core:
+                labels.append(label_of_token[self._cluster_of[key]])
+                continue
+            tokens = {self._cluster_of[n] for n in self._neighbors[key] if n in self._core}
+            if tokens:
+                labels.append(min(label_of_token[t] for t in tokens))
+            else:
+                labels.append(-1)
+
+        return keys, labels
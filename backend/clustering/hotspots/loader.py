@@ -0,0 +1,283 @@
+"""
+Columnar report loader
+
+Clustering only needs a report's id, location and trust fields, but a
+plain `find()` decodes whole documents (description, photo URL and the
+growing status history) into Python dicts. The loader asks MongoDB for
+just those fields and streams them batch by batch into NumPy columns, so
+fetch time and memory grow with the number of reports rather than with
+document size.
+
+The same buffer backs the pymongo loader used by the services and the
+motor loader used by the API.
+"""
+
+import numpy as np
+from bson import ObjectId
+
+# Server-side projection: the only fields the clustering paths read
+CLUSTERING_PROJECTION = {
+    '_id': 1,
+    'location.lat': 1,
+    'location.lng': 1,
+    'trustWeight': 1,
+    'trustScore': 1,
+    'timestamp': 1,
+    'category': 1,
+    'deviceFingerprint': 1
+}
+
+DEFAULT_BATCH_SIZE = 5000
+
+# Defaults for reports created before trust scoring existed
+DEFAULT_TRUST_WEIGHT = 0.5
+DEFAULT_TRUST_SCORE = 50
+
+
+class ReportColumns:
+    """
+    Clustering fields of a set of reports as NumPy arrays.
+
+    Attributes:
+        ids: (n, 12) uint8 raw ObjectId bytes
+        lat, lng: float64 coordinates in degrees
+        weights: float64 trust weights (they are summed and compared
+            against thresholds, so they keep full precision)
+        trust_scores: float32 trust scores
+        timestamps: datetime64[ms] report times (NaT if missing), or None
+            when the columns were built without them
+        categories: int16 code per report into category_names (-1 if
+            the report has no category), or None
+        category_names: Category name per code
+        fingerprints: int32 code per report into fingerprint_names (-1 if
+            the report is anonymous), or None
+        fingerprint_names: Device fingerprint per code, the full string
+    """
+
+    def __init__(self, ids, lat, lng, weights, trust_scores, timestamps=None,
+                 categories=None, category_names=(), fingerprints=None, fingerprint_names=()):
+        self.ids = ids
+        self.lat = lat
+        self.lng = lng
+        self.weights = weights
+        self.trust_scores = trust_scores
+        self.timestamps = timestamps
+        self.categories = categories
+        self.category_names = list(category_names)
+        self.fingerprints = fingerprints
+        self.fingerprint_names = list(fingerprint_names)
+
+    def __len__(self):
+        return len(self.lat)
+
+    @classmethod
+    def from_documents(cls, documents):
+        """Build columns from report documents already in memory"""
+        buffer = ColumnBuffer()
+        for document in documents:
+            buffer.add(document)
+        return buffer.finish()
+
+    def select(self, rows):
+        """Subset by boolean mask or index array"""
+        return ReportColumns(
+            self.ids[rows], self.lat[rows], self.lng[rows],
+            self.weights[rows], self.trust_scores[rows],
+            None if self.timestamps is None else self.timestamps[rows],
+            None if self.categories is None else self.categories[rows],
+            self.category_names,
+            None if self.fingerprints is None else self.fingerprints[rows],
+            self.fingerprint_names
+        )
+
+    def with_weights(self, weights, trust_scores=None):
+        """Same reports with other weights (e.g. decayed or live trust ones)"""
+        return ReportColumns(
+            self.ids, self.lat, self.lng, weights,
+            self.trust_scores if trust_scores is None else trust_scores,
+            self.timestamps, self.categories, self.category_names,
+            self.fingerprints, self.fingerprint_names
+        )
+
+    @staticmethod
+    def _merge_codes(first, second, codes_field, names_field, dtype):
+        """Codes of both column sets mapped onto their shared names"""
+        names = list(dict.fromkeys(getattr(first, names_field) + getattr(second, names_field)))
+        index = {name: code for code, name in enumerate(names)}
+        merged = []
+        for columns in (first, second):
+            codes = getattr(columns, codes_field)
+            if codes is None:
+                codes = np.full(len(columns), -1, dtype=dtype)
+            remap = np.array([index[name] for name in getattr(columns, names_field)] + [-1], dtype=dtype)
+            merged.append(remap[codes])  # code -1 picks the trailing -1
+        return np.concatenate(merged), names
+
+    @classmethod
+    def concat(cls, first, second):
+        """Rows of both column sets; category and fingerprint codes are mapped onto shared names"""
+        categories, names = cls._merge_codes(first, second, 'categories', 'category_names', np.int16)
+        fingerprints, fingerprint_names = cls._merge_codes(
+            first, second, 'fingerprints', 'fingerprint_names', np.int32
+        )
+        return cls(
+            np.concatenate((first.ids, second.ids)),
+            np.concatenate((first.lat, second.lat)),
+            np.concatenate((first.lng, second.lng)),
+            np.concatenate((first.weights, second.weights)),
+            np.concatenate((first.trust_scores, second.trust_scores)),
+            np.concatenate((first.timestamps, second.timestamps)),
+            categories,
+            names,
+            fingerprints,
+            fingerprint_names
+        )
+
+    def category_rows(self):
+        """Dict of category name to the rows of that category (reports with one only)"""
+        if self.categories is None:
+            return {}
+        order = np.argsort(self.categories, kind='stable')
+        codes, starts = np.unique(self.categories[order], return_index=True)
+        groups = np.split(order, starts[1:])
+        return {
+            self.category_names[code]: rows
+            for code, rows in zip(codes, groups) if code >= 0
+        }
+
+    def sorted_by_timestamp(self):
+        """Copy ordered from the oldest to the newest report (stable)"""
+        return self.select(np.argsort(self.timestamps, kind='stable'))
+
+    def id_strings(self, rows=None):
+        """Hex ObjectId strings (as str(ObjectId)) for all or some rows"""
+        ids = self.ids if rows is None else self.ids[rows]
+        hex_ids = ids.tobytes().hex()
+        return [hex_ids[i:i + 24] for i in range(0, len(hex_ids), 24)]
+
+    def object_ids(self, rows=None):
+        """ObjectIds for all or some rows"""
+        ids = self.ids if rows is None else self.ids[rows]
+        return [ObjectId(row.tobytes()) for row in ids]
+
+
+class ColumnBuffer:
+    """
+    Growable column storage filled one document at a time.
+
+    Documents are staged in small Python lists and copied into the
+    preallocated arrays a batch at a time; capacity doubles when full.
+    """
+
+    def __init__(self, capacity=DEFAULT_BATCH_SIZE, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.size = 0
+        self._ids = np.empty((capacity, 12), dtype=np.uint8)
+        self._lat = np.empty(capacity, dtype=np.float64)
+        self._lng = np.empty(capacity, dtype=np.float64)
+        self._weights = np.empty(capacity, dtype=np.float64)
+        self._trust_scores = np.empty(capacity, dtype=np.float32)
+        self._timestamps = np.empty(capacity, dtype='datetime64[ms]')
+        self._categories = np.empty(capacity, dtype=np.int16)
+        self._fingerprints = np.empty(capacity, dtype=np.int32)
+        self._category_codes = {}
+        self._fingerprint_codes = {}
+        self._clear_pending()
+
+    def _clear_pending(self):
+        self._pending_ids = []
+        self._pending_lat = []
+        self._pending_lng = []
+        self._pending_weights = []
+        self._pending_scores = []
+        self._pending_timestamps = []
+        self._pending_categories = []
+        self._pending_fingerprints = []
+
+    def add(self, document):
+        location = document['location']
+        self._pending_ids.append(document['_id'].binary)
+        self._pending_lat.append(location['lat'])
+        self._pending_lng.append(location['lng'])
+        self._pending_weights.append(document.get('trustWeight', DEFAULT_TRUST_WEIGHT))
+        self._pending_scores.append(document.get('trustScore', DEFAULT_TRUST_SCORE))
+        self._pending_timestamps.append(document.get('timestamp'))
+        category = document.get('category')
+        self._pending_categories.append(
+            -1 if category is None else self._category_codes.setdefault(category, len(self._category_codes))
+        )
+        # Fingerprints are client-supplied: keyed by the full string, whatever it holds
+        fingerprint = document.get('deviceFingerprint')
+        self._pending_fingerprints.append(
+            self._fingerprint_codes.setdefault(fingerprint, len(self._fingerprint_codes))
+            if isinstance(fingerprint, str) and fingerprint else -1
+        )
+        if len(self._pending_lat) >= self.batch_size:
+            self._flush()
+
+    def _grow(self, needed):
+        capacity = max(needed, 2 * len(self._lat))
+        for name in ('_ids', '_lat', '_lng', '_weights', '_trust_scores', '_timestamps', '_categories', '_fingerprints'):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def _flush(self):
+        count = len(self._pending_lat)
+        if count == 0:
+            return
+        end = self.size + count
+        if end > len(self._lat):
+            self._grow(end)
+
+        self._ids[self.size:end] = np.frombuffer(b''.join(self._pending_ids), dtype=np.uint8).reshape(count, 12)
+        self._lat[self.size:end] = self._pending_lat
+        self._lng[self.size:end] = self._pending_lng
+        self._weights[self.size:end] = self._pending_weights
+        self._trust_scores[self.size:end] = self._pending_scores
+        self._timestamps[self.size:end] = np.array(self._pending_timestamps, dtype='datetime64[ms]')
+        self._categories[self.size:end] = self._pending_categories
+        self._fingerprints[self.size:end] = self._pending_fingerprints
+        self.size = end
+        self._clear_pending()
+
+    def finish(self):
+        """Return the filled columns (trimmed copies, so spare capacity is freed)"""
+        self._flush()
+        n = self.size
+        return ReportColumns(
+            self._ids[:n].copy(), self._lat[:n].copy(), self._lng[:n].copy(),
+            self._weights[:n].copy(), self._trust_scores[:n].copy(),
+            self._timestamps[:n].copy(), self._categories[:n].copy(),
+            list(self._category_codes), self._fingerprints[:n].copy(),
+            list(self._fingerprint_codes)
+        )
+
+
+def load_report_columns(collection, query, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Load the clustering fields of matching reports (pymongo).
+
+    Args:
+        collection: pymongo `reports` collection
+        query: Report filter
+        batch_size: Documents per cursor batch and per buffer flush
+
+    Returns:
+        ReportColumns sorted by _id
+    """
+    cursor = collection.find(query, CLUSTERING_PROJECTION, batch_size=batch_size).sort('_id', 1)
+    buffer = ColumnBuffer(batch_size=batch_size)
+    for document in cursor:
+        buffer.add(document)
+    return buffer.finish()
+
+
+async def load_report_columns_async(collection, query, batch_size=DEFAULT_BATCH_SIZE):
+    """Async (motor) variant of load_report_columns"""
+    cursor = collection.find(query, CLUSTERING_PROJECTION, batch_size=batch_size).sort('_id', 1)
+    buffer = ColumnBuffer(batch_size=batch_size)
+    async for document in cursor:
+        buffer.add(document)
+    return buffer.finish()
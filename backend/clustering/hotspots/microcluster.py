@@ -0,0 +1,175 @@
+"""
+Micro-cluster pre-summarization for very large windows
+
+Reports are absorbed into micro-clusters, one per grid cell a fraction of
+eps wide. Each keeps a clustering feature (CF, as in BIRCH): report
+count, summed trust weight, weighted linear sum and weighted sum of
+squares. CFs are additive, so the window's reports are absorbed in
+fixed-size batches without any report-level neighbor structure. The
+summary is rebuilt from the window on every run.
+
+DBSCAN then runs over the micro-cluster centroids, each weighted by its
+summed trust weight, so a million-report window shrinks to the number of
+occupied cells. Reports are mapped back to a final cluster only when a
+caller asks for it (through the cell they fall in).
+
+The result approximates report-level DBSCAN: distances are measured
+between centroids, which are at most one cell diagonal from their reports.
+"""
+
+import numpy as np
+
+from .grid import weighted_dbscan
+
+DEFAULT_CELL_FRACTION = 0.25  # Cell size as a fraction of eps
+
+
+# Cell (cx, cy) is stored as the key cx * 2^32 + cy
+KEY_SHIFT = 2 ** 32
+
+
+class MicroClusters:
+    """Grid of clustering features over projected report coordinates"""
+
+    def __init__(self, cell_size, capacity=1024):
+        self.cell_size = float(cell_size)
+        self.size = 0                                         # slots in use
+        self._sorted_keys = np.zeros(0, dtype=np.int64)       # cell keys, sorted
+        self._sorted_slots = np.zeros(0, dtype=np.int64)      # slot of each sorted key
+        self.cell_keys = np.zeros(capacity, dtype=np.int64)   # cell key per slot
+        self.count = np.zeros(capacity, dtype=np.int64)       # reports
+        self.weight = np.zeros(capacity)                      # summed trust weight
+        self.linear_sum = np.zeros((capacity, 2))             # weighted sum of x, y
+        self.square_sum = np.zeros(capacity)                  # weighted sum of x^2 + y^2
+
+    @classmethod
+    def for_eps(cls, eps, cell_fraction=DEFAULT_CELL_FRACTION):
+        return cls(eps * cell_fraction)
+
+    def __len__(self):
+        """Number of non-empty micro-clusters"""
+        return int(np.count_nonzero(self.count[:self.size]))
+
+    def _keys(self, points):
+        cells = np.floor(np.asarray(points, dtype=np.float64) / self.cell_size).astype(np.int64)
+        return cells[:, 0] * KEY_SHIFT + cells[:, 1]
+
+    def _slots(self, points, create):
+        """Slot per point (-1 for unknown cells unless create is set)"""
+        keys, inverse = np.unique(self._keys(points), return_inverse=True)
+        pos = np.searchsorted(self._sorted_keys, keys)
+        found = pos < len(self._sorted_keys)
+        found[found] = self._sorted_keys[pos[found]] == keys[found]
+
+        slots = np.full(len(keys), -1, dtype=np.int64)
+        slots[found] = self._sorted_slots[pos[found]]
+        if create and not found.all():
+            new = np.flatnonzero(~found)
+            slots[new] = np.arange(self.size, self.size + len(new))
+            if self.size + len(new) > len(self.count):
+                self._grow(self.size + len(new))
+            self.cell_keys[slots[new]] = keys[new]
+            self._sorted_keys = np.insert(self._sorted_keys, pos[new], keys[new])
+            self._sorted_slots = np.insert(self._sorted_slots, pos[new], slots[new])
+            self.size += len(new)
+        return slots[inverse.ravel()]
+
+    def _grow(self, needed):
+        capacity = max(needed, 2 * len(self.count))
+        for name in ('cell_keys', 'count', 'weight', 'linear_sum', 'square_sum'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _update(self, points, weights, slots):
+        points = np.asarray(points, dtype=np.float64)
+        weights = np.asarray(weights, dtype=np.float64)
+        known = slots >= 0
+        if not known.all():
+            points, weights, slots = points[known], weights[known], slots[known]
+        size = len(self.count)
+        self.count += np.bincount(slots, minlength=size)
+        self.weight += np.bincount(slots, weights=weights, minlength=size)
+        for axis in (0, 1):
+            self.linear_sum[:, axis] += np.bincount(slots, weights=weights * points[:, axis], minlength=size)
+        self.square_sum += np.bincount(
+            slots, weights=weights * np.einsum('ij,ij->i', points, points), minlength=size
+        )
+
+    def absorb(self, points, weights):
+        """Add a batch of reports (projected points and trust weights)"""
+        if len(points):
+            self._update(points, weights, self._slots(points, create=True))
+
+    def occupied(self):
+        """Slots of the non-empty micro-clusters"""
+        return np.flatnonzero(self.count[:self.size] > 0)
+
+    def centroids(self, slots):
+        """Weighted centroid per micro-cluster (cell center if weight is 0)"""
+        weight = self.weight[slots]
+        centroids = np.empty((len(slots), 2))
+        positive = weight > 0
+        centroids[positive] = self.linear_sum[slots][positive] / weight[positive, None]
+        if not positive.all():
+            keys = self.cell_keys[slots[~positive]]
+            cx = np.floor_divide(keys + KEY_SHIFT // 2, KEY_SHIFT)
+            cy = keys - cx * KEY_SHIFT
+            centroids[~positive] = (np.column_stack((cx, cy)) + 0.5) * self.cell_size
+        return centroids
+
+    def radii(self, slots):
+        """Weighted RMS distance of each micro-cluster's reports to its centroid"""
+        weight = np.maximum(self.weight[slots], 1e-12)
+        centroids = self.linear_sum[slots] / weight[:, None]
+        spread = self.square_sum[slots] / weight - np.einsum('ij,ij->i', centroids, centroids)
+        return np.sqrt(np.maximum(spread, 0.0))
+
+    def cluster(self, eps, min_weight):
+        """
+        Weighted DBSCAN over the micro-clusters.
+
+        Returns:
+            MicroClustering holding a label per micro-cluster
+        """
+        slots = self.occupied()
+        labels = weighted_dbscan(self.centroids(slots), self.weight[slots], eps, min_weight)
+        slot_labels = np.full(self.size, -1, dtype=np.int64)
+        slot_labels[slots] = labels
+        return MicroClustering(self, slot_labels)
+
+
+class MicroClustering:
+    """Micro-cluster labels, mapped back to reports on demand"""
+
+    def __init__(self, micro, slot_labels):
+        self.micro = micro
+        self.slot_labels = slot_labels
+
+    @property
+    def cluster_count(self):
+        return int(self.slot_labels.max(initial=-1)) + 1
+
+    def labels_for(self, points):
+        """Final cluster label per report (-1 for noise or unknown cells)"""
+        slots = self.micro._slots(points, create=False)
+        labels = np.full(len(slots), -1, dtype=np.int64)
+        known = slots >= 0
+        labels[known] = self.slot_labels[slots[known]]
+        return labels
+
+
+def microcluster_dbscan(points, weights, eps, min_weight, cell_fraction=DEFAULT_CELL_FRACTION, batch_size=100_000):
+    """
+    Two-stage weighted DBSCAN: summarize into micro-clusters, cluster them,
+    then map the reports back.
+
+    Returns:
+        (labels per report, number of micro-clusters)
+    """
+    micro = MicroClusters.for_eps(eps, cell_fraction)
+    for start in range(0, len(points), batch_size):
+        micro.absorb(points[start:start + batch_size], weights[start:start + batch_size])
+    return micro.cluster(eps, min_weight).labels_for(points), len(micro)
+
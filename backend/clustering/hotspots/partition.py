@@ -0,0 +1,197 @@
+"""
+Tile-partitioned parallel DBSCAN
+
+The projected points are cut into vertical strips (tiles) holding roughly
+equal numbers of points, and the tiles are clustered in parallel worker
+processes. Each worker receives its tile plus a halo of width 2 * eps:
+- every point within eps of the tile (the inner region) then has all of
+  its neighbors available, so its core flag is exact
+- core-core edges with at least one endpoint inside the tile are exact
+  too, so the worker's local clusters never wrongly merge or split
+
+Local clusters meeting at a tile border share the halo core points that
+appear in both tiles; a union-find pass over those shared points merges
+them. Labels equal `grid.weighted_dbscan` on the whole set.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from .grid import WEIGHT_TOLERANCE, grid_neighbor_pairs, weighted_dbscan
+
+TILES_PER_WORKER = 4  # More tiles than workers evens out dense and sparse strips
+MIN_TILE_WIDTH_EPS = 8  # Narrower tiles would be mostly halo
+
+
+def tile_bounds(x, eps, tiles):
+    """
+    Strip boundaries along x with about the same number of points per strip.
+
+    Returns:
+        Sorted inner boundaries; strip k covers [bounds[k-1], bounds[k])
+    """
+    if tiles <= 1 or len(x) == 0:
+        return np.zeros(0)
+    bounds = np.quantile(x, np.arange(1, tiles) / tiles)
+    kept, last = [], x.min()
+    for bound in bounds:
+        if bound - last >= MIN_TILE_WIDTH_EPS * eps and x.max() - bound >= MIN_TILE_WIDTH_EPS * eps:
+            kept.append(bound)
+            last = bound
+    return np.asarray(kept)
+
+
+def cluster_tile(points, weights, owned, eps, min_weight):
+    """
+    Cluster one tile with its halo. Runs in a worker process.
+
+    Args:
+        points, weights: Tile points, halo included
+        owned: Mask of the points that belong to this tile
+        eps, min_weight: DBSCAN parameters
+
+    Returns:
+        (core, comp, border_rows, border_comps), indices local to the tile:
+        - core: core mask, exact for owned points and points within eps
+        - comp: local cluster per core point (-1 elsewhere)
+        - border_rows, border_comps: owned non-core points and each local
+          cluster they touch
+    """
+    n = len(points)
+    empty = np.zeros(0, dtype=np.int64)
+    if n == 0:
+        return np.zeros(0, dtype=bool), empty, empty, empty
+    rows, cols = grid_neighbor_pairs(points, eps)
+    neighbor_weight = np.bincount(rows, weights=weights[cols], minlength=n)
+
+    # Only points within eps of the tile have their full neighborhood here
+    touches_tile = np.zeros(n, dtype=bool)
+    touches_tile[rows[owned[cols]]] = True
+    core = touches_tile & (neighbor_weight >= min_weight - WEIGHT_TOLERANCE)
+
+    keep = core[rows] & core[cols] & (owned[rows] | owned[cols])
+    graph = csr_matrix((np.ones(int(keep.sum())), (rows[keep], cols[keep])), shape=(n, n))
+    _, component = connected_components(graph, directed=True, connection='strong')
+
+    # Renumber the components that contain core points 0..k-1
+    comp = np.full(n, -1, dtype=np.int64)
+    core_idx = np.flatnonzero(core)
+    _, comp[core_idx] = np.unique(component[core_idx], return_inverse=True)
+
+    border = owned[rows] & ~core[rows] & core[cols]
+    pairs = np.unique(np.column_stack((rows[border], comp[cols[border]])), axis=0)
+    return core, comp, pairs[:, 0], pairs[:, 1]
+
+
+def union_find(n, a, b, parent=None):
+    """
+    Connected roots of n nodes joined by edges a[i] - b[i].
+
+    Vectorized union-find: every round hooks the larger root of each edge
+    onto the smaller one, then compresses paths by pointer jumping. The
+    returned array is fully compressed; pass it back as `parent` to add
+    edges incrementally.
+    """
+    parent = np.arange(n) if parent is None else parent
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    while True:
+        # parent is fully compressed here, so parent[x] is x's root
+        ra, rb = parent[a], parent[b]
+        differ = ra != rb
+        if not differ.any():
+            return parent
+        # Edges within one tree stay that way; drop them
+        a, b, ra, rb = a[differ], b[differ], ra[differ], rb[differ]
+        np.minimum.at(parent, np.maximum(ra, rb), np.minimum(ra, rb))
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+
+def partitioned_dbscan(points, weights, eps, min_weight, workers=None, executor=None):
+    """
+    Weighted DBSCAN with tiles clustered in parallel.
+
+    Args:
+        points: (n, 2) projected coordinates in meters
+        weights: Trust weight per point
+        eps: Neighborhood radius in meters
+        min_weight: Summed neighborhood weight needed for a core point
+        workers: Worker processes (default: CPU count); 1 runs in-process
+        executor: Existing ProcessPoolExecutor to reuse
+
+    Returns:
+        Labels identical to weighted_dbscan(points, weights, eps, min_weight)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    n = len(points)
+    workers = workers or os.cpu_count() or 1
+
+    bounds = tile_bounds(points[:, 0], eps, workers * TILES_PER_WORKER)
+    if len(bounds) == 0:
+        return weighted_dbscan(points, weights, eps, min_weight)
+
+    # Owned tile and tile members (halo of 2 * eps) per tile
+    x = points[:, 0]
+    owner = np.searchsorted(bounds, x, side='right')
+    edges = np.concatenate(([-np.inf], bounds, [np.inf]))
+    members = [
+        np.flatnonzero((x >= edges[t] - 2 * eps) & (x < edges[t + 1] + 2 * eps))
+        for t in range(len(edges) - 1)
+    ]
+    tasks = [
+        (points[idx], weights[idx], owner[idx] == t, eps, min_weight)
+        for t, idx in enumerate(members)
+    ]
+
+    if workers == 1:
+        results = [cluster_tile(*task) for task in tasks]
+    elif executor is not None:
+        results = list(executor.map(cluster_tile, *zip(*tasks)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(cluster_tile, *zip(*tasks)))
+
+    # Local clusters become nodes; offsets make their ids global
+    offsets = np.cumsum([0] + [int(comp.max(initial=-1)) + 1 for _, comp, _, _ in results])
+    core = np.zeros(n, dtype=bool)
+    node_of = np.full(n, -1, dtype=np.int64)
+    for t, (idx, (tile_core, comp, _, _)) in enumerate(zip(members, results)):
+        own = owner[idx] == t
+        core[idx[own]] = tile_core[own]
+        owned_core = own & tile_core
+        node_of[idx[owned_core]] = offsets[t] + comp[owned_core]
+
+    # Union: a halo core's cluster in a neighboring tile is its own cluster
+    merge_a, merge_b = [], []
+    for t, (idx, (tile_core, comp, _, _)) in enumerate(zip(members, results)):
+        halo_core = (owner[idx] != t) & tile_core
+        merge_a.append(offsets[t] + comp[halo_core])
+        merge_b.append(node_of[idx[halo_core]])
+    root = union_find(int(offsets[-1]), np.concatenate(merge_a), np.concatenate(merge_b))
+
+    # Rank merged clusters by their lowest core point, as weighted_dbscan does
+    labels = np.full(n, -1, dtype=np.int64)
+    core_idx = np.flatnonzero(core)
+    if len(core_idx) == 0:
+        return labels
+    roots, first = np.unique(root[node_of[core_idx]], return_index=True)
+    rank = np.empty(int(offsets[-1]), dtype=np.int64)
+    rank[roots[np.argsort(first)]] = np.arange(len(roots))
+    labels[core_idx] = rank[root[node_of[core_idx]]]
+
+    # Border points: smallest label among the clusters they touch
+    border_labels = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+    for t, (idx, (_, _, border_rows, border_comps)) in enumerate(zip(members, results)):
+        np.minimum.at(border_labels, idx[border_rows], rank[root[offsets[t] + border_comps]])
+    is_border = border_labels != np.iinfo(np.int64).max
+    labels[is_border] = border_labels[is_border]
+    return labels
@@ -0,0 +1,302 @@
+"""
+Generation-swap persistence for cluster results
+
+Every clustering run is published as a new generation:
+1. a generation number is taken from an atomic counter and a publish
+   lease is taken on the `active` pointer in `cluster_state`
+2. the run is diffed against the active generation (hotspots.tracking);
+   the _ids it retires are recorded on the lease, new and changed
+   hotspots are bulk-inserted as versions visible from this generation
+   on, replaced and vanished ones are marked as retired at this
+   generation, and unchanged hotspots are not written at all
+3. the pointer is flipped to the new generation in one update
+
+A publisher that loses its lease (or the next one, if it died holding
+it) rolls back only its own generation's inserts and the retirements
+recorded on its lease.
+
+A stored version is visible to generation g when
+sinceGeneration <= g < retiredGeneration (None while current), so readers
+look up the pointer and run one indexed query: they never see a
+half-written run, a mix of two runs or an empty set mid-refresh.
+Versions retired before the previous generation are deleted in the
+background, keeping the previous generation whole for readers that
+fetched the old pointer just before a flip.
+
+Clusters are tagged with the time window they were computed over
+(hotspots.windows). A run replaces only the windows it publishes; the
+other windows carry over into the new generation unchanged, so a 24h-only
+writer does not wipe the weekly hotspots. Untagged clusters (written
+before windows existed) count as the default window.
+
+Per-category clusters carry a `category` as well; all-category clusters
+have none. Hotspots are tracked within their (window, category) scope, and
+only runs that cluster by category replace per-category clusters.
+
+Publishing is synchronous (pymongo); the API runs it in a thread on the
+motor client's underlying pymongo database. Readers in the API use the
+`_async` helpers.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from .tracking import diff_clusters
+from .windows import DEFAULT_WINDOW
+
+STATE_COLLECTION = 'cluster_state'
+ACTIVE_ID = 'active'
+COUNTER_ID = 'generation_counter'
+
+GENERATIONS_KEPT = 2                   # The active generation and the one before it
+LEASE_TIMEOUT = timedelta(minutes=10)  # A publisher holding the lease longer is presumed dead
+LEASE_WAIT_SECONDS = 30                # How long to wait for another publisher to finish
+
+CLUSTER_INDEXES = [
+    [('retiredGeneration', 1), ('sinceGeneration', 1)],
+    [('hotspotId', 1)],
+    [('window', 1), ('retiredGeneration', 1), ('sinceGeneration', 1)],
+    [('category', 1), ('window', 1), ('retiredGeneration', 1), ('sinceGeneration', 1)]
+]
+
+ANY_CATEGORY = '*'
+
+
+def visible_query(generation, window=None, category=ANY_CATEGORY):
+    """
+    Filter for the cluster versions that make up a generation.
+
+    Args:
+        generation: Generation number
+        window: Only this window (None: all windows)
+        category: Only this category's clusters; None for the
+            all-category clusters, ANY_CATEGORY for both kinds
+    """
+    query = {
+        'sinceGeneration': {'$lte': generation},
+        '$or': [
+            {'retiredGeneration': None},
+            {'retiredGeneration': {'$gt': generation}}
+        ]
+    }
+    if window is not None:
+        query['window'] = {'$in': [window, None]} if window == DEFAULT_WINDOW else window
+    if category != ANY_CATEGORY:
+        query['category'] = category
+    return query
+
+
+def window_of(cluster):
+    return cluster.get('window') or DEFAULT_WINDOW
+
+
+def scope_of(cluster):
+    """(window, category) of a cluster; category is None for all-category clusters"""
+    return window_of(cluster), cluster.get('category')
+
+
+def _pointer(generation, source, scope_counts):
+    return {
+        'generation': generation,
+        'source': source,
+        'clusterCount': sum(scope_counts.values()),
+        # All-category hotspots per window
+        'windowCounts': {window: count for (window, category), count in scope_counts.items() if category is None},
+        'activatedAt': datetime.utcnow()
+    }
+
+
+def _garbage_query(active_generation, keep):
+    # Also drops clusters written before versioning existed
+    return {'$or': [
+        {'retiredGeneration': {'$lte': active_generation - keep + 1}},
+        {'sinceGeneration': {'$exists': False}}
+    ]}
+
+
+def ensure_indexes(db):
+    """Create the indexes that serve active-generation reads and tracking"""
+    for keys in CLUSTER_INDEXES:
+        db['clusters'].create_index(keys)
+
+
+def next_generation(db):
+    """Reserve the next generation number"""
+    counter = db[STATE_COLLECTION].find_one_and_update(
+        {'_id': COUNTER_ID},
+        {'$inc': {'seq': 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter['seq']
+
+
+def get_active_generation(db):
+    """Return the active pointer document, or None before the first run"""
+    return db[STATE_COLLECTION].find_one({'_id': ACTIVE_ID, 'generation': {'$exists': True}})
+
+
+def _rollback(db, pending):
+    """
+    Undo the writes of a publisher that died holding the lease or lost it.
+
+    Args:
+        pending: That publisher's lease: its generation and the _ids it
+            retired (recorded before it wrote anything)
+    """
+    generation = pending['generation']
+    db['clusters'].delete_many({'sinceGeneration': generation})
+    if pending.get('retired'):
+        db['clusters'].update_many(
+            {'_id': {'$in': pending['retired']}, 'retiredGeneration': generation},
+            {'$set': {'retiredGeneration': None}}
+        )
+
+
+def _acquire_lease(db, generation):
+    """
+    Take the publish lease for a generation.
+
+    Returns:
+        The generation the run is based on (0 before the first run), or
+        None if another publisher kept the lease for LEASE_WAIT_SECONDS
+    """
+    deadline = time.monotonic() + LEASE_WAIT_SECONDS
+    while True:
+        now = datetime.utcnow()
+        try:
+            before = db[STATE_COLLECTION].find_one_and_update(
+                {'_id': ACTIVE_ID, '$or': [
+                    {'pending': None},
+                    {'pending.startedAt': {'$lt': now - LEASE_TIMEOUT}}
+                ]},
+                {'$set': {'pending': {'generation': generation, 'startedAt': now}}},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            # The pointer exists and another publisher holds the lease
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(0.5)
+            continue
+
+        if before is None:
+            return 0
+        if before.get('pending'):
+            _rollback(db, before['pending'])
+        return before.get('generation', 0)
+
+
+def publish_clusters(db, clusters, source, windows=None, by_category=False):
+    """
+    Publish one run's clusters as a new generation.
+
+    Args:
+        db: pymongo database
+        clusters: Cluster documents of one run; untagged ones are tagged
+            with the default window
+        source: Name of the writer (recorded on the pointer)
+        windows: Windows this run replaces, also when it found no
+            clusters in them (default: the default window plus the
+            windows of `clusters`)
+        by_category: The run covers every category, so per-category
+            clusters of the replaced windows are replaced too
+
+    Returns:
+        Dict with generation, activated (False if the lease could not be
+        taken or was lost), inserted, retired and unchanged counts
+    """
+    generation = next_generation(db)
+    result = {'generation': generation, 'activated': False, 'inserted': 0, 'retired': 0, 'unchanged': 0}
+
+    base = _acquire_lease(db, generation)
+    if base is None:
+        return result
+
+    for cluster in clusters:
+        cluster['window'] = window_of(cluster)
+    windows = set(windows or [DEFAULT_WINDOW]) | {cluster['window'] for cluster in clusters}
+
+    # Scopes this run replaces; hotspots are tracked within their scope and
+    # all other scopes carry over
+    previous = list(db['clusters'].find(visible_query(base))) if base else []
+    replaced = {(window, None) for window in windows} | {scope_of(cluster) for cluster in clusters}
+    if by_category:
+        replaced |= {scope_of(cluster) for cluster in previous if window_of(cluster) in windows}
+
+    scope_counts = {}
+    for cluster in previous:
+        scope = scope_of(cluster)
+        if scope not in replaced:
+            scope_counts[scope] = scope_counts.get(scope, 0) + 1
+
+    inserts, retired, unchanged = [], [], 0
+    for scope in sorted(replaced, key=lambda scope: (scope[0], scope[1] or '')):
+        current = [cluster for cluster in clusters if scope_of(cluster) == scope]
+        scope_inserts, scope_retired, scope_unchanged = diff_clusters(
+            [cluster for cluster in previous if scope_of(cluster) == scope], current
+        )
+        inserts += scope_inserts
+        retired += scope_retired
+        unchanged += scope_unchanged
+        scope_counts[scope] = len(current)
+
+    # The retirements go on the lease before anything is written, so a
+    # rollback reverts exactly them; a lease already lost stops the run
+    lease = {'_id': ACTIVE_ID, 'pending.generation': generation}
+    pending = {'generation': generation, 'retired': retired}
+    if db[STATE_COLLECTION].update_one(lease, {'$set': {'pending.retired': retired}}).matched_count == 0:
+        return result
+
+    # New versions stay invisible until the flip: sinceGeneration > active.
+    # Retired versions stay visible to readers of older generations.
+    if inserts:
+        for cluster in inserts:
+            cluster['sinceGeneration'] = generation
+            cluster['retiredGeneration'] = None
+        db['clusters'].insert_many(inserts, ordered=False)
+    retired_count = 0
+    if retired:
+        # Versions another publisher retired in the meantime keep its retirement
+        retired_count = db['clusters'].update_many(
+            {'_id': {'$in': retired}, 'retiredGeneration': None},
+            {'$set': {'retiredGeneration': generation}}
+        ).modified_count
+
+    flipped = db[STATE_COLLECTION].update_one(
+        lease,
+        {'$set': _pointer(generation, source, scope_counts), '$unset': {'pending': ''}}
+    )
+    if flipped.matched_count == 0:
+        # The lease timed out and another publisher took it over: its
+        # generation must not see this run's versions or retirements
+        _rollback(db, pending)
+
+    result.update(
+        activated=flipped.matched_count == 1,
+        inserted=len(inserts), retired=retired_count, unchanged=unchanged
+    )
+    threading.Thread(target=collect_garbage, args=(db,), daemon=True).start()
+    return result
+
+
+def collect_garbage(db, keep=GENERATIONS_KEPT):
+    """Delete versions no kept generation can see; returns the number removed"""
+    active = get_active_generation(db)
+    if active is None:
+        return 0
+    return db['clusters'].delete_many(_garbage_query(active['generation'], keep)).deleted_count
+
+
+async def ensure_indexes_async(db):
+    for keys in CLUSTER_INDEXES:
+        await db['clusters'].create_index(keys)
+
+
+async def get_active_generation_async(db):
+    return await db[STATE_COLLECTION].find_one({'_id': ACTIVE_ID, 'generation': {'$exists': True}})
@@ -0,0 +1,133 @@
+"""
+The shared clustering pipeline
+
+fetch → weight → DBSCAN → summarize → publish, with the same filters,
+parameters and cluster schema wherever it runs (the clustering services,
+the API refresh, the backfill). The steps live in their own modules:
+
+- loader: report columns from MongoDB (recent_reports_query is the filter)
+- trust: live trust weights per device
+- engines: DBSCAN implementations behind one interface
+- summary: cluster documents (cluster_documents)
+- persist: generation publishing
+
+This module holds the pieces the callers used to copy: configuration
+parsing, the report filters and the single-window cluster_reports.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .engines import DEFAULT_ENGINE, get_engine
+from .geo import DEFAULT_EPS_METERS, eps_meters_from_config, project
+from .loader import load_report_columns
+from .spatiotemporal import temporal_params_from_config
+from .summary import cluster_documents
+from .windows import DEFAULT_WINDOW, parse_window
+
+# Reports weighted below this are left out of clustering
+MIN_TRUST_WEIGHT_FOR_CLUSTERING = 0.3
+
+DEFAULT_MIN_SAMPLES = 3
+DEFAULT_EPS_DEGREES = 0.005  # ~500 meters, the legacy setting
+SYNC_OVERLAP = timedelta(seconds=30)  # Re-read margin for reports written during a sync
+
+
+def clustering_params(config):
+    """
+    Clustering parameters from the `config` document.
+
+    Args:
+        config: The config collection's document, or None
+
+    Returns:
+        Dict with eps (legacy degrees), eps_meters, min_samples, enabled
+        and temporal (spatio-temporal settings, None in spatial mode)
+    """
+    clustering_config = (config or {}).get('clustering') or {}
+    return {
+        'eps': clustering_config.get('epsilon', DEFAULT_EPS_DEGREES),
+        'eps_meters': eps_meters_from_config(clustering_config),
+        'min_samples': clustering_config.get('minSamples', DEFAULT_MIN_SAMPLES),
+        'enabled': clustering_config.get('enabled', True),
+        'temporal': temporal_params_from_config(clustering_config)
+    }
+
+
+def get_clustering_params(db):
+    """Clustering parameters from the config collection (pymongo)"""
+    return clustering_params(db['config'].find_one({}))
+
+
+def recent_reports_query(exclude_delayed=True, exclude_fake=True, window=DEFAULT_WINDOW, now=None):
+    """Build the reports filter for a clustering window (24 hours by default)"""
+    now = now or datetime.utcnow()
+
+    # Build query to exclude unwanted reports
+    query = {
+        'timestamp': {'$gte': now - parse_window(window)}
+    }
+
+    if exclude_fake:
+        query['flaggedAsFake'] = {'$ne': True}
+
+    if exclude_delayed:
+        # Exclude delayed reports unless their delay has expired
+        query['$or'] = [
+            {'isDelayed': {'$ne': True}},
+            {'delayedUntil': {'$lt': now}}
+        ]
+
+    return query
+
+
+def changed_since_query(since, now):
+    """Filter for reports created or changed since a time (fake flags, approvals, expired delays)"""
+    return {'$or': [
+        {'timestamp': {'$gte': since}},                  # New reports
+        {'updatedAt': {'$gte': since}},                  # Status / fake flag changes
+        {'delayedUntil': {'$gte': since, '$lt': now}},   # Delay expired
+    ]}
+
+
+def fetch_recent_report_columns(db, exclude_delayed=True, exclude_fake=True, window=DEFAULT_WINDOW, now=None):
+    """
+    Fetch the clustering fields of a window of reports as arrays.
+
+    Only _id, location, timestamp, category and trust fields are
+    transferred and decoded.
+
+    Returns:
+        ReportColumns sorted by _id
+    """
+    query = recent_reports_query(exclude_delayed, exclude_fake, window, now)
+    return load_report_columns(db['reports'], query)
+
+
+def cluster_reports(reports, eps_meters=DEFAULT_EPS_METERS, min_samples=DEFAULT_MIN_SAMPLES,
+                    engine=DEFAULT_ENGINE, now=None):
+    """
+    Trust-weighted DBSCAN over one set of reports.
+
+    Args:
+        reports: ReportColumns
+        eps_meters: Neighborhood radius in meters
+        min_samples: Minimum summed trust weight to form a core point
+        engine: Engine name or ClusteringEngine instance
+        now: Cluster timestamp
+
+    Returns:
+        Cluster documents (see summary.cluster_documents); empty when
+        fewer than two reports are weighted at least
+        MIN_TRUST_WEIGHT_FOR_CLUSTERING
+    """
+    valid_reports = reports.select(np.asarray(reports.weights) >= MIN_TRUST_WEIGHT_FOR_CLUSTERING)
+    if len(valid_reports) < 2:
+        return []
+    if isinstance(engine, str):
+        engine = get_engine(engine)
+
+    points = project(valid_reports.lat, valid_reports.lng)
+    labels = engine.labels(points, valid_reports.weights, eps_meters, min_samples)
+    return cluster_documents(valid_reports, labels, points, now=now)
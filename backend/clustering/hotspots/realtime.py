@@ -0,0 +1,312 @@
+"""
+Near-real-time clustering
+
+IncrementalTrustClustering keeps the reports of the 24 hour window in
+memory and feeds report changes to an IncrementalDBSCAN engine, so each
+sync reclusters only the neighborhoods that changed. Its clusters match a
+batch run over the same window (see batch.run_trust_weighted_dbscan).
+run_incremental_loop publishes them every poll interval.
+"""
+
+import heapq
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from .batch import save_clusters
+from .geo import project
+from .incremental import IncrementalDBSCAN
+from .loader import CLUSTERING_PROJECTION, ReportColumns
+from .pipeline import (
+    MIN_TRUST_WEIGHT_FOR_CLUSTERING, SYNC_OVERLAP, changed_since_query, get_clustering_params, recent_reports_query
+)
+from .summary import cluster_documents
+from .trust import load_trust_table, weights_from_scores
+
+# Clustering fields plus the ones the window filter reads
+SYNC_PROJECTION = {**CLUSTERING_PROJECTION, 'flaggedAsFake': 1, 'isDelayed': 1, 'delayedUntil': 1}
+
+
+def fetch_recent_reports(db, exclude_delayed=True, exclude_fake=True):
+    """
+    Fetch reports from last 24 hours for clustering.
+
+    Args:
+        db: MongoDB database connection
+        exclude_delayed: Whether to exclude reports in the delayed queue
+        exclude_fake: Whether to exclude reports flagged as fake
+
+    Returns:
+        List of report documents (SYNC_PROJECTION fields) with trust weights
+    """
+    query = recent_reports_query(exclude_delayed, exclude_fake)
+
+    # Sorted by _id so batch and incremental runs see reports in the same order
+    reports = list(db['reports'].find(query, SYNC_PROJECTION).sort('_id', 1))
+
+    # Add default trust weights if not present
+    for report in reports:
+        if 'trustWeight' not in report:
+            report['trustWeight'] = 0.5  # Default neutral weight
+        if 'trustScore' not in report:
+            report['trustScore'] = 50  # Default neutral score
+
+    return reports
+
+
+def is_report_in_window(report, now):
+    """
+    Check whether a report belongs in the 24 hour window: not fake and not
+    held for review. Mirrors the filter of fetch_recent_reports.
+    """
+    if report['timestamp'] < now - timedelta(hours=24):
+        return False
+    if report.get('flaggedAsFake') is True:
+        return False
+    if report.get('isDelayed') is True:
+        delayed_until = report.get('delayedUntil')
+        if delayed_until is None or delayed_until >= now:
+            return False
+    return True
+
+
+def is_report_eligible(report, now):
+    """
+    Check whether a report belongs in the clustering window.
+
+    Mirrors the filters of fetch_recent_reports and run_trust_weighted_dbscan
+    so that incremental updates match a full batch run.
+    """
+    return is_report_in_window(report, now) and report.get('trustWeight', 0.5) >= MIN_TRUST_WEIGHT_FOR_CLUSTERING
+
+
+def with_live_trust(reports, table):
+    """
+    Report documents weighted from their devices' current trust scores,
+    as apply_live_trust does for batch runs.
+
+    Returns:
+        One document per report: a copy with the live trustWeight and
+        trustScore, or the report itself if its device has no record
+    """
+    if not reports:
+        return []
+    scores, found = table.lookup([report.get('deviceFingerprint') or '' for report in reports])
+    weights = weights_from_scores(scores)
+    return [
+        dict(report, trustWeight=float(weight), trustScore=float(score)) if is_found else report
+        for report, weight, score, is_found in zip(reports, weights, scores, found)
+    ]
+
+
+class IncrementalTrustClustering:
+    """
+    Near-real-time trust-weighted clustering.
+
+    Keeps the reports of the 24 hour window in memory and feeds inserts,
+    updates and expiries of the eligible ones to an IncrementalDBSCAN
+    engine, so each sync only reclusters the neighborhoods that changed.
+
+    With live trust, each sync weights the changed reports from their
+    devices' current trust scores, and re-weights held reports whose
+    device's score moved since, like a batch run over the same window.
+    Moved scores are found by the `updated_at` stamp of the fingerprint
+    records, so a sync costs the changes, not the window. Reports held out
+    only by their weight are kept so a rising score can bring them back.
+    """
+
+    def __init__(self, eps_meters, min_samples, live_trust=True):
+        self.eps_meters = eps_meters
+        self.min_samples = min_samples
+        self.live_trust = live_trust
+        self.engine = IncrementalDBSCAN(eps_meters, min_samples)
+        self.window = {}        # _id -> report document as stored
+        self.devices = {}       # fingerprint -> _ids of its reports in the window
+        self.reports = {}       # _id -> weighted report document of the eligible reports
+        self.expiry_heap = []   # (timestamp, _id)
+        self.last_sync = None
+
+    @staticmethod
+    def _state(report):
+        """Fields that affect clustering, used to skip unchanged re-reads"""
+        return (
+            report['location']['lat'],
+            report['location']['lng'],
+            report.get('trustWeight', 0.5),
+            report.get('trustScore', 50),
+        )
+
+    def apply(self, report, now, weighted=None):
+        """
+        Insert, move or remove a report based on its current state.
+
+        Args:
+            report: Report document as stored
+            now: Current time
+            weighted: The report with live trust applied (default: report)
+        """
+        key = report['_id']
+        current = self.reports.get(key)
+        weighted = report if weighted is None else weighted
+
+        if is_report_in_window(report, now):
+            if key not in self.window:
+                heapq.heappush(self.expiry_heap, (report['timestamp'], key))
+                self._index(report)
+            self.window[key] = report
+        elif key in self.window:
+            self._unindex(self.window.pop(key))
+
+        if is_report_eligible(weighted, now):
+            if current is not None and self._state(current) == self._state(weighted):
+                return False
+            weighted.setdefault('trustWeight', 0.5)
+            weighted.setdefault('trustScore', 50)
+            self.reports[key] = weighted
+            x, y = project([weighted['location']['lat']], [weighted['location']['lng']])[0]
+            self.engine.insert(key, x, y, weighted['trustWeight'])
+            return True
+
+        if current is not None:
+            del self.reports[key]
+            self.engine.remove(key)
+            return True
+        return False
+
+    def _index(self, report):
+        fingerprint = report.get('deviceFingerprint')
+        if fingerprint:
+            self.devices.setdefault(fingerprint, set()).add(report['_id'])
+
+    def _unindex(self, report):
+        fingerprint = report.get('deviceFingerprint')
+        keys = self.devices.get(fingerprint)
+        if keys is not None:
+            keys.discard(report['_id'])
+            if not keys:
+                del self.devices[fingerprint]
+
+    def expire(self, now):
+        """Drop reports that have left the 24 hour window"""
+        cutoff = now - timedelta(hours=24)
+        expired = 0
+        while self.expiry_heap and self.expiry_heap[0][0] < cutoff:
+            timestamp, key = heapq.heappop(self.expiry_heap)
+            report = self.window.get(key)
+            if report is not None and report['timestamp'] == timestamp:
+                del self.window[key]
+                self._unindex(report)
+                if self.reports.pop(key, None) is not None:
+                    self.engine.remove(key)
+                    expired += 1
+        return expired
+
+    def sync(self, db):
+        """
+        Pull report changes since the last sync and apply them.
+
+        Returns:
+            Number of reports inserted, updated or removed
+        """
+        now = datetime.utcnow()
+
+        if self.last_sync is None:
+            changed = fetch_recent_reports(db, exclude_delayed=True, exclude_fake=True)
+            devices = set()
+        else:
+            since = self.last_sync - SYNC_OVERLAP
+            changed = list(db['reports'].find({
+                'timestamp': {'$gte': now - timedelta(hours=24)},
+                **changed_since_query(since, now)
+            }, SYNC_PROJECTION))
+            devices = self._devices_changed_since(db, since) if self.live_trust else set()
+
+        weighted = changed
+        if self.live_trust:
+            devices |= {report.get('deviceFingerprint') for report in changed} - {None, ''}
+            # Held reports of those devices are re-weighted too: their
+            # scores may have moved without the reports changing
+            keys = {report['_id'] for report in changed}
+            changed = changed + [
+                self.window[key]
+                for fingerprint in devices
+                for key in self.devices.get(fingerprint, ())
+                if key not in keys
+            ]
+            table = load_trust_table(db['fingerprints'], sorted(devices))
+            weighted = with_live_trust(changed, table)
+
+        changes = sum(
+            1 for report, weighted_report in zip(changed, weighted)
+            if self.apply(report, now, weighted_report)
+        )
+        changes += self.expire(now)
+        self.last_sync = now
+        return changes
+
+    def _devices_changed_since(self, db, since):
+        """Fingerprints with reports in the window whose trust record changed since a time"""
+        records = db['fingerprints'].find({'updated_at': {'$gte': since}}, {'_id': 0, 'fingerprint': 1})
+        return {record['fingerprint'] for record in records if record.get('fingerprint') in self.devices}
+
+    def clusters(self):
+        """Build cluster documents for the current window"""
+        keys, labels = self.engine.labels()
+        if len(keys) < 2:
+            print(f"Not enough high-trust reports for clustering (only {len(keys)} valid)")
+            return []
+        return cluster_documents(
+            ReportColumns.from_documents(self.reports[k] for k in keys), labels
+        )
+
+
+def run_incremental_loop(db, settings, poll_interval):
+    """
+    Near-real-time loop: apply report changes as they arrive.
+
+    Args:
+        db: MongoDB database
+        settings: ClusteringSettings (live_trust applies)
+        poll_interval: Seconds between syncs
+    """
+    print(f"⚡ Incremental mode: syncing every {poll_interval}s")
+    if settings.live_trust:
+        # Each sync looks up the trust records changed since the last one
+        db['fingerprints'].create_index('updated_at')
+
+    state = None
+    while True:
+        try:
+            params = get_clustering_params(db)
+
+            if not params['enabled']:
+                state = None
+                time.sleep(poll_interval)
+                continue
+
+            # Parameter changes invalidate every neighbor set: start over
+            if state is None or (state.eps_meters, state.min_samples) != (params['eps_meters'], params['min_samples']):
+                print(f"   Parameters: eps={params['eps_meters']:.0f}m, min_samples={params['min_samples']}")
+                if params['temporal']:
+                    print("   ⚠️  Spatio-temporal mode applies to batch runs; incremental mode clusters spatially")
+                state = IncrementalTrustClustering(params['eps_meters'], params['min_samples'], settings.live_trust)
+
+            changes = state.sync(db)
+            if changes:
+                clusters = state.clusters()
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] "
+                      f"{changes} report changes, {len(state.reports)} in window, "
+                      f"{len(clusters)} clusters")
+                save_clusters(db, clusters)
+
+            time.sleep(poll_interval)
+
+        except KeyboardInterrupt:
+            print("\n\n⚠️  Service stopped by user")
+            break
+        except Exception as e:
+            print(f"\n❌ Error: {e}")
+            traceback.print_exc()
+            print("   Retrying in 60 seconds...")
+            state = None
+            time.sleep(60)
@@ -0,0 +1,288 @@
+"""
+Event-driven clustering scheduler
+
+Replaces the fixed sleep between clustering runs. The scheduler watches
+report changes and reruns clustering when they matter:
+- report inserts, deletes and updates of clustering-relevant fields
+  (status, fake flag, delay) are counted through a MongoDB change
+  stream; on a standalone server (no change streams) it polls the indexed
+  `updatedAt` / `timestamp` fields instead
+- changes are debounced: a run starts once MIN_CHANGES changes have
+  accumulated and no new change arrived for DEBOUNCE_SECONDS (or the burst
+  has lasted MAX_DEBOUNCE_SECONDS)
+- a run also starts when the last one is older than the configured
+  `config.clustering.refreshInterval` (clusters age out of their window
+  even without new reports), and never sooner than MIN_INTERVAL_SECONDS
+  after the previous run
+
+Only the replica holding the leader lock (a lease in `cluster_state`)
+runs clustering; the others stand by and take over when the lease expires.
+"""
+
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+
+from .persist import STATE_COLLECTION
+
+DEFAULT_REFRESH_INTERVAL_MINUTES = 30
+MIN_CHANGES = 5                 # Relevant report changes that justify a run
+DEBOUNCE_SECONDS = 20           # Quiet period that ends a burst of changes
+MAX_DEBOUNCE_SECONDS = 120      # A burst that keeps going runs after this long
+MIN_INTERVAL_SECONDS = 60       # Lower bound between two runs
+TICK_SECONDS = 5                # Change polling and lock renewal cadence
+RETRY_SECONDS = 60              # Wait after a failed run
+LEADER_LEASE = timedelta(seconds=60)
+
+# Report fields whose changes affect clustering. Trust weights are read
+# live from device fingerprints (hotspots.trust), and writing them back
+# must not trigger another run.
+RELEVANT_FIELDS = (
+    'location', 'status', 'flaggedAsFake', 'isDelayed', 'delayedUntil', 'category'
+)
+CHANGE_PIPELINE = [{'$match': {'$or': [
+    {'operationType': {'$in': ['insert', 'delete', 'replace']}},
+    {'operationType': 'update', '$or': [
+        {f'updateDescription.updatedFields.{field}': {'$exists': True}} for field in RELEVANT_FIELDS
+    ]}
+]}}]
+
+
+def ensure_indexes(db):
+    """Index the fields the polling fallback filters on"""
+    db['reports'].create_index('updatedAt')
+    db['reports'].create_index('timestamp')
+
+
+def refresh_interval_seconds(db, default_minutes=DEFAULT_REFRESH_INTERVAL_MINUTES):
+    """`config.clustering.refreshInterval` (minutes) in seconds"""
+    config = db['config'].find_one({}, {'clustering.refreshInterval': 1}) or {}
+    minutes = config.get('clustering', {}).get('refreshInterval') or default_minutes
+    return float(minutes) * 60
+
+
+class ChangeWatcher:
+    """
+    Counts relevant report changes since the previous poll.
+
+    Uses a change stream when the deployment supports one (replica set or
+    sharded cluster) and falls back to polling otherwise.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.stream = None
+        self.since = datetime.utcnow().replace(microsecond=0)
+        self._open_stream()
+
+    @property
+    def mode(self):
+        return 'change stream' if self.stream is not None else 'polling'
+
+    def _open_stream(self):
+        try:
+            self.stream = self.collection.watch(CHANGE_PIPELINE, max_await_time_ms=100)
+        except OperationFailure:
+            # Standalone servers have no oplog to stream from
+            self.stream = None
+
+    def poll(self):
+        """Number of relevant changes since the last call"""
+        if self.stream is not None:
+            try:
+                count = 0
+                while self.stream.try_next() is not None:
+                    count += 1
+                return count
+            except PyMongoError:
+                # Stream lost (e.g. failover beyond the resume window): poll
+                # from the last successful read until it can be reopened
+                self.stream.close()
+                self.stream = None
+                count = self._count_since()
+                self._open_stream()
+                return count
+        return self._count_since()
+
+    def _count_since(self):
+        # MongoDB stores milliseconds: an inclusive bound on the truncated
+        # time can count a write twice but never misses one
+        now = datetime.utcnow()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        count = self.collection.count_documents({'$or': [
+            {'updatedAt': {'$gte': self.since}},
+            {'timestamp': {'$gte': self.since}}
+        ]})
+        self.since = now
+        return count
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+
+
+class Debouncer:
+    """Decides when accumulated changes or staleness warrant a run"""
+
+    def __init__(self, min_changes=MIN_CHANGES, quiet=DEBOUNCE_SECONDS,
+                 max_wait=MAX_DEBOUNCE_SECONDS, min_interval=MIN_INTERVAL_SECONDS):
+        self.min_changes = min_changes
+        self.quiet = quiet
+        self.max_wait = max_wait
+        self.min_interval = min_interval
+        self.pending = 0
+        self.first_change = None
+        self.last_change = None
+        self.last_run = None
+
+    def record(self, changes, now):
+        if changes:
+            self.pending += changes
+            self.first_change = self.first_change or now
+            self.last_change = now
+
+    def due(self, now, max_staleness):
+        """
+        Returns:
+            Reason to run now ('first run', 'changes', 'stale'), or None
+        """
+        if self.last_run is None:
+            return 'first run'
+        since_run = now - self.last_run
+        if since_run < self.min_interval:
+            return None
+        if since_run >= max_staleness:
+            return 'stale'
+        if self.pending >= self.min_changes and (
+            now - self.last_change >= self.quiet or now - self.first_change >= self.max_wait
+        ):
+            return 'changes'
+        return None
+
+    def ran(self, now):
+        self.pending = 0
+        self.first_change = self.last_change = None
+        self.last_run = now
+
+
+class LeaderLock:
+    """
+    Lease-based leader election in `cluster_state`.
+
+    A heartbeat thread takes or renews the lease every third of its
+    duration; `held` says whether this process is the leader.
+    """
+
+    def __init__(self, db, name, lease=LEADER_LEASE):
+        self.collection = db[STATE_COLLECTION]
+        self.lock_id = f"scheduler:{name}"
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self.lease = lease
+        self.held = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def try_acquire(self):
+        now = datetime.utcnow()
+        try:
+            self.collection.find_one_and_update(
+                {'_id': self.lock_id, '$or': [
+                    {'holder': self.holder},
+                    {'expiresAt': {'$lt': now}}
+                ]},
+                {'$set': {'holder': self.holder, 'expiresAt': now + self.lease, 'renewedAt': now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            self.held = True
+        except DuplicateKeyError:
+            # Another replica holds an unexpired lease
+            self.held = False
+        except PyMongoError:
+            # Can't tell; step down rather than risk two leaders
+            self.held = False
+        return self.held
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.lease.total_seconds() / 3):
+            self.try_acquire()
+
+    def start(self):
+        self.try_acquire()
+        self._thread = threading.Thread(target=self._heartbeat, daemon=True)
+        self._thread.start()
+
+    def release(self):
+        self._stop.set()
+        if self.held:
+            self.collection.delete_one({'_id': self.lock_id, 'holder': self.holder})
+            self.held = False
+
+
+class ClusteringScheduler:
+    """
+    Runs `run()` when report changes or staleness call for it, on the
+    leader replica only.
+
+    Args:
+        db: pymongo database
+        name: Service name; replicas of one service share a leader lock
+        run: Callable doing one clustering run
+        default_interval_minutes: Max staleness when the config has no
+            refreshInterval
+    """
+
+    def __init__(self, db, name, run, default_interval_minutes=DEFAULT_REFRESH_INTERVAL_MINUTES, debouncer=None):
+        self.db = db
+        self.name = name
+        self.run = run
+        self.default_interval_minutes = default_interval_minutes
+        self.debouncer = debouncer or Debouncer()
+        self.lock = LeaderLock(db, name)
+
+    def run_forever(self):
+        ensure_indexes(self.db)
+        watcher = ChangeWatcher(self.db['reports'])
+        self.lock.start()
+        print(f"⏱️  Scheduler: watching reports via {watcher.mode}, "
+              f"runs after {self.debouncer.min_changes}+ changes or when stale")
+
+        was_leader = False
+        try:
+            while True:
+                now = time.monotonic()
+                changes = watcher.poll()
+                self.debouncer.record(changes, now)
+
+                if self.lock.held != was_leader:
+                    was_leader = self.lock.held
+                    print("👑 Leader lock acquired" if was_leader else "💤 Standing by (another replica is the leader)")
+                if not self.lock.held:
+                    # Standby replicas run as soon as they take over
+                    self.debouncer.last_run = None
+                    time.sleep(TICK_SECONDS)
+                    continue
+
+                max_staleness = refresh_interval_seconds(self.db, self.default_interval_minutes)
+                reason = self.debouncer.due(now, max_staleness)
+                if reason:
+                    print(f"\n▶️  Clustering run ({reason}: {self.debouncer.pending} report changes pending)")
+                    try:
+                        self.run()
+                        self.debouncer.ran(time.monotonic())
+                    except Exception as e:
+                        print(f"\n❌ Error: {e}")
+                        traceback.print_exc()
+                        print(f"   Retrying in {RETRY_SECONDS} seconds...")
+                        time.sleep(RETRY_SECONDS)
+                        continue
+                time.sleep(TICK_SECONDS)
+        finally:
+            watcher.close()
+            self.lock.release()
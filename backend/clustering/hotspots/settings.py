@@ -0,0 +1,84 @@
+"""
+Clustering service settings
+
+The knobs of the batch, incremental and backfill runs, read from the
+environment by the clustering services (from_env) and passed explicitly
+to the functions and worker processes that need them, so nothing depends
+on module globals of the script that started the run.
+"""
+
+import os
+
+from .microcluster import DEFAULT_CELL_FRACTION
+from .windows import DEFAULT_WINDOWS, parse_windows
+
+
+def _flag(environ, name, default):
+    return environ.get(name, default).lower() in ('1', 'true', 'yes')
+
+
+class ClusteringSettings:
+    """
+    Attributes:
+        windows: Window labels published by batch runs, narrowest first;
+            the widest is fetched once and the others are cut from it
+        by_category: Batch runs also cluster each report category on its
+            own (all-category clusters are kept)
+        workers: Worker processes for batch clustering; above 1 the
+            country is split into tiles clustered in parallel (same
+            labels as a single process)
+        engine: DBSCAN engine (see engines); 'auto' picks micro, chunked,
+            partitioned or grid from the settings below
+        memory_budget_mb: Working-memory cap for neighbor pairs; streams
+            pairs in blocks in a single process, taking precedence over
+            workers. 0 disables it
+        microcluster_min_reports: Windows with at least this many valid
+            reports are summarized into micro-clusters before DBSCAN
+            (approximate). 0 disables it
+        microcluster_cell_fraction: Micro-cluster cell size relative to eps
+        snapshot_dir: Batch runs save their working set here and a
+            restarted service fetches only the reports changed since.
+            Empty disables snapshots
+        live_trust: Weight reports from their devices' current trust score
+            rather than the score at submission
+        trust_writeback: Also store changed live weights on the reports
+        quiet: Skip clustering progress output (backfill workers, whose
+            progress the parent reports)
+    """
+
+    def __init__(self, windows=DEFAULT_WINDOWS, by_category=True, workers=1, engine='auto',
+                 memory_budget_mb=0, microcluster_min_reports=0, microcluster_cell_fraction=DEFAULT_CELL_FRACTION,
+                 snapshot_dir='snapshot', live_trust=True, trust_writeback=False, quiet=False):
+        self.windows = list(windows)
+        self.by_category = by_category
+        self.workers = workers
+        self.engine = engine
+        self.memory_budget_mb = memory_budget_mb
+        self.microcluster_min_reports = microcluster_min_reports
+        self.microcluster_cell_fraction = microcluster_cell_fraction
+        self.snapshot_dir = snapshot_dir
+        self.live_trust = live_trust
+        self.trust_writeback = trust_writeback
+        self.quiet = quiet
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        """Settings from the CLUSTERING_* and MICROCLUSTER_* variables"""
+        return cls(
+            windows=parse_windows(environ.get('CLUSTERING_WINDOWS', ','.join(DEFAULT_WINDOWS))),
+            by_category=_flag(environ, 'CLUSTERING_BY_CATEGORY', 'true'),
+            workers=int(environ.get('CLUSTERING_WORKERS', '1')),
+            engine=environ.get('CLUSTERING_ENGINE', 'auto'),
+            memory_budget_mb=float(environ.get('CLUSTERING_MEMORY_BUDGET_MB', '0')),
+            microcluster_min_reports=int(environ.get('MICROCLUSTER_MIN_REPORTS', '0')),
+            microcluster_cell_fraction=float(environ.get('MICROCLUSTER_CELL_FRACTION', str(DEFAULT_CELL_FRACTION))),
+            snapshot_dir=environ.get('CLUSTERING_SNAPSHOT_DIR', 'snapshot'),
+            live_trust=_flag(environ, 'CLUSTERING_LIVE_TRUST', 'true'),
+            trust_writeback=_flag(environ, 'CLUSTERING_TRUST_WRITEBACK', 'false')
+        )
+
+    def copy(self, **changes):
+        """A copy with some settings changed"""
+        settings = ClusteringSettings(**vars(self))
+        vars(settings).update(changes)
+        return settings
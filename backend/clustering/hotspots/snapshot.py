@@ -0,0 +1,207 @@
+"""
+On-disk snapshot of the clustering working set
+
+After every run the service writes the reports it clustered (id, location,
+trust, timestamp, category and device columns), their projected
+coordinates and the all-category labels to a snapshot directory as plain
+`.npy` files.
+On restart the files are memory-mapped, so loading costs no parsing and no
+copy, and only reports changed since the snapshot are pulled from MongoDB
+and merged in (warm_start, apply_changes).
+
+Each snapshot is written to its own directory and published by atomically
+replacing the CURRENT pointer file, so a crash mid-write leaves the
+previous snapshot readable.
+"""
+
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import numpy as np
+
+from .geo import project
+from .loader import ReportColumns, load_report_columns
+from .pipeline import SYNC_OVERLAP, changed_since_query, recent_reports_query
+from .windows import parse_window
+
+SNAPSHOT_VERSION = 3
+CURRENT_FILE = 'CURRENT'
+COLUMN_FIELDS = ('ids', 'lat', 'lng', 'weights', 'trust_scores', 'timestamps', 'categories', 'fingerprints')
+
+
+class Snapshot:
+    """
+    A loaded snapshot; arrays are read-only memory maps.
+
+    Attributes:
+        reports: ReportColumns, sorted by _id
+        points: (n, 2) projected coordinates of the reports
+        labels: All-category label per report in the widest window (-1
+            for noise and for reports that were not clustered)
+        meta: Run metadata (createdAt, window, eps_meters, min_samples)
+    """
+
+    def __init__(self, reports, points, labels, meta):
+        self.reports = reports
+        self.points = points
+        self.labels = labels
+        self.meta = meta
+
+    @property
+    def created_at(self):
+        return datetime.fromisoformat(self.meta['createdAt'])
+
+
+def save_snapshot(directory, reports, points, labels, meta):
+    """
+    Write a snapshot and make it the current one.
+
+    Args:
+        directory: Snapshot directory (created if missing)
+        reports: ReportColumns with timestamps and categories
+        points: Projected coordinates of the reports
+        labels: Label per report
+        meta: JSON-serializable run metadata; must hold createdAt as an
+            ISO timestamp (the time the reports were fetched)
+
+    Returns:
+        Path of the new snapshot
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = f"snapshot-{time.time_ns()}"
+    staging = os.path.join(directory, name + '.tmp')
+    os.makedirs(staging)
+
+    for field in COLUMN_FIELDS:
+        np.save(os.path.join(staging, field + '.npy'), getattr(reports, field))
+    np.save(os.path.join(staging, 'points.npy'), np.asarray(points, dtype=np.float64))
+    np.save(os.path.join(staging, 'labels.npy'), np.asarray(labels, dtype=np.int64))
+    with open(os.path.join(staging, 'meta.json'), 'w') as f:
+        json.dump(dict(
+            meta, version=SNAPSHOT_VERSION, categoryNames=reports.category_names,
+            fingerprintNames=reports.fingerprint_names, count=len(reports)
+        ), f)
+
+    target = os.path.join(directory, name)
+    os.rename(staging, target)
+    pointer = os.path.join(directory, CURRENT_FILE + '.tmp')
+    with open(pointer, 'w') as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer, os.path.join(directory, CURRENT_FILE))
+
+    # Older snapshots (and leftovers of interrupted writes); readers that
+    # still map them keep their open files
+    for entry in os.listdir(directory):
+        if entry.startswith('snapshot-') and entry != name:
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+    return target
+
+
+def load_snapshot(directory):
+    """
+    Map the current snapshot.
+
+    Returns:
+        Snapshot, or None if there is none or it is unreadable or from
+        another snapshot version
+    """
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            path = os.path.join(directory, f.read().strip())
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != SNAPSHOT_VERSION:
+            return None
+        arrays = {
+            field: np.load(os.path.join(path, field + '.npy'), mmap_mode='r')
+            for field in COLUMN_FIELDS + ('points', 'labels')
+        }
+    except (OSError, ValueError, KeyError):
+        return None
+
+    if any(len(array) != meta['count'] for array in arrays.values()):
+        return None
+    reports = ReportColumns(
+        **{field: arrays[field] for field in COLUMN_FIELDS},
+        category_names=meta['categoryNames'],
+        fingerprint_names=meta['fingerprintNames']
+    )
+    return Snapshot(reports, arrays['points'], arrays['labels'], meta)
+
+
+def _id_keys(ids):
+    """One comparable 12-byte key per ObjectId row"""
+    return np.ascontiguousarray(ids).view('S12').ravel()
+
+
+def apply_changes(reports, points, removed_ids, added, added_points, cutoff):
+    """
+    Bring snapshot reports up to date.
+
+    Args:
+        reports, points: Snapshot reports and their projected coordinates
+        removed_ids: (k, 12) uint8 ids of every report changed since the
+            snapshot (whether or not it is still eligible)
+        added: ReportColumns of the changed reports that are eligible now
+        added_points: Projected coordinates of `added`
+        cutoff: Start of the window; older reports are dropped
+
+    Returns:
+        (ReportColumns sorted by _id, their projected coordinates)
+    """
+    keep = reports.timestamps >= np.datetime64(cutoff, 'ms')
+    if len(removed_ids):
+        keep &= ~np.isin(_id_keys(reports.ids), _id_keys(removed_ids))
+
+    merged = ReportColumns.concat(reports.select(keep), added)
+    merged_points = np.concatenate((points[keep], np.asarray(added_points, dtype=np.float64).reshape(-1, 2)))
+    order = np.lexsort(merged.ids.T[::-1])
+    return merged.select(order), merged_points[order]
+
+
+def warm_start(db, now, window, directory):
+    """
+    Rebuild the working set from the snapshot plus report changes.
+
+    Only reports created or changed since the snapshot are read from
+    MongoDB (their _id, then the clustering fields of the eligible ones).
+
+    Args:
+        db: MongoDB database
+        now: End of the window
+        window: Window label the working set must cover
+        directory: Snapshot directory
+
+    Returns:
+        (ReportColumns, projected points) of the window, or None when there
+        is no usable snapshot (then a full fetch is needed)
+    """
+    snapshot = load_snapshot(directory)
+    if snapshot is None:
+        return None
+    cutoff = now - parse_window(window)
+    if parse_window(snapshot.meta['window']) < parse_window(window) or snapshot.created_at < cutoff:
+        print("ℹ️  Snapshot does not cover the current window, fetching everything")
+        return None
+
+    since = snapshot.created_at - SYNC_OVERLAP
+    changed = {'timestamp': {'$gte': cutoff}, **changed_since_query(since, now)}
+    changed_ids = [report['_id'].binary for report in db['reports'].find(changed, {'_id': 1})]
+    removed_ids = np.frombuffer(b''.join(changed_ids), dtype=np.uint8).reshape(-1, 12)
+    added = load_report_columns(db['reports'], {
+        '$and': [recent_reports_query(True, True, window, now), changed_since_query(since, now)]
+    })
+
+    reports, points = apply_changes(
+        snapshot.reports, snapshot.points, removed_ids,
+        added, project(added.lat, added.lng), cutoff
+    )
+    print(f"♻️  Restored {len(snapshot.reports)} reports from snapshot of "
+          f"{snapshot.created_at.strftime('%Y-%m-%d %H:%M:%S')}; "
+          f"{len(changed_ids)} changed since, {len(reports)} in window")
+    return reports, points
@@ -0,0 +1,159 @@
+"""
+Spatio-temporal weighted DBSCAN (ST-DBSCAN)
+
+Two reports are neighbors when they are within eps meters of each other
+and within eps_time seconds of each other, so a burst of reports in one
+place within the last hour forms a hotspot while the same number of
+reports scattered over the day does not. Report weights are decayed by age
+(halved every half-life), so recent reports also weigh more in core point
+detection.
+
+Neighbor search combines the eps-sized spatial hash grid with a time sort:
+points are ordered by (cell, time), so the candidates of a point in a
+neighboring cell are one contiguous time range found by binary search,
+rather than every point of that cell.
+"""
+
+import numpy as np
+
+from .geo import labels_from_edges
+from .grid import HALF_NEIGHBORHOOD, WEIGHT_TOLERANCE, _ragged_arange, grid_cells
+
+MODE_SPATIAL = 'spatial'
+MODE_SPATIOTEMPORAL = 'spatiotemporal'
+
+DEFAULT_TEMPORAL_EPS_MINUTES = 60
+DEFAULT_DECAY_HALF_LIFE_HOURS = 6
+
+
+def temporal_params_from_config(clustering_config):
+    """
+    Read the spatio-temporal settings from a `config.clustering` document.
+
+    Returns:
+        None in the default spatial mode, else a dict with eps_seconds and
+        half_life_seconds (None disables decay)
+    """
+    clustering_config = clustering_config or {}
+    if clustering_config.get('mode', MODE_SPATIAL) != MODE_SPATIOTEMPORAL:
+        return None
+    half_life_hours = clustering_config.get('decayHalfLifeHours', DEFAULT_DECAY_HALF_LIFE_HOURS)
+    return {
+        'eps_seconds': float(clustering_config.get('temporalEpsMinutes', DEFAULT_TEMPORAL_EPS_MINUTES)) * 60,
+        'half_life_seconds': float(half_life_hours) * 3600 if half_life_hours else None
+    }
+
+
+def decayed_weights(weights, ages, half_life):
+    """
+    Weights halved for every half_life of age.
+
+    Args:
+        weights: Trust weight per report
+        ages: Report age in seconds (clipped at 0)
+        half_life: Half-life in seconds; None or 0 leaves weights unchanged
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    if not half_life:
+        return weights.copy()
+    ages = np.maximum(np.asarray(ages, dtype=np.float64), 0.0)
+    return weights * np.exp2(-ages / half_life)
+
+
+def st_neighbor_pair_blocks(points, times, eps, eps_time):
+    """
+    Yield the pairs of points within eps meters and eps_time seconds.
+
+    Args:
+        points: (n, 2) projected coordinates in meters
+        times: Report time per point, in seconds (any origin)
+        eps: Spatial radius in meters
+        eps_time: Temporal radius in seconds
+
+    Yields:
+        (rows, cols) int64 arrays of point indices. Over all blocks every
+        pair appears in both directions and every point is paired with
+        itself once.
+    """
+    n = len(points)
+    if n == 0:
+        return
+
+    # Integer milliseconds keep the time-range searches exact
+    millis = np.round((np.asarray(times, dtype=np.float64) - np.min(times)) * 1000).astype(np.int64)
+    eps_millis = int(round(eps_time * 1000))
+
+    keys, stride = grid_cells(points, eps)
+    order = np.lexsort((millis, keys))
+    cell_keys, cell_starts, cell_counts = np.unique(
+        keys[order], return_index=True, return_counts=True
+    )
+    cell_rank = np.repeat(np.arange(len(cell_keys)), cell_counts)
+    xs = points[order, 0]
+    ys = points[order, 1]
+    t = millis[order]
+
+    # (cell rank, time) as one sorted int64 so a time range within any
+    # cell is a single searchsorted
+    span = int(t.max()) + 2 * eps_millis + 1
+    composite = cell_rank * span + t
+
+    eps_sq = eps * eps
+    for dx, dy in HALF_NEIGHBORHOOD:
+        target = cell_keys + dx * stride + dy
+        pos = np.searchsorted(cell_keys, target)
+        pos[pos == len(cell_keys)] = 0
+        hit = cell_keys[pos] == target
+        i = np.flatnonzero(hit[cell_rank])
+        if len(i) == 0:
+            continue
+
+        base = pos[cell_rank[i]] * span + t[i]
+        lo = np.searchsorted(composite, base - eps_millis, side='left')
+        hi = np.searchsorted(composite, base + eps_millis, side='right')
+        counts = hi - lo
+        i = np.repeat(i, counts)
+        j = _ragged_arange(counts) + np.repeat(lo, counts)
+
+        close = (xs[i] - xs[j]) ** 2 + (ys[i] - ys[j]) ** 2 <= eps_sq
+        i, j = order[i[close]], order[j[close]]
+        if (dx, dy) == (0, 0):
+            yield i, j
+        else:
+            yield np.concatenate((i, j)), np.concatenate((j, i))
+
+
+def st_neighbor_pairs(points, times, eps, eps_time):
+    """All spatio-temporal neighbor pairs, self pairs included (see st_neighbor_pair_blocks)"""
+    blocks = list(st_neighbor_pair_blocks(points, times, eps, eps_time))
+    if not blocks:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    rows, cols = zip(*blocks)
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+def st_dbscan(points, times, weights, eps, eps_time, min_weight):
+    """
+    DBSCAN over space and time with weighted core point selection.
+
+    Args:
+        points: (n, 2) projected coordinates in meters
+        times: Report time per point, in seconds
+        weights: Weight per point (typically decayed_weights of the trust weights)
+        eps: Spatial radius in meters
+        eps_time: Temporal radius in seconds
+        min_weight: Summed neighborhood weight needed for a core point
+
+    Returns:
+        Label per point, -1 for noise, clusters numbered by their
+        lowest-indexed core point as in grid.weighted_dbscan
+    """
+    points = np.asarray(points, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    n = len(points)
+
+    rows, cols = st_neighbor_pairs(points, times, eps, eps_time)
+    neighbor_weight = np.bincount(rows, weights=weights[cols], minlength=n)
+    core = neighbor_weight >= min_weight - WEIGHT_TOLERANCE
+    return labels_from_edges(rows, cols, core)
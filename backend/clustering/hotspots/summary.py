@@ -0,0 +1,165 @@
+"""
+Vectorized cluster summarization
+
+Reports are sorted by label once; every per-cluster metric is then a
+grouped reduction over contiguous slices (np.add.reduceat and friends)
+instead of a boolean mask and a Python loop over all reports per label.
+
+cluster_documents turns the summaries into the cluster schema shared by
+the services, the API and the backfill, so risk levels and trust
+confidence are graded the same way wherever clusters are produced.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+from .geo import project
+
+# Risk by weighted report count (summed trust weights, so fake and
+# low-trust reports don't inflate it): above the threshold of a level
+RISK_THRESHOLDS = (('critical', 8), ('high', 4))
+DEFAULT_RISK_LEVEL = 'medium'
+
+# Trust confidence by average trust score: at least the threshold of a level
+TRUST_CONFIDENCE_THRESHOLDS = (('high', 70), ('medium', 40))
+DEFAULT_TRUST_CONFIDENCE = 'low'
+
+MIN_RADIUS_METERS = 100
+
+
+def summarize_clusters(labels, lat, lng, points=None, weights=None, trust_scores=None):
+    """
+    Summarize every cluster of a DBSCAN labelling in one pass.
+
+    Args:
+        labels: Cluster label per report (-1 for noise)
+        lat, lng: Report coordinates in degrees
+        points: Projected coordinates (meters), computed if not given
+        weights: Trust weight per report; centers are weighted by it.
+            Unit weights (plain means) if not given.
+        trust_scores: Trust score per report, averaged per cluster if given
+
+    Returns:
+        List of cluster summaries in label order, each with:
+        - label, center {lat, lng}, radius (meters)
+        - reportCount, weightedReportCount
+        - averageTrustScore (only if trust_scores were given)
+        - members: indices of the cluster's reports, ascending
+    """
+    labels = np.asarray(labels)
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    if points is None:
+        points = project(lat, lng)
+
+    clustered = np.flatnonzero(labels >= 0)
+    if len(clustered) == 0:
+        return []
+
+    # Group reports by label; the stable sort keeps members in report order
+    order = clustered[np.argsort(labels[clustered], kind='stable')]
+    sorted_labels = labels[order]
+    starts = np.flatnonzero(np.r_[True, sorted_labels[1:] != sorted_labels[:-1]])
+    counts = np.diff(np.r_[starts, len(order)])
+    group = np.repeat(np.arange(len(starts)), counts)
+
+    w = np.ones(len(order)) if weights is None else np.asarray(weights, dtype=np.float64)[order]
+    weight_sum = np.add.reduceat(w, starts)
+    safe_sum = np.where(weight_sum > 0, weight_sum, 1.0)
+
+    # Weighted centers, falling back to plain means for zero total weight
+    center_lat = np.where(
+        weight_sum > 0,
+        np.add.reduceat(lat[order] * w, starts) / safe_sum,
+        np.add.reduceat(lat[order], starts) / counts
+    )
+    center_lng = np.where(
+        weight_sum > 0,
+        np.add.reduceat(lng[order] * w, starts) / safe_sum,
+        np.add.reduceat(lng[order], starts) / counts
+    )
+
+    # Radius: farthest member from the center, in projected meters
+    centers = project(center_lat, center_lng)
+    offsets = points[order] - centers[group]
+    radius = np.sqrt(np.maximum.reduceat(np.einsum('ij,ij->i', offsets, offsets), starts))
+
+    if trust_scores is not None:
+        average_trust = np.add.reduceat(np.asarray(trust_scores, dtype=np.float64)[order], starts) / counts
+
+    members = np.split(order, starts[1:])
+    summaries = []
+    for c in range(len(starts)):
+        summary = {
+            'label': int(sorted_labels[starts[c]]),
+            'center': {'lat': float(center_lat[c]), 'lng': float(center_lng[c])},
+            'radius': float(radius[c]),
+            'reportCount': int(counts[c]),
+            'weightedReportCount': float(weight_sum[c]),
+            'members': members[c]
+        }
+        if trust_scores is not None:
+            summary['averageTrustScore'] = float(average_trust[c])
+        summaries.append(summary)
+    return summaries
+
+
+def risk_level(weighted_report_count):
+    """Risk level of a cluster from its weighted report count"""
+    for level, threshold in RISK_THRESHOLDS:
+        if weighted_report_count > threshold:
+            return level
+    return DEFAULT_RISK_LEVEL
+
+
+def trust_confidence(average_trust_score):
+    """Trust confidence of a cluster from its average trust score"""
+    for level, threshold in TRUST_CONFIDENCE_THRESHOLDS:
+        if average_trust_score >= threshold:
+            return level
+    return DEFAULT_TRUST_CONFIDENCE
+
+
+def cluster_documents(reports, labels, points=None, now=None):
+    """
+    Cluster documents from DBSCAN labels.
+
+    Args:
+        reports: ReportColumns of the clustered reports
+        labels: Label per report (-1 for noise)
+        points: Projected coordinates of the reports, computed if not given
+        now: Cluster timestamp (default: current time)
+
+    Returns:
+        List of clusters in label order, each with cluster_id, center,
+        radius (at least MIN_RADIUS_METERS), points (report ids),
+        riskLevel, reportCount, weightedReportCount, averageTrustScore,
+        trustConfidence and timestamp. Callers add 'window' and
+        'category' where they apply.
+    """
+    # Weighted centers (higher trust reports have more influence), radii
+    # and counts for all clusters in one grouped pass
+    summaries = summarize_clusters(
+        labels, reports.lat, reports.lng, points=points,
+        weights=reports.weights, trust_scores=reports.trust_scores
+    )
+    now = now or datetime.utcnow()
+
+    clusters = []
+    for summary in summaries:
+        weighted_report_count = summary['weightedReportCount']
+        average_trust_score = summary['averageTrustScore']
+        clusters.append({
+            'cluster_id': summary['label'],
+            'center': summary['center'],
+            'radius': max(summary['radius'], MIN_RADIUS_METERS),
+            'points': reports.id_strings(summary['members']),
+            'riskLevel': risk_level(weighted_report_count),
+            'reportCount': summary['reportCount'],
+            'weightedReportCount': round(weighted_report_count, 2),
+            'averageTrustScore': round(average_trust_score, 1),
+            'trustConfidence': trust_confidence(average_trust_score),
+            'timestamp': now
+        })
+    return clusters
@@ -0,0 +1,105 @@
+"""
+Parameter sweeps over one neighbor graph
+
+Tuning eps and min_samples used to mean a full DBSCAN run per trial. The
+neighbor pairs within the largest eps contain the pairs for every smaller
+eps, so they are computed once and sorted by distance; each eps is then a
+prefix of that list, and each (eps, min_samples) pair only costs a weight
+sum and a connected-components relabeling.
+
+sweep_window runs a sweep over the current clustering window for the
+services; the API loads the window itself and calls sweep_parameters in a
+worker process.
+"""
+
+import numpy as np
+
+from .geo import labels_from_edges, project
+from .grid import WEIGHT_TOLERANCE, grid_neighbor_pairs
+from .pipeline import MIN_TRUST_WEIGHT_FOR_CLUSTERING, fetch_recent_report_columns
+from .trust import refresh_trust
+
+
+def sweep_parameters(points, eps_values, min_samples_values, weights=None):
+    """
+    Cluster statistics for every (eps, min_samples) combination.
+
+    Args:
+        points: (n, 2) projected coordinates in meters
+        eps_values: Neighborhood radii in meters
+        min_samples_values: Core point thresholds (summed trust weight)
+        weights: Trust weight per point; unit weights if not given, which
+            gives plain DBSCAN
+
+    Returns:
+        One dict per combination, ordered by eps then min_samples, with
+        clusters, noise ratio, clustered reports, largest cluster and
+        weighted report count statistics. Labels match
+        weighted_dbscan(points, weights, eps, min_samples).
+    """
+    points = np.asarray(points, dtype=np.float64)
+    n = len(points)
+    weights = np.ones(n) if weights is None else np.asarray(weights, dtype=np.float64)
+    eps_values = sorted(float(eps) for eps in eps_values)
+    min_samples_values = sorted(min_samples_values)
+    if n == 0 or not eps_values:
+        return []
+
+    # One neighbor computation at the largest radius, pairs by distance
+    rows, cols = grid_neighbor_pairs(points, eps_values[-1])
+    offsets = points[rows] - points[cols]
+    distances = np.sqrt(np.einsum('ij,ij->i', offsets, offsets))
+    order = np.argsort(distances, kind='stable')
+    rows, cols, distances = rows[order], cols[order], distances[order]
+
+    results = []
+    for eps in eps_values:
+        end = np.searchsorted(distances, eps, side='right')
+        eps_rows, eps_cols = rows[:end], cols[:end]
+        neighbor_weight = np.bincount(eps_rows, weights=weights[eps_cols], minlength=n)
+        for min_samples in min_samples_values:
+            core = neighbor_weight >= min_samples - WEIGHT_TOLERANCE
+            labels = labels_from_edges(eps_rows, eps_cols, core)
+            results.append(dict(
+                eps_meters=eps, min_samples=min_samples,
+                **cluster_statistics(labels, weights)
+            ))
+    return results
+
+
+def cluster_statistics(labels, weights):
+    """Summary numbers of one labelling, for comparing parameter choices"""
+    clustered = labels >= 0
+    sizes = np.bincount(labels[clustered])
+    weighted = np.bincount(labels[clustered], weights=weights[clustered])
+    has_clusters = len(sizes) > 0
+    return {
+        'clusters': int(len(sizes)),
+        'noiseRatio': float(1.0 - clustered.mean()) if len(labels) else 0.0,
+        'clusteredReports': int(clustered.sum()),
+        'largestCluster': int(sizes.max()) if has_clusters else 0,
+        'weightedCount': {
+            'min': round(float(weighted.min()), 2) if has_clusters else 0.0,
+            'median': round(float(np.median(weighted)), 2) if has_clusters else 0.0,
+            'mean': round(float(weighted.mean()), 2) if has_clusters else 0.0,
+            'max': round(float(weighted.max()), 2) if has_clusters else 0.0
+        }
+    }
+
+
+def sweep_window(db, eps_values, min_samples_values, live_trust=True):
+    """
+    Sweep the current 24 hour window (pymongo), weighted as batch runs are.
+
+    Returns:
+        (number of valid reports, sweep_parameters results)
+    """
+    reports = fetch_recent_report_columns(db, exclude_delayed=True, exclude_fake=True)
+    if live_trust:
+        reports = refresh_trust(db, reports)
+    valid_reports = reports.select(reports.weights >= MIN_TRUST_WEIGHT_FOR_CLUSTERING)
+    results = sweep_parameters(
+        project(valid_reports.lat, valid_reports.lng),
+        eps_values, min_samples_values, valid_reports.weights
+    )
+    return len(valid_reports), results
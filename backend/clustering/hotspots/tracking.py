@@ -0,0 +1,170 @@
+"""
+Stable hotspot identity across clustering runs
+
+DBSCAN numbers clusters from 0 on every run, so labels say nothing about
+which hotspot is which. Each new cluster is linked to a cluster of the
+previous run when they share reports (Jaccard overlap of member ids) or,
+failing that, when their centers are close; linked clusters keep the
+previous `hotspotId`. Pairs are assigned greedily, best overlap first.
+
+Only clusters whose content changed need to be written again; unchanged
+clusters keep their stored document, including its trend metadata.
+"""
+
+import math
+from datetime import datetime
+
+import numpy as np
+from bson import ObjectId
+from sklearn.neighbors import KDTree
+
+from .geo import project
+
+MIN_OVERLAP = 0.2           # Jaccard overlap that links two clusters
+MATCH_DISTANCE_M = 300.0    # Center distance that links clusters without shared reports
+TREND_THRESHOLD = 0.1       # Relative change in report count for growing/declining
+
+# Fields that describe a cluster's history rather than its content
+TRACKING_FIELDS = (
+    'hotspotId', 'firstSeen', 'trend', 'previousReportCount', 'reportCountChange'
+)
+# Fields that differ per stored version or per run
+VERSION_FIELDS = ('_id', 'cluster_id', 'timestamp', 'sinceGeneration', 'retiredGeneration')
+
+
+def _content(cluster):
+    content = {
+        key: value for key, value in cluster.items()
+        if key not in TRACKING_FIELDS and key not in VERSION_FIELDS
+    }
+    content['points'] = sorted(content.get('points', []))
+    return content
+
+
+def _same_value(a, b):
+    if isinstance(a, float) or isinstance(b, float):
+        return isinstance(a, (int, float)) and isinstance(b, (int, float)) and math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same_value(a[k], b[k]) for k in a)
+    return a == b
+
+
+def has_changed(previous, cluster):
+    """True if a cluster's content differs from its stored version"""
+    return not _same_value(_content(previous), _content(cluster))
+
+
+def match_clusters(previous, current):
+    """
+    Link clusters of the current run to clusters of the previous run.
+
+    Args:
+        previous: Stored cluster documents (with `points` and `center`)
+        current: Cluster documents of the new run
+
+    Returns:
+        Dict of current index -> previous index for linked clusters
+    """
+    if not previous or not current:
+        return {}
+
+    # Shared reports, counted through an inverted index of report ids
+    owner = {}
+    for p, cluster in enumerate(previous):
+        for report_id in cluster.get('points', []):
+            owner[report_id] = p
+    candidates = {}
+    for c, cluster in enumerate(current):
+        shared = {}
+        for report_id in cluster.get('points', []):
+            p = owner.get(report_id)
+            if p is not None:
+                shared[p] = shared.get(p, 0) + 1
+        for p, count in shared.items():
+            union = len(cluster['points']) + len(previous[p]['points']) - count
+            jaccard = count / union
+            if jaccard >= MIN_OVERLAP:
+                candidates[(c, p)] = jaccard
+
+    # Center proximity, for hotspots whose reports were all replaced
+    prev_centers = project([cl['center']['lat'] for cl in previous], [cl['center']['lng'] for cl in previous])
+    curr_centers = project([cl['center']['lat'] for cl in current], [cl['center']['lng'] for cl in current])
+    near, dist = KDTree(prev_centers).query_radius(curr_centers, r=MATCH_DISTANCE_M, return_distance=True)
+
+    scored = []
+    for c in range(len(current)):
+        for p, d in zip(near[c], dist[c]):
+            scored.append((-candidates.pop((c, int(p)), 0.0), d, c, int(p)))
+    # Overlapping pairs too far apart for the proximity query
+    for (c, p), jaccard in candidates.items():
+        scored.append((-jaccard, float(np.hypot(*(curr_centers[c] - prev_centers[p]))), c, p))
+
+    scored.sort()
+    matches, taken = {}, set()
+    for _, _, c, p in scored:
+        if c not in matches and p not in taken:
+            matches[c] = p
+            taken.add(p)
+    return matches
+
+
+def _trend(previous_count, count):
+    if count > previous_count * (1 + TREND_THRESHOLD):
+        return 'growing'
+    if count < previous_count * (1 - TREND_THRESHOLD):
+        return 'declining'
+    return 'stable'
+
+
+def diff_clusters(previous, current, now=None):
+    """
+    Work out the writes that turn the previous run into the current one.
+
+    Args:
+        previous: Stored cluster documents of the active generation
+        current: Cluster documents of the new run
+
+    Returns:
+        (inserts, retired, unchanged):
+        - inserts: new or changed clusters, with tracking metadata
+        - retired: `_id`s of stored documents that are replaced or gone
+        - unchanged: number of clusters that need no write
+    """
+    now = now or datetime.utcnow()
+    matches = match_clusters(previous, current)
+    matched_previous = set(matches.values())
+
+    inserts, retired, unchanged = [], [], 0
+    for c, cluster in enumerate(current):
+        cluster = {key: value for key, value in cluster.items() if key != 'cluster_id'}
+        p = matches.get(c)
+        if p is None:
+            cluster.update({
+                'hotspotId': str(ObjectId()),
+                'firstSeen': now,
+                'trend': 'new',
+                'previousReportCount': 0,
+                'reportCountChange': cluster.get('reportCount', 0)
+            })
+            inserts.append(cluster)
+            continue
+
+        old = previous[p]
+        if not has_changed(old, cluster):
+            unchanged += 1
+            continue
+
+        previous_count = old.get('reportCount', len(old.get('points', [])))
+        count = cluster.get('reportCount', len(cluster.get('points', [])))
+        cluster.update({
+            'hotspotId': old['hotspotId'],
+            'firstSeen': old.get('firstSeen', now),
+            'trend': _trend(previous_count, count),
+            'previousReportCount': previous_count,
+            'reportCountChange': count - previous_count
+        })
+        inserts.append(cluster)
+        retired.append(old['_id'])
+
+    retired.extend(cluster['_id'] for p, cluster in enumerate(previous) if p not in matched_previous)
+    return inserts, retired, unchanged
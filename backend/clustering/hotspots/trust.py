@@ -0,0 +1,162 @@
+"""
+Live trust weights at clustering time
+
+A report's trustWeight is fixed when it is submitted, but its device's
+trust score keeps moving: once police mark some of a device's reports as
+fake, its other reports should lose influence too. Before clustering, the
+current trust_score of every distinct device fingerprint in the window is
+fetched with one `$in` query (batched for very large windows) and mapped
+to weights for all reports at once, with the rules of
+trust_scoring.calculate_report_weight in the API.
+
+Reports without a fingerprint, or whose device has no record, keep their
+stored weight.
+"""
+
+import numpy as np
+from pymongo import UpdateMany
+
+# Mirrors api/app/trust_scoring.py
+MAX_TRUST_SCORE = 100
+LOW_TRUST_THRESHOLD = 40
+LOW_TRUST_WEIGHT = 0.1  # Weight of reports from low-trust devices
+
+FINGERPRINT_BATCH_SIZE = 50_000  # Fingerprints per `$in` query
+FINGERPRINT_PROJECTION = {'_id': 0, 'fingerprint': 1, 'trust_score': 1}
+
+
+def weights_from_scores(trust_scores):
+    """Clustering weight per trust score, as calculate_report_weight"""
+    trust_scores = np.asarray(trust_scores, dtype=np.float64)
+    return np.where(trust_scores < LOW_TRUST_THRESHOLD, LOW_TRUST_WEIGHT, trust_scores / MAX_TRUST_SCORE)
+
+
+def distinct_fingerprints(reports):
+    """Sorted distinct device fingerprints of ReportColumns"""
+    if reports.fingerprints is None:
+        return []
+    codes = np.unique(reports.fingerprints)
+    return sorted(reports.fingerprint_names[code] for code in codes[codes >= 0])
+
+
+class TrustTable:
+    """Current trust score per fingerprint (the full string, as stored)"""
+
+    def __init__(self, fingerprints, trust_scores):
+        self.trust_scores = dict(zip(fingerprints, (float(score) for score in trust_scores)))
+
+    def __len__(self):
+        return len(self.trust_scores)
+
+    @classmethod
+    def from_records(cls, records):
+        """Build from `fingerprints` documents"""
+        fingerprints, scores = [], []
+        for record in records:
+            if record.get('trust_score') is not None:
+                fingerprints.append(record['fingerprint'])
+                scores.append(record['trust_score'])
+        return cls(fingerprints, scores)
+
+    def lookup(self, fingerprints):
+        """
+        Args:
+            fingerprints: Fingerprint strings (None or '' if anonymous)
+
+        Returns:
+            (trust score per fingerprint, mask of the fingerprints found)
+        """
+        scores = np.array([self.trust_scores.get(fingerprint, np.nan) if fingerprint else np.nan
+                           for fingerprint in fingerprints], dtype=np.float64)
+        found = ~np.isnan(scores)
+        return np.where(found, scores, 0.0), found
+
+
+def _batches(fingerprints):
+    for start in range(0, len(fingerprints), FINGERPRINT_BATCH_SIZE):
+        yield fingerprints[start:start + FINGERPRINT_BATCH_SIZE]
+
+
+def load_trust_table(collection, fingerprints):
+    """Fetch the trust scores of the given fingerprints (pymongo)"""
+    records = []
+    for batch in _batches(fingerprints):
+        records.extend(collection.find({'fingerprint': {'$in': batch}}, FINGERPRINT_PROJECTION))
+    return TrustTable.from_records(records)
+
+
+async def load_trust_table_async(collection, fingerprints):
+    """Async (motor) variant of load_trust_table"""
+    records = []
+    for batch in _batches(fingerprints):
+        records.extend(await collection.find({'fingerprint': {'$in': batch}}, FINGERPRINT_PROJECTION).to_list(None))
+    return TrustTable.from_records(records)
+
+
+def apply_live_trust(reports, table):
+    """
+    Re-weight reports from their devices' current trust scores.
+
+    Args:
+        reports: ReportColumns with fingerprints
+        table: TrustTable covering the reports' fingerprints
+
+    Returns:
+        (ReportColumns with current weights and trust scores, rows whose
+        weight changed)
+    """
+    if reports.fingerprints is None or len(reports) == 0:
+        return reports, np.zeros(0, dtype=np.int64)
+    # One lookup per device; code -1 (anonymous) picks the trailing miss
+    device_scores, device_found = table.lookup(reports.fingerprint_names)
+    scores = np.append(device_scores, 0.0)[reports.fingerprints]
+    found = np.append(device_found, False)[reports.fingerprints]
+    weights = np.where(found, weights_from_scores(scores), reports.weights)
+    trust_scores = np.where(found, scores, reports.trust_scores).astype(np.float32)
+    changed = np.flatnonzero(~np.isclose(weights, reports.weights))
+    return reports.with_weights(weights, trust_scores), changed
+
+
+def trust_write_back(reports, rows):
+    """
+    Bulk operations storing the current weights of the given rows.
+
+    One UpdateMany per device, as all its reports share one weight.
+    trustScore stays the score at submission. updatedAt is left alone: it
+    marks report changes that trigger clustering, and this write is a
+    result of clustering.
+    """
+    operations = []
+    fingerprints = reports.fingerprints[rows]
+    for fingerprint in np.unique(fingerprints):
+        device_rows = rows[fingerprints == fingerprint]
+        operations.append(UpdateMany(
+            {'_id': {'$in': reports.object_ids(device_rows)}},
+            {'$set': {'trustWeight': float(reports.weights[device_rows[0]])}}
+        ))
+    return operations
+
+
+def refresh_trust(db, reports, write_back=False, quiet=False):
+    """
+    Re-weight reports from their devices' current trust scores (pymongo).
+
+    Args:
+        db: MongoDB database
+        reports: ReportColumns with fingerprints
+        write_back: Also store the changed weights on the reports
+        quiet: Skip the progress output
+
+    Returns:
+        ReportColumns with live weights
+    """
+    table = load_trust_table(db['fingerprints'], distinct_fingerprints(reports))
+    reports, changed = apply_live_trust(reports, table)
+    if len(changed):
+        if not quiet:
+            print(f"⚖️  Re-weighted {len(changed)} reports from {len(table)} device trust scores")
+        if write_back:
+            result = db['reports'].bulk_write(trust_write_back(reports, changed), ordered=False)
+            if not quiet:
+                print(f"   Stored {result.modified_count} updated trust weights")
+    return reports
@@ -0,0 +1,119 @@
+"""
+Multi-window clustering from one load
+
+Hotspots are published for several time horizons (last hour, 6 hours,
+day, week). Instead of a fetch and a fit per horizon, the widest window
+is loaded once and sorted by timestamp, so every narrower window is a
+suffix of the same arrays. The neighbor pairs are computed once at the
+widest window too: a window starting at row s keeps the pairs with both
+endpoints at or after s, and its labels equal weighted_dbscan on that
+suffix.
+"""
+
+import re
+from datetime import timedelta
+
+import numpy as np
+
+from .geo import labels_from_edges
+from .grid import WEIGHT_TOLERANCE, grid_neighbor_pairs
+from .spatiotemporal import st_dbscan
+
+DEFAULT_WINDOW = '24h'  # The window clusters belong to when untagged
+DEFAULT_WINDOWS = ('1h', '6h', '24h', '7d')
+
+_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+_LABEL = re.compile(r'^(\d+)([mhd])$')
+
+
+def parse_window(label):
+    """
+    Window length of a label such as '90m', '6h' or '7d'.
+
+    Raises:
+        ValueError: If the label is not a positive number of minutes,
+            hours or days
+    """
+    match = _LABEL.match(str(label).strip())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid window {label!r} (expected e.g. '1h', '6h', '7d')")
+    return timedelta(**{_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def parse_windows(labels):
+    """
+    Window labels from a comma-separated string or a sequence, ordered
+    from the shortest to the longest window.
+    """
+    if isinstance(labels, str):
+        labels = [label.strip() for label in labels.split(',') if label.strip()]
+    return sorted(dict.fromkeys(labels), key=parse_window)
+
+
+def window_starts(timestamps, now, windows):
+    """
+    First row of every window in timestamp-sorted data.
+
+    Args:
+        timestamps: Ascending datetime64 report timestamps
+        now: End of all windows (datetime)
+        windows: Window labels
+
+    Returns:
+        Dict of window label to start row; the window is rows[start:]
+    """
+    timestamps = np.asarray(timestamps, dtype='datetime64[ms]')
+    return {
+        label: int(np.searchsorted(timestamps, np.datetime64(now - parse_window(label), 'ms'), side='left'))
+        for label in windows
+    }
+
+
+def multi_window_labels(points, weights, starts, eps, min_weight):
+    """
+    Weighted DBSCAN labels for nested time windows over one neighbor graph.
+
+    Args:
+        points: (n, 2) projected coordinates, sorted by timestamp
+        weights: Trust weight per point
+        starts: Dict of window label to first row (as from window_starts)
+        eps: Neighborhood radius in meters
+        min_weight: Summed neighborhood weight needed for a core point
+
+    Returns:
+        Dict of window label to labels for rows[start:], each equal to
+        weighted_dbscan(points[start:], weights[start:], eps, min_weight)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    first = min(starts.values(), default=len(points))
+    rows, cols = grid_neighbor_pairs(points[first:], eps)
+    rows += first
+    cols += first
+
+    results = {}
+    for label, start in starts.items():
+        size = len(points) - start
+        keep = np.minimum(rows, cols) >= start
+        window_rows, window_cols = rows[keep] - start, cols[keep] - start
+        neighbor_weight = np.bincount(window_rows, weights=weights[start:][window_cols], minlength=size)
+        core = neighbor_weight >= min_weight - WEIGHT_TOLERANCE
+        results[label] = labels_from_edges(window_rows, window_cols, core)
+    return results
+
+
+def cluster_windows(points, weights, starts, eps, min_weight, times=None, eps_time=None):
+    """
+    Labels per window for one set of reports (e.g. one category), as a
+    single picklable task for worker processes.
+
+    Spatial clustering shares one neighbor graph (multi_window_labels);
+    with times and eps_time given, every window is clustered with
+    spatio-temporal DBSCAN instead.
+    """
+    if times is None:
+        return multi_window_labels(points, weights, starts, eps, min_weight)
+    return {
+        label: st_dbscan(points[start:], times[start:], weights[start:], eps, eps_time, min_weight)
+        for label, start in starts.items()
+    }
@@ -0,0 +1,36 @@
+"""
+Shared fixtures for the hotspots checks
+
+Run from the repository root or this directory:
+
+    python -m pytest backend/clustering/tests
+
+The MongoDB checks use mongomock and are skipped where it is not installed.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The clustering services import the library as `hotspots`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db():
+    mongomock = pytest.importorskip('mongomock')
+    return mongomock.MongoClient()['trustbond']
+
+
+@pytest.fixture
+def blobs():
+    """Projected points: three dense blobs far apart plus scattered noise, with mixed weights"""
+    rng = np.random.default_rng(1)
+    centers = ([0, 0], [6000, 0], [12000, 4000])
+    points = np.concatenate(
+        [rng.normal(center, 150, (300, 2)) for center in centers] + [rng.uniform(-2000, 14000, (300, 2))]
+    )
+    weights = rng.choice([0.1, 0.5, 0.8, 1.0], len(points))
+    return points, weights
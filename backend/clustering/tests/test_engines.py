@@ -0,0 +1,108 @@
+"""Every exact engine, and the incremental service, must match the grid engine"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from bson import ObjectId
+
+from hotspots.batch import run_trust_weighted_dbscan
+from hotspots.engines import ENGINES, get_engine
+from hotspots.pipeline import fetch_recent_report_columns
+from hotspots.realtime import IncrementalTrustClustering
+from hotspots.trust import refresh_trust
+
+EPS = 200
+MIN_WEIGHT = 3
+EXACT_ENGINES = sorted(set(ENGINES) - {'micro'})  # micro-clusters are approximate
+
+
+def same_partition(a, b):
+    """Same noise and same clusters, whatever the label numbers"""
+    if not np.array_equal(a == -1, b == -1):
+        return False
+    pairs = set(zip(a[a >= 0].tolist(), b[b >= 0].tolist()))
+    return len(pairs) == len({x for x, _ in pairs}) == len({y for _, y in pairs})
+
+
+@pytest.mark.parametrize('name', EXACT_ENGINES)
+def test_engine_matches_grid(name, blobs):
+    points, weights = blobs
+    expected = get_engine('grid').labels(points, weights, EPS, MIN_WEIGHT)
+    assert expected.max() + 1 >= 3
+
+    labels = get_engine(name).labels(points, weights, EPS, MIN_WEIGHT)
+
+    assert same_partition(labels, expected)
+
+
+def test_partitioned_tiles_match_grid(blobs):
+    points, weights = blobs
+    expected = get_engine('grid').labels(points, weights, EPS, MIN_WEIGHT)
+
+    with ThreadPoolExecutor(3) as executor:
+        labels = get_engine('partitioned', workers=3, executor=executor).labels(points, weights, EPS, MIN_WEIGHT)
+
+    assert same_partition(labels, expected)
+
+
+def test_micro_engine_finds_the_blobs(blobs):
+    points, weights = blobs
+    labels = get_engine('micro').labels(points, weights, EPS, MIN_WEIGHT)
+    assert labels.max() + 1 >= 3
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError, match='Unknown clustering engine'):
+        get_engine('nope')
+
+
+def summaries(clusters):
+    return sorted((cluster['reportCount'], round(cluster['weightedReportCount'], 3)) for cluster in clusters)
+
+
+def batch_clusters(db):
+    reports = refresh_trust(db, fetch_recent_report_columns(db))
+    return summaries(run_trust_weighted_dbscan(reports, EPS, MIN_WEIGHT))
+
+
+def test_incremental_matches_batch(db):
+    rng = np.random.default_rng(2)
+    now = datetime.utcnow()
+    db.reports.insert_many([{
+        '_id': ObjectId(),
+        'location': {'lat': -1.95 + rng.normal() * 0.002, 'lng': 30.06 + rng.normal() * 0.002},
+        'timestamp': now - timedelta(hours=rng.uniform(0, 20)),
+        'trustWeight': 0.5,
+        'trustScore': 50,
+        'deviceFingerprint': f'device-{i % 20}',
+        'category': 'theft'
+    } for i in range(300)])
+    db.fingerprints.insert_many([{
+        'fingerprint': f'device-{i}',
+        'trust_score': 20 if i < 8 else 90,
+        'updated_at': now - timedelta(days=3)
+    } for i in range(20)])
+
+    state = IncrementalTrustClustering(EPS, MIN_WEIGHT, live_trust=True)
+    state.sync(db)
+    assert summaries(state.clusters()) == batch_clusters(db)
+
+    # Trust moves without any report changing
+    db.fingerprints.update_many(
+        {'trust_score': 20}, {'$set': {'trust_score': 80, 'updated_at': datetime.utcnow()}}
+    )
+    assert state.sync(db) > 0
+    assert summaries(state.clusters()) == batch_clusters(db)
+
+    # A device drops and a new report arrives
+    db.fingerprints.update_one(
+        {'fingerprint': 'device-3'}, {'$set': {'trust_score': 10, 'updated_at': datetime.utcnow()}}
+    )
+    db.reports.insert_one({
+        'location': {'lat': -1.95, 'lng': 30.06}, 'timestamp': datetime.utcnow(),
+        'trustWeight': 0.5, 'trustScore': 50, 'deviceFingerprint': 'device-5', 'category': 'theft'
+    })
+    state.sync(db)
+    assert summaries(state.clusters()) == batch_clusters(db)
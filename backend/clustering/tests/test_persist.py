@@ -0,0 +1,99 @@
+"""Generation publishing: versions, retirements, leases and rollback"""
+
+from datetime import datetime
+
+from hotspots import persist
+
+
+def cluster(i):
+    return {
+        'center': {'lat': -1.9 + i * 0.01, 'lng': 30.0},
+        'reportCount': 3 + i,
+        'reportIds': [str(i)],
+        'riskLevel': 'low'
+    }
+
+
+def versions(db):
+    return {
+        tuple(doc['reportIds']): (doc['sinceGeneration'], doc['retiredGeneration'])
+        for doc in db['clusters'].find({}, {'_id': 0, 'reportIds': 1, 'sinceGeneration': 1, 'retiredGeneration': 1})
+    }
+
+
+def visible(db):
+    generation = persist.get_active_generation(db)['generation']
+    return sorted(doc['reportIds'][0] for doc in db['clusters'].find(persist.visible_query(generation)))
+
+
+def test_publish_replaces_changed_clusters(db):
+    first = persist.publish_clusters(db, [cluster(0), cluster(1)], 'test')
+    assert first['activated'] and first['inserted'] == 2
+
+    second = persist.publish_clusters(db, [cluster(0), cluster(5)], 'test')
+
+    assert second['activated']
+    assert (second['inserted'], second['retired'], second['unchanged']) == (1, 1, 1)
+    assert visible(db) == ['0', '5']
+    assert versions(db)[('1',)] == (1, 2)
+    assert persist.get_active_generation(db)['generation'] == 2
+
+
+def test_lease_lost_before_writing(db, monkeypatch):
+    persist.publish_clusters(db, [cluster(0), cluster(1)], 'test')
+    before = versions(db)
+
+    acquire = persist._acquire_lease
+
+    def taken_over(db, generation):
+        base = acquire(db, generation)
+        db[persist.STATE_COLLECTION].update_one(
+            {'_id': persist.ACTIVE_ID}, {'$set': {'pending': {'generation': 999, 'startedAt': datetime.utcnow()}}}
+        )
+        return base
+
+    monkeypatch.setattr(persist, '_acquire_lease', taken_over)
+    result = persist.publish_clusters(db, [cluster(7)], 'test')
+
+    assert not result['activated']
+    assert versions(db) == before
+
+
+def test_lease_lost_after_writing_rolls_back_only_own_writes(db, monkeypatch):
+    persist.publish_clusters(db, [cluster(0), cluster(1)], 'test')
+    # Another publisher already retired cluster 1 under its own generation
+    db['clusters'].update_one({'reportIds': ['1']}, {'$set': {'retiredGeneration': 50}})
+
+    clusters = db['clusters']
+    insert_many = clusters.insert_many
+
+    def insert_then_lose_lease(*args, **kwargs):
+        written = insert_many(*args, **kwargs)
+        db[persist.STATE_COLLECTION].update_one(
+            {'_id': persist.ACTIVE_ID}, {'$set': {'pending': {'generation': 999, 'startedAt': datetime.utcnow()}}}
+        )
+        return written
+
+    monkeypatch.setattr(clusters, 'insert_many', insert_then_lose_lease)
+    result = persist.publish_clusters(db, [cluster(8)], 'test')
+
+    assert not result['activated'] and result['inserted'] == 1
+    assert versions(db) == {('0',): (1, None), ('1',): (1, 50)}
+
+
+def test_takeover_rolls_back_dead_publisher(db):
+    persist.publish_clusters(db, [cluster(0), cluster(1)], 'test')
+    # A publisher that died after retiring cluster 0 and inserting cluster 2
+    dead = persist.next_generation(db)
+    retired = [db['clusters'].find_one({'reportIds': ['0']})['_id']]
+    db['clusters'].update_many({'_id': {'$in': retired}}, {'$set': {'retiredGeneration': dead}})
+    db['clusters'].insert_one(dict(cluster(2), sinceGeneration=dead, retiredGeneration=None))
+    db[persist.STATE_COLLECTION].update_one({'_id': persist.ACTIVE_ID}, {'$set': {'pending': {
+        'generation': dead, 'startedAt': datetime(2000, 1, 1), 'retired': retired
+    }}})
+
+    result = persist.publish_clusters(db, [cluster(0), cluster(1)], 'test')
+
+    assert result['activated'] and result['inserted'] == 0
+    assert visible(db) == ['0', '1']
+    assert ('2',) not in versions(db)
@@ -12,24 +12,55 @@ Trust Weight Range: 0.0 - 1.0
 - Reports with weight < 0.3 have minimal influence on clustering
 - Reports flagged as fake are completely excluded
 - Delayed reports are excluded until approved or delay expires
+
+The clustering itself lives in the hotspots package (batch, realtime,
+backfill, sweep); this script reads the configuration from the
+environment and the command line and runs it.
 """
 
+import argparse
+import sys
 import time
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 from pymongo import MongoClient
-from sklearn.cluster import DBSCAN
-import numpy as np
+
+from hotspots.pipeline import MIN_TRUST_WEIGHT_FOR_CLUSTERING
+from hotspots.windows import parse_window
+from hotspots.persist import ensure_indexes
+from hotspots.settings import ClusteringSettings
+from hotspots.batch import run_batch
+from hotspots.realtime import run_incremental_loop
+from hotspots.backfill import run_backfill
+from hotspots.sweep import sweep_window
+from hotspots.scheduler import (
+    ClusteringScheduler, Debouncer, MIN_CHANGES, DEBOUNCE_SECONDS, MAX_DEBOUNCE_SECONDS, MIN_INTERVAL_SECONDS
+)
 
 # Configuration
 MONGODB_URL = os.getenv('MONGODB_URL', 'mongodb://localhost:27017')
 DATABASE_NAME = os.getenv('DATABASE_NAME', 'trustbond')  # Updated to TrustBond
 API_URL = os.getenv('API_URL', 'http://localhost:8000')
-REFRESH_INTERVAL = 1800  # 30 minutes (as per project scope)
+REFRESH_INTERVAL = int(os.getenv('REFRESH_INTERVAL', '1800'))  # seconds, unless set in config
+
+# Batch runs are triggered by report changes: once CLUSTERING_MIN_CHANGES
+# relevant changes have accumulated and reports went quiet for
+# CLUSTERING_DEBOUNCE_SECONDS (at most CLUSTERING_MAX_DEBOUNCE_SECONDS into a
+# burst), and at least every refresh interval. Runs are never closer than
+# CLUSTERING_MIN_INTERVAL seconds.
+CLUSTERING_MIN_CHANGES = int(os.getenv('CLUSTERING_MIN_CHANGES', str(MIN_CHANGES)))
+CLUSTERING_DEBOUNCE_SECONDS = float(os.getenv('CLUSTERING_DEBOUNCE_SECONDS', str(DEBOUNCE_SECONDS)))
+CLUSTERING_MAX_DEBOUNCE_SECONDS = float(os.getenv('CLUSTERING_MAX_DEBOUNCE_SECONDS', str(MAX_DEBOUNCE_SECONDS)))
+CLUSTERING_MIN_INTERVAL = float(os.getenv('CLUSTERING_MIN_INTERVAL', str(MIN_INTERVAL_SECONDS)))
 
-# Trust-weighted clustering thresholds
-MIN_TRUST_WEIGHT_FOR_CLUSTERING = 0.3  # Reports below this have minimal influence
-FAKE_REPORT_WEIGHT = 0.0  # Fake reports are excluded completely
+# 'batch' reclusters the whole window on the triggers above,
+# 'incremental' applies report changes every INCREMENTAL_POLL_INTERVAL
+CLUSTERING_MODE = os.getenv('CLUSTERING_MODE', 'batch')
+INCREMENTAL_POLL_INTERVAL = int(os.getenv('INCREMENTAL_POLL_INTERVAL', '60'))  # seconds
+
+# Windows, per-category clusters, engine, workers, memory budget,
+# micro-clusters, snapshot and live trust: see hotspots.settings
+SETTINGS = ClusteringSettings.from_env()
 
 
 def connect_to_db():
@@ -39,185 +70,6 @@ def connect_to_db():
     return db
 
 
-def get_clustering_params(db):
-    """Fetch clustering parameters from config collection"""
-    config_collection = db['config']
-    config = config_collection.find_one({})
-    
-    if config and 'clustering' in config:
-        clustering_config = config['clustering']
-        return {
-            'eps': clustering_config.get('epsilon', 0.005),
-            'min_samples': clustering_config.get('minSamples', 3),
-            'enabled': clustering_config.get('enabled', True)
-        }
-    
-    # Default values
-    return {
-        'eps': 0.005,  # ~500 meters
-        'min_samples': 3,
-        'enabled': True
-    }
-
-
-def fetch_recent_reports(db, exclude_delayed=True, exclude_fake=True):
-    """
-    Fetch reports from last 24 hours for clustering.
-    
-    Args:
-        db: MongoDB database connection
-        exclude_delayed: Whether to exclude reports in the delayed queue
-        exclude_fake: Whether to exclude reports flagged as fake
-    
-    Returns:
-        List of report documents with trust weights
-    """
-    reports_collection = db['reports']
-    twenty_four_hours_ago = datetime.utcnow() - timedelta(hours=24)
-    
-    # Build query to exclude unwanted reports
-    query = {
-        'timestamp': {'$gte': twenty_four_hours_ago}
-    }
-    
-    if exclude_fake:
-        query['flaggedAsFake'] = {'$ne': True}
-    
-    if exclude_delayed:
-        # Exclude delayed reports unless their delay has expired
-        query['$or'] = [
-            {'isDelayed': {'$ne': True}},
-            {'delayedUntil': {'$lt': datetime.utcnow()}}
-        ]
-    
-    reports = list(reports_collection.find(query))
-    
-    # Add default trust weights if not present
-    for report in reports:
-        if 'trustWeight' not in report:
-            report['trustWeight'] = 0.5  # Default neutral weight
-        if 'trustScore' not in report:
-            report['trustScore'] = 50  # Default neutral score
-    
-    return reports
-
-
-def run_trust_weighted_dbscan(reports, eps=0.005, min_samples=3):
-    """
-    Run trust-weighted DBSCAN clustering algorithm.
-    
-    The algorithm uses sample weights to give more influence to
-    high-trust reports and less influence to low-trust reports.
-    
-    Args:
-        reports: List of report documents
-        eps: Maximum distance between two samples (in degrees, ~500m default)
-        min_samples: Minimum number of weighted samples to form a cluster
-    
-    Returns:
-        List of cluster objects with trust-weighted metrics
-    """
-    if len(reports) < 2:
-        print("Not enough reports for clustering")
-        return []
-    
-    # Filter out reports with zero or very low weight
-    valid_reports = [r for r in reports if r.get('trustWeight', 0.5) >= MIN_TRUST_WEIGHT_FOR_CLUSTERING]
-    
-    if len(valid_reports) < 2:
-        print(f"Not enough high-trust reports for clustering (only {len(valid_reports)} valid)")
-        return []
-    
-    # Extract coordinates and weights
-    coords = np.array([[r['location']['lat'], r['location']['lng']] for r in valid_reports])
-    weights = np.array([r.get('trustWeight', 0.5) for r in valid_reports])
-    trust_scores = np.array([r.get('trustScore', 50) for r in valid_reports])
-    
-    # Run DBSCAN (note: sklearn DBSCAN doesn't directly support sample weights,
-    # but we can adjust by using the weights in post-processing and cluster evaluation)
-    db = DBSCAN(eps=eps, min_samples=min_samples).fit(coords)
-    labels = db.labels_
-    
-    # Group into clusters with trust weighting
-    unique_labels = set(labels)
-    clusters = []
-    
-    for label in unique_labels:
-        if label == -1:  # Skip noise points
-            continue
-        
-        # Get points in this cluster
-        mask = labels == label
-        cluster_reports = [valid_reports[i] for i, m in enumerate(mask) if m]
-        cluster_coords = coords[mask]
-        cluster_weights = weights[mask]
-        cluster_trust_scores = trust_scores[mask]
-        
-        # Calculate weighted center (higher trust reports have more influence)
-        weight_sum = np.sum(cluster_weights)
-        if weight_sum > 0:
-            weighted_lat = np.sum(cluster_coords[:, 0] * cluster_weights) / weight_sum
-            weighted_lng = np.sum(cluster_coords[:, 1] * cluster_weights) / weight_sum
-        else:
-            weighted_lat = np.mean(cluster_coords[:, 0])
-            weighted_lng = np.mean(cluster_coords[:, 1])
-        
-        center_lat = float(weighted_lat)
-        center_lng = float(weighted_lng)
-        
-        # Calculate radius (in meters)
-        distances = np.sqrt(
-            (cluster_coords[:, 0] - center_lat)**2 + 
-            (cluster_coords[:, 1] - center_lng)**2
-        )
-        radius = float(np.max(distances)) * 111000  # Convert degrees to meters
-        
-        # Calculate trust-weighted metrics
-        num_reports = len(cluster_reports)
-        weighted_report_count = float(np.sum(cluster_weights))
-        avg_trust_score = float(np.mean(cluster_trust_scores))
-        
-        # Determine risk level based on WEIGHTED count, not raw count
-        # This ensures fake/low-trust reports don't artificially inflate risk
-        if weighted_report_count > 8:
-            risk_level = "critical"
-        elif weighted_report_count > 4:
-            risk_level = "high"
-        else:
-            risk_level = "medium"
-        
-        clusters.append({
-            'cluster_id': int(label),
-            'center': {'lat': center_lat, 'lng': center_lng},
-            'radius': max(radius, 100),  # Minimum 100m radius
-            'points': [str(r['_id']) for r in cluster_reports],
-            'riskLevel': risk_level,
-            'reportCount': num_reports,
-            'weightedReportCount': round(weighted_report_count, 2),
-            'averageTrustScore': round(avg_trust_score, 1),
-            'trustConfidence': 'high' if avg_trust_score >= 70 else ('medium' if avg_trust_score >= 40 else 'low'),
-            'timestamp': datetime.utcnow()
-        })
-    
-    return clusters
-
-
-def save_clusters(db, clusters):
-    """Save clusters to database"""
-    clusters_collection = db['clusters']
-    
-    # Clear old clusters (older than 1 hour)
-    one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-    clusters_collection.delete_many({'timestamp': {'$lt': one_hour_ago}})
-    
-    if clusters:
-        # Insert new clusters
-        clusters_collection.insert_many(clusters)
-        print(f"✅ Saved {len(clusters)} trust-weighted clusters to database")
-    else:
-        print("ℹ️  No clusters found")
-
-
 def main():
     """Main trust-weighted clustering service loop"""
     print("=" * 60)
@@ -225,77 +77,135 @@ def main():
     print("=" * 60)
     print(f"   MongoDB: {MONGODB_URL}")
     print(f"   Database: {DATABASE_NAME}")
-    print(f"   Refresh Interval: {REFRESH_INTERVAL}s ({REFRESH_INTERVAL//60} minutes)")
+    print(f"   Refresh Interval: {REFRESH_INTERVAL}s ({REFRESH_INTERVAL//60} minutes, unless set in config)")
+    print(f"   Trigger: {CLUSTERING_MIN_CHANGES}+ report changes, {CLUSTERING_DEBOUNCE_SECONDS:g}s quiet "
+          f"(max {CLUSTERING_MAX_DEBOUNCE_SECONDS:g}s), runs >= {CLUSTERING_MIN_INTERVAL:g}s apart")
     print(f"   Min Trust Weight: {MIN_TRUST_WEIGHT_FOR_CLUSTERING}")
+    print(f"   Live trust: {'on' if SETTINGS.live_trust else 'off'}"
+          + (" (write-back)" if SETTINGS.live_trust and SETTINGS.trust_writeback else ""))
+    print(f"   Windows: {', '.join(SETTINGS.windows)}")
+    print(f"   Per-category clusters: {'on' if SETTINGS.by_category else 'off'}")
+    print(f"   Engine: {SETTINGS.engine}")
+    print(f"   Workers: {SETTINGS.workers}")
+    print(f"   Snapshot: {SETTINGS.snapshot_dir or 'off'}")
+    if SETTINGS.memory_budget_mb > 0:
+        print(f"   Memory budget: {SETTINGS.memory_budget_mb:.0f} MB (chunked neighbors)")
+    if SETTINGS.microcluster_min_reports > 0:
+        print(f"   Micro-clusters: windows of {SETTINGS.microcluster_min_reports}+ reports "
+              f"(cells of {SETTINGS.microcluster_cell_fraction:g} x eps)")
     print("-" * 60)
-    
+
     db = connect_to_db()
+    ensure_indexes(db)
     print("✅ Connected to MongoDB")
-    
+
+    if CLUSTERING_MODE == 'incremental':
+        run_incremental_loop(db, SETTINGS, INCREMENTAL_POLL_INTERVAL)
+        return
+
+    scheduler = ClusteringScheduler(
+        db, 'trust-weighted-dbscan', run_batch_iteration(db),
+        default_interval_minutes=REFRESH_INTERVAL / 60,
+        debouncer=Debouncer(
+            min_changes=CLUSTERING_MIN_CHANGES,
+            quiet=CLUSTERING_DEBOUNCE_SECONDS,
+            max_wait=CLUSTERING_MAX_DEBOUNCE_SECONDS,
+            min_interval=CLUSTERING_MIN_INTERVAL
+        )
+    )
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Service stopped by user")
+
+
+def run_batch_iteration(db):
+    """One batch run per call; the first call may warm-start from the snapshot"""
     iteration = 0
-    while True:
-        try:
-            iteration += 1
-            print(f"\n[Iteration #{iteration}] {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            
-            # Get clustering parameters from config
-            params = get_clustering_params(db)
-            
-            if not params['enabled']:
-                print("⏸️  Clustering is disabled in config. Skipping...")
-                time.sleep(REFRESH_INTERVAL)
-                continue
-            
-            print(f"   Parameters: eps={params['eps']}, min_samples={params['min_samples']}")
-            print("Running trust-weighted DBSCAN clustering...")
-            
-            # Fetch reports (excluding fake and delayed)
-            all_reports = db['reports'].count_documents({
-                'timestamp': {'$gte': datetime.utcnow() - timedelta(hours=24)}
-            })
-            reports = fetch_recent_reports(db, exclude_delayed=True, exclude_fake=True)
-            excluded_count = all_reports - len(reports)
-            
-            print(f"📊 Fetched {len(reports)} valid reports from last 24 hours")
-            if excluded_count > 0:
-                print(f"   (Excluded {excluded_count} fake/low-trust reports)")
-            
-            # Run trust-weighted clustering
-            clusters = run_trust_weighted_dbscan(
-                reports, 
-                eps=params['eps'], 
-                min_samples=params['min_samples']
-            )
-            print(f"🔍 Found {len(clusters)} abuse-resistant clusters")
-            
-            # Save to database
-            save_clusters(db, clusters)
-            
-            # Print cluster details
-            if clusters:
-                print("\n📍 Trust-Weighted Cluster Details:")
-                for cluster in clusters:
-                    confidence_emoji = "🟢" if cluster['trustConfidence'] == 'high' else ("🟡" if cluster['trustConfidence'] == 'medium' else "🔴")
-                    print(f"   Cluster #{cluster['cluster_id']}: "
-                          f"{cluster['reportCount']} reports "
-                          f"(weighted: {cluster['weightedReportCount']:.1f}), "
-                          f"Risk: {cluster['riskLevel'].upper()}, "
-                          f"{confidence_emoji} Trust: {cluster['averageTrustScore']:.0f}")
-            
-            print(f"\n😴 Sleeping for {REFRESH_INTERVAL//60} minutes...")
-            print("-" * 60)
-            time.sleep(REFRESH_INTERVAL)
-            
-        except KeyboardInterrupt:
-            print("\n\n⚠️  Service stopped by user")
-            break
-        except Exception as e:
-            print(f"\n❌ Error: {e}")
-            import traceback
-            traceback.print_exc()
-            print(f"   Retrying in 60 seconds...")
-            time.sleep(60)
+
+    def run():
+        nonlocal iteration
+        iteration += 1
+        print(f"[Iteration #{iteration}] {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        run_batch(db, SETTINGS, warm=iteration == 1)
+        print("-" * 60)
+
+    return run
+
+
+def run_sweep(db, eps_values, min_samples_values):
+    """
+    Compare clustering parameters on the current window without saving.
+
+    The neighbor graph is built once at the largest eps; every
+    (eps, min_samples) pair is derived from it.
+    """
+    print(f"📊 Sweeping {len(eps_values)}x{len(min_samples_values)} parameter pairs")
+
+    start = time.perf_counter()
+    valid_count, results = sweep_window(db, eps_values, min_samples_values, live_trust=SETTINGS.live_trust)
+    print(f"   Done in {time.perf_counter() - start:.2f}s over {valid_count} valid reports\n")
+
+    print(f"{'eps (m)':>8} | {'min_samples':>11} | {'clusters':>8} | {'noise':>6} | "
+          f"{'largest':>7} | {'weighted median/max':>19}")
+    print("-" * 74)
+    for r in results:
+        print(f"{r['eps_meters']:>8.0f} | {r['min_samples']:>11g} | {r['clusters']:>8} | "
+              f"{r['noiseRatio']:>6.1%} | {r['largestCluster']:>7} | "
+              f"{r['weightedCount']['median']:>9.1f}/{r['weightedCount']['max']:<9.1f}")
+    return results
+
+
+def parse_utc(value):
+    """ISO date or time as a naive UTC datetime (as stored by MongoDB)"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="TrustBond trust-weighted DBSCAN clustering service")
+    parser.add_argument('--sweep', action='store_true',
+                        help='Print cluster statistics for a parameter grid and exit')
+    parser.add_argument('--eps', type=float, nargs='+', default=[250, 500, 750, 1000],
+                        help='Sweep: eps values in meters')
+    parser.add_argument('--min-samples', type=float, nargs='+', default=[2, 3, 4, 5],
+                        help='Sweep: min_samples values (summed trust weight)')
+    parser.add_argument('--backfill', action='store_true',
+                        help='Recluster past windows into cluster_history and exit')
+    parser.add_argument('--from', dest='start', type=parse_utc,
+                        help='Backfill: first window end (ISO date or time, UTC)')
+    parser.add_argument('--to', dest='end', type=parse_utc,
+                        help='Backfill: last window end (default: now)')
+    parser.add_argument('--step', default='1d',
+                        help='Backfill: spacing of window ends, e.g. 1h, 6h, 1d (default: 1d)')
+    parser.add_argument('--window', default=None,
+                        help='Backfill: clustered horizon per window end (default: the step)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Backfill: worker processes (default: CPU count)')
+    parser.add_argument('--checkpoint', default='backfill-checkpoint.json',
+                        help="Backfill: progress file for resuming ('' disables it)")
+    parser.add_argument('--live-trust', action='store_true',
+                        help='Backfill: weight reports by current device trust instead of the stored trustWeight')
+    args = parser.parse_args()
+
+    if args.sweep:
+        run_sweep(connect_to_db(), args.eps, args.min_samples)
+    elif args.backfill:
+        if args.start is None:
+            parser.error('--backfill requires --from')
+        for label in filter(None, (args.step, args.window)):
+            try:
+                parse_window(label)
+            except ValueError as e:
+                parser.error(str(e))
+        failed = run_backfill(
+            connect_to_db(), MONGODB_URL, DATABASE_NAME, SETTINGS,
+            args.start, args.end or datetime.utcnow(), args.step,
+            window=args.window, workers=args.workers, checkpoint_path=args.checkpoint or None,
+            live_trust=args.live_trust
+        )
+        sys.exit(1 if failed else 0)
+    else:
+        main()
@@ -33,6 +33,9 @@ export default function AdminSettings() {
     minSamples: 3,
     epsilon: 0.005,
     enabled: true,
+    mode: "spatial",
+    temporalEpsMinutes: 60,
+    decayHalfLifeHours: 6,
   });
 
   // System Stats
@@ -60,6 +63,9 @@ export default function AdminSettings() {
             minSamples: response.data.clustering.minSamples || 3,
             epsilon: response.data.clustering.epsilon || 0.005,
             enabled: response.data.clustering.enabled !== false,
+            mode: response.data.clustering.mode || "spatial",
+            temporalEpsMinutes: response.data.clustering.temporalEpsMinutes || 60,
+            decayHalfLifeHours: response.data.clustering.decayHalfLifeHours ?? 6,
           });
         }
       }
@@ -104,7 +110,11 @@ export default function AdminSettings() {
           refreshInterval: clusterSettings.refreshInterval,
           minSamples: clusterSettings.minSamples,
           epsilon: clusterSettings.epsilon,
+          epsilonMeters: epsilonToMeters(clusterSettings.epsilon),
           enabled: clusterSettings.enabled,
+          mode: clusterSettings.mode,
+          temporalEpsMinutes: clusterSettings.temporalEpsMinutes,
+          decayHalfLifeHours: clusterSettings.decayHalfLifeHours,
         },
       });
 
@@ -128,7 +138,7 @@ export default function AdminSettings() {
     try {
       setRefreshing(true);
       setMessage({ type: "", text: "" });
-      const response = await clustersAPI.refresh();
+      const response = await clustersAPI.refreshAndWait();
       setMessage({
         type: "success",
         text: `Cluster analysis completed! ${
@@ -353,6 +363,90 @@ export default function AdminSettings() {
               </div>
             </div>
 
+            {/* Clustering Mode */}
+            <div>
+              <label className="text-sm font-medium text-slate-300 mb-2 block">
+                Clustering Mode
+              </label>
+              <select
+                value={clusterSettings.mode}
+                onChange={(e) =>
+                  setClusterSettings((prev) => ({
+                    ...prev,
+                    mode: e.target.value,
+                  }))
+                }
+                className="w-full px-3 py-2 bg-slate-700 border border-slate-600 rounded-lg text-white text-sm focus:outline-none focus:ring-2 focus:ring-blue-500"
+              >
+                <option value="spatial">Spatial (location only)</option>
+                <option value="spatiotemporal">Spatio-temporal (location and time)</option>
+              </select>
+            </div>
+
+            {clusterSettings.mode === "spatiotemporal" && (
+              <>
+                {/* Temporal Epsilon */}
+                <div>
+                  <div className="flex items-center justify-between mb-2">
+                    <label className="text-sm font-medium text-slate-300">
+                      Time Window Between Reports
+                    </label>
+                    <span className="text-sm text-blue-400 font-mono">
+                      {clusterSettings.temporalEpsMinutes} min
+                    </span>
+                  </div>
+                  <input
+                    type="range"
+                    min="15"
+                    max="360"
+                    step="15"
+                    value={clusterSettings.temporalEpsMinutes}
+                    onChange={(e) =>
+                      setClusterSettings((prev) => ({
+                        ...prev,
+                        temporalEpsMinutes: parseInt(e.target.value),
+                      }))
+                    }
+                    className="w-full h-2 bg-slate-700 rounded-lg appearance-none cursor-pointer accent-blue-500"
+                  />
+                  <div className="flex justify-between text-xs text-slate-500 mt-1">
+                    <span>15 min (Bursts)</span>
+                    <span>6 h (Slow Build-up)</span>
+                  </div>
+                </div>
+
+                {/* Decay Half-Life */}
+                <div>
+                  <div className="flex items-center justify-between mb-2">
+                    <label className="text-sm font-medium text-slate-300">
+                      Report Weight Half-Life
+                    </label>
+                    <span className="text-sm text-blue-400 font-mono">
+                      {clusterSettings.decayHalfLifeHours ? `${clusterSettings.decayHalfLifeHours} h` : "Off"}
+                    </span>
+                  </div>
+                  <input
+                    type="range"
+                    min="0"
+                    max="48"
+                    step="1"
+                    value={clusterSettings.decayHalfLifeHours}
+                    onChange={(e) =>
+                      setClusterSettings((prev) => ({
+                        ...prev,
+                        decayHalfLifeHours: parseInt(e.target.value),
+                      }))
+                    }
+                    className="w-full h-2 bg-slate-700 rounded-lg appearance-none cursor-pointer accent-blue-500"
+                  />
+                  <div className="flex justify-between text-xs text-slate-500 mt-1">
+                    <span>Off</span>
+                    <span>48 h</span>
+                  </div>
+                </div>
+              </>
+            )}
+
             {/* Min Samples */}
             <div>
               <div className="flex items-center justify-between mb-2">
@@ -9,6 +9,18 @@ export default function CitizenHome() {
   const [alerts, setAlerts] = useState([]);
   const [stats, setStats] = useState({ total: 0, thisWeek: 0, resolved: 0 });
 
+  // Cells carry their report count and summed trust weight; shade each
+  // relative to the densest cell so busy cells stand out
+  const maxWeight = Math.max(
+    0,
+    ...heatmapData.map((cell) => cell.weight ?? cell.count ?? 0),
+  );
+  const cellOpacity = (cell) => {
+    if (!maxWeight) return 0.3;
+    const share = (cell.weight ?? cell.count ?? 0) / maxWeight;
+    return 0.1 + 0.6 * Math.sqrt(share);
+  };
+
   useEffect(() => {
     loadData();
   }, []);
@@ -94,13 +106,13 @@ export default function CitizenHome() {
               url="https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png"
               attribution="&copy; OpenStreetMap contributors &copy; CARTO"
             />
-            {heatmapData.map((point, idx) => (
+            {heatmapData.map((cell) => (
               <Circle
-                key={idx}
-                center={[point.lat, point.lng]}
-                radius={point.radius || 200}
+                key={`${cell.lat},${cell.lng}`}
+                center={[cell.lat, cell.lng]}
+                radius={cell.radius || 200}
                 fillColor="#ef4444"
-                fillOpacity={0.3}
+                fillOpacity={cellOpacity(cell)}
                 stroke={false}
               />
             ))}
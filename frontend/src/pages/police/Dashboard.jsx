@@ -158,7 +158,7 @@ export default function PoliceDashboard() {
   const loadClusters = async () => {
     try {
       setRefreshing(true);
-      await clustersAPI.refresh();
+      await clustersAPI.refreshAndWait();
       const response = await clustersAPI.getLatest();
       setClusters(response.data || []);
     } catch (error) {
@@ -436,6 +436,12 @@ export default function PoliceDashboard() {
                         {cluster.riskLevel === "high" ? "High Risk" : "Medium Risk"} Hotspot
                       </h4>
                       <p className="text-sm text-gray-600">{cluster.points?.length || 0} incidents clustered</p>
+                      {cluster.trend && (
+                        <p className="text-xs text-gray-500 mt-1">
+                          Trend: {cluster.trend}
+                          {cluster.reportCountChange ? ` (${cluster.reportCountChange > 0 ? "+" : ""}${cluster.reportCountChange} reports)` : ""}
+                        </p>
+                      )}
                       <p className="text-xs text-gray-400 mt-1">
                         Radius: ~{Math.round(cluster.radius || 500)}m
                       </p>
@@ -51,9 +51,31 @@ export const reportsAPI = {
 
 // Clustering APIs
 export const clustersAPI = {
-  getLatest: () => apiClient.get("/clusters/get"),
+  // window: "1h", "6h", "24h" (default) or "7d"; category: one report category
+  // filters: optional { south, west, north, east } viewport and { since, until } history range
+  getLatest: (window, category, filters) =>
+    apiClient.get("/clusters/get", {
+      params: {
+        ...(window && { window }),
+        ...(category && { category }),
+        ...filters,
+      },
+    }),
   refresh: () => apiClient.post("/clusters/refresh"),
+  getRefreshStatus: (jobId) => apiClient.get(`/clusters/refresh/${jobId}`),
   getParams: () => apiClient.get("/clusters/params"),
+  // Queue a refresh and poll until the background job finishes
+  refreshAndWait: async (intervalMs = 1000, maxAttempts = 120) => {
+    const { data } = await apiClient.post("/clusters/refresh");
+    if (!data.job_id) return { data };
+    for (let attempt = 0; attempt < maxAttempts; attempt++) {
+      const status = await apiClient.get(`/clusters/refresh/${data.job_id}`);
+      if (status.data.status === "completed") return { data: status.data.result };
+      if (status.data.status === "failed") throw new Error(status.data.error);
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+    throw new Error("Clustering job timed out");
+  },
 };
 
 // Chat APIs
@@ -95,7 +117,10 @@ export const adminAPI = {
 
 // Heatmap APIs
 export const heatmapAPI = {
-  getData: () => apiClient.get("/heatmap/data"),
+  getData: (params) => apiClient.get("/heatmap/data", { params }),
+  getTile: (z, x, y) => apiClient.get(`/heatmap/tiles/${z}/${x}/${y}`),
+  getDensity: (params) =>
+    apiClient.get("/heatmap/kde", { params, responseType: "blob" }),
 };
 
 export default apiClient;